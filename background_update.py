@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+后台更新
+在子进程中运行 `update.py --background`，管理程序菜单在更新期间保持可用。
+update.py 在后台模式下会为每个仓库输出阶段标记：
+    @@phase {"service": "bot", "phase": "fetch", "status": "done", "changed": true}
+UpdateJob 解析这些标记，记录各阶段的耗时，其余输出写入 core/.onekey/update.log。
+"""
+
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import List, Optional
+
+import resource_limits
+
+PHASE_MARKER = "@@phase "
+PHASE_NAMES = {"checkout": "切换分支", "fetch": "拉取更新", "install": "安装依赖"}
+# 更新与在线 Bot 同时进行，降低优先级避免 pip 抢占 CPU
+UPDATE_LIMITS = {"priority": "below_normal"}
+
+
+class UpdateJob:
+    def __init__(
+        self,
+        python_executable: Path,
+        script_path: Path,
+        log_path: Path,
+        extra_args: Optional[List[str]] = None,
+    ):
+        self.python_executable = python_executable
+        self.script_path = script_path
+        self.log_path = log_path
+        self.extra_args = extra_args or []
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.finished_at: Optional[float] = None
+        # 每个阶段: {"service", "phase", "status", "started", "ended", "changed"}
+        self.phases: List[dict] = []
+        self.recent_lines: deque = deque(maxlen=20)
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        limits = resource_limits.normalize(UPDATE_LIMITS)
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        self.process = subprocess.Popen(
+            [str(self.python_executable), str(self.script_path), "--background", *self.extra_args],
+            cwd=str(self.script_path.parent),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="ignore",
+            env=env,
+            **resource_limits.popen_options(limits, "update"),
+        )
+        resource_limits.after_launch(self.process, limits, "update")
+        self.started_at = time.time()
+        threading.Thread(target=self._read_output, daemon=True).start()
+
+    def _read_output(self):
+        with open(self.log_path, "w", encoding="utf-8") as log:
+            for line in self.process.stdout:
+                line = line.rstrip("\n")
+                log.write(line + "\n")
+                log.flush()
+                if line.startswith(PHASE_MARKER):
+                    try:
+                        self._on_phase(json.loads(line[len(PHASE_MARKER):]))
+                    except ValueError:
+                        pass
+                elif line.strip():
+                    self.recent_lines.append(line)
+        self.process.wait()
+        self.finished_at = time.time()
+
+    def _on_phase(self, marker: dict):
+        now = time.time()
+        with self._lock:
+            if marker["status"] == "start":
+                self.phases.append({**marker, "started": now, "ended": None})
+                return
+            for phase in reversed(self.phases):
+                if phase["service"] == marker["service"] and phase["phase"] == marker["phase"]:
+                    phase.update(marker, ended=now)
+                    return
+            self.phases.append({**marker, "started": now, "ended": now})
+
+    def wait(self, poll_interval: float = 0.5):
+        """等待更新结束（包括输出读取完毕）"""
+        while self.running:
+            time.sleep(poll_interval)
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.finished_at is None
+
+    @property
+    def succeeded(self) -> bool:
+        return (
+            self.finished_at is not None
+            and self.process.returncode == 0
+            and all(phase["status"] == "done" for phase in self.phases)
+        )
+
+    def changed_services(self) -> List[str]:
+        """实际拉取到新提交的仓库"""
+        with self._lock:
+            return [
+                phase["service"]
+                for phase in self.phases
+                if phase["phase"] == "fetch" and phase.get("changed")
+            ]
+
+    def progress_lines(self) -> List[str]:
+        now = time.time()
+        lines = []
+        with self._lock:
+            for phase in self.phases:
+                elapsed = (phase["ended"] or now) - phase["started"]
+                icon = {"start": "⏳", "done": "✅", "failed": "❌"}.get(phase["status"], "•")
+                name = PHASE_NAMES.get(phase["phase"], phase["phase"])
+                lines.append(f"{icon} {phase['service']} {name} ({elapsed:.1f}s)")
+        total = (self.finished_at or now) - self.started_at
+        state = "进行中" if self.running else "已结束"
+        lines.append(f"更新{state}，总用时 {total:.0f}s，日志: {self.log_path}")
+        return lines
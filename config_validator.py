@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*-
+"""
+配置文件启动前校验
+在启动 Bot 之前检查 bot_config.toml、model_config.toml 和 Napcat 适配器 config.toml：
+1. 类型与必填项（如 bot.qq_account、SiliconFlow 的 api_key）
+2. 跨文件一致性（如适配器端口与 OneBot WS 客户端地址一致）
+校验结果按文件内容哈希缓存，文件不变时直接复用上次结果。
+"""
+
+import hashlib
+import json
+import re
+import tomllib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# 规则或检查逻辑变化时递增，使旧缓存失效
+SCHEMA_VERSION = 1
+
+# --- 各配置文件的声明式规则 ---
+# 键路径 -> (允许的类型, 是否必填)
+# 注意: bool 是 int 的子类，校验时会单独区分
+BOT_CONFIG_SCHEMA = {
+    "bot.platform": (str, False),
+    "bot.qq_account": ((int, str), True),
+    "bot.nickname": (str, False),
+    "permission.master_users": (list, False),
+}
+
+MODEL_CONFIG_SCHEMA = {
+    "api_providers": (list, True),
+    "models": (list, False),
+    "model_task_config": (dict, False),
+}
+
+API_PROVIDER_SCHEMA = {
+    "name": (str, True),
+    "base_url": (str, True),
+    "api_key": (str, True),
+}
+
+MODEL_SCHEMA = {
+    "name": (str, True),
+    "model_identifier": (str, True),
+    "api_provider": (str, True),
+}
+
+NAPCAT_ADAPTER_SCHEMA = {
+    "plugin.enabled": (bool, False),
+    "napcat_server.host": (str, False),
+    "napcat_server.port": (int, False),
+    "napcat_server.access_token": (str, False),
+    "features.group_list_type": (str, False),
+    "features.group_list": (list, False),
+    "features.private_list_type": (str, False),
+    "features.private_list": (list, False),
+    "features.enable_video_analysis": (bool, False),
+}
+
+LIST_TYPES = ("whitelist", "blacklist")
+DEFAULT_ADAPTER_PORT = 8095
+
+# 明显未填写的占位 Key
+PLACEHOLDER_KEYS = {"", "your-api-key", "your_api_key", "sk-xxx", "sk-your-api-key"}
+
+_TABLE_RE = re.compile(r"^\s*(\[\[?)\s*([^\]]+?)\s*\]\]?")
+_KEY_RE = re.compile(r"""^\s*(?:"([^"]+)"|'([^']+)'|([A-Za-z0-9_\-]+))\s*=""")
+
+
+def _config_paths(bot_path: Path) -> Dict[str, Path]:
+    config_dir = bot_path / "config"
+    return {
+        "bot_config.toml": config_dir / "bot_config.toml",
+        "model_config.toml": config_dir / "model_config.toml",
+        "napcat_adapter/config.toml": config_dir
+        / "plugins"
+        / "napcat_adapter"
+        / "config.toml",
+    }
+
+
+def _issue(level: str, file: str, key: str, message: str, line: int = 0) -> dict:
+    return {"level": level, "file": file, "key": key, "line": line, "message": message}
+
+
+def _type_name(expected) -> str:
+    names = {str: "字符串", int: "整数", bool: "布尔值", list: "数组", dict: "表", float: "浮点数"}
+    if isinstance(expected, tuple):
+        return " 或 ".join(names.get(t, t.__name__) for t in expected)
+    return names.get(expected, expected.__name__)
+
+
+def _type_ok(value, expected) -> bool:
+    expected_types = expected if isinstance(expected, tuple) else (expected,)
+    # bool 是 int 的子类，避免 true/false 被当成整数通过
+    if isinstance(value, bool) and bool not in expected_types:
+        return False
+    return isinstance(value, expected_types)
+
+
+def _get_path(data: dict, dotted: str):
+    current = data
+    for part in dotted.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return None, False
+        current = current[part]
+    return current, True
+
+
+def _key_lines(text: str) -> Dict[str, int]:
+    """记录每个键路径所在的行号，用于精确定位错误位置。"""
+    lines: Dict[str, int] = {}
+    array_counts: Dict[str, int] = {}
+    prefix = ""
+    for lineno, line in enumerate(text.splitlines(), 1):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if table := _TABLE_RE.match(line):
+            name = table.group(2).replace('"', "").replace("'", "")
+            if table.group(1) == "[[":
+                index = array_counts.get(name, 0)
+                array_counts[name] = index + 1
+                prefix = f"{name}[{index}]"
+            else:
+                prefix = name
+            lines.setdefault(prefix, lineno)
+            continue
+        if key := _KEY_RE.match(line):
+            name = next(group for group in key.groups() if group)
+            lines.setdefault(f"{prefix}.{name}" if prefix else name, lineno)
+    return lines
+
+
+def _locate(key_lines: Dict[str, int], dotted: str) -> int:
+    """找不到键本身时退回到其所在表的行号。"""
+    while dotted:
+        if dotted in key_lines:
+            return key_lines[dotted]
+        if "." not in dotted:
+            break
+        dotted = dotted.rsplit(".", 1)[0]
+    return 0
+
+
+def _check_schema(
+    data: dict, schema: dict, file: str, key_lines: Dict[str, int], prefix: str = ""
+) -> List[dict]:
+    issues = []
+    for dotted, (expected, required) in schema.items():
+        value, present = _get_path(data, dotted)
+        full_key = f"{prefix}.{dotted}" if prefix else dotted
+        line = _locate(key_lines, full_key)
+        if not present:
+            if required:
+                issues.append(_issue("error", file, full_key, "缺少必填项", line))
+            continue
+        if not _type_ok(value, expected):
+            issues.append(
+                _issue(
+                    "error",
+                    file,
+                    full_key,
+                    f"类型错误：应为{_type_name(expected)}，实际为 {type(value).__name__} ({value!r})",
+                    line,
+                )
+            )
+    return issues
+
+
+def _is_qq(value) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return value > 0
+    return isinstance(value, str) and value.strip().isdigit() and int(value) > 0
+
+
+def _check_bot_config(data: dict, file: str, key_lines: Dict[str, int]) -> List[dict]:
+    issues = _check_schema(data, BOT_CONFIG_SCHEMA, file, key_lines)
+    qq_account, present = _get_path(data, "bot.qq_account")
+    if present and _type_ok(qq_account, (int, str)) and not _is_qq(qq_account):
+        issues.append(
+            _issue(
+                "error",
+                file,
+                "bot.qq_account",
+                f"QQ 号无效: {qq_account!r}（请运行配置向导填写 Bot 的 QQ 号）",
+                _locate(key_lines, "bot.qq_account"),
+            )
+        )
+
+    master_users, present = _get_path(data, "permission.master_users")
+    if present and isinstance(master_users, list):
+        for index, item in enumerate(master_users):
+            if not (isinstance(item, list) and len(item) == 2):
+                issues.append(
+                    _issue(
+                        "error",
+                        file,
+                        f"permission.master_users[{index}]",
+                        f"格式错误：应为 [\"平台\", \"QQ号\"]，实际为 {item!r}",
+                        _locate(key_lines, "permission.master_users"),
+                    )
+                )
+    return issues
+
+
+def _check_model_config(data: dict, file: str, key_lines: Dict[str, int]) -> List[dict]:
+    issues = _check_schema(data, MODEL_CONFIG_SCHEMA, file, key_lines)
+    providers = data.get("api_providers")
+    models = data.get("models")
+    if not isinstance(providers, list):
+        return issues
+
+    provider_map = {}
+    for index, provider in enumerate(providers):
+        prefix = f"api_providers[{index}]"
+        if not isinstance(provider, dict):
+            issues.append(_issue("error", file, prefix, "应为表", _locate(key_lines, prefix)))
+            continue
+        issues.extend(_check_schema(provider, API_PROVIDER_SCHEMA, file, key_lines, prefix))
+        if isinstance(provider.get("name"), str):
+            provider_map[provider["name"]] = (index, provider)
+
+    model_names = set()
+    used_providers = set()
+    for index, model in enumerate(models if isinstance(models, list) else []):
+        prefix = f"models[{index}]"
+        if not isinstance(model, dict):
+            issues.append(_issue("error", file, prefix, "应为表", _locate(key_lines, prefix)))
+            continue
+        issues.extend(_check_schema(model, MODEL_SCHEMA, file, key_lines, prefix))
+        if isinstance(model.get("name"), str):
+            model_names.add(model["name"])
+        provider_name = model.get("api_provider")
+        if isinstance(provider_name, str):
+            used_providers.add(provider_name)
+            if provider_name not in provider_map:
+                issues.append(
+                    _issue(
+                        "error",
+                        file,
+                        f"{prefix}.api_provider",
+                        f"引用了不存在的 API 提供商 '{provider_name}'",
+                        _locate(key_lines, f"{prefix}.api_provider"),
+                    )
+                )
+
+    # 被模型引用的提供商必须填写 API Key，SiliconFlow 是配置向导默认使用的提供商
+    for name in sorted(used_providers | ({"SiliconFlow"} & provider_map.keys())):
+        if name not in provider_map:
+            continue
+        index, provider = provider_map[name]
+        api_key = provider.get("api_key")
+        if isinstance(api_key, str) and api_key.strip().lower() in PLACEHOLDER_KEYS:
+            key = f"api_providers[{index}].api_key"
+            issues.append(
+                _issue(
+                    "error",
+                    file,
+                    key,
+                    f"{name} 的 api_key 未填写（请运行配置向导或手动填写）",
+                    _locate(key_lines, key),
+                )
+            )
+
+    task_config = data.get("model_task_config")
+    if isinstance(task_config, dict) and models is not None:
+        for task_name, task in task_config.items():
+            if not isinstance(task, dict):
+                continue
+            model_list = task.get("model_list")
+            if not isinstance(model_list, list):
+                continue
+            for model_name in model_list:
+                if model_name not in model_names:
+                    key = f"model_task_config.{task_name}.model_list"
+                    issues.append(
+                        _issue(
+                            "error",
+                            file,
+                            key,
+                            f"引用了未在 [[models]] 中定义的模型 '{model_name}'",
+                            _locate(key_lines, key),
+                        )
+                    )
+    return issues
+
+
+def _check_napcat_adapter(data: dict, file: str, key_lines: Dict[str, int]) -> List[dict]:
+    issues = _check_schema(data, NAPCAT_ADAPTER_SCHEMA, file, key_lines)
+
+    port, present = _get_path(data, "napcat_server.port")
+    if present and _type_ok(port, int) and not 0 < port < 65536:
+        issues.append(
+            _issue(
+                "error",
+                file,
+                "napcat_server.port",
+                f"端口超出范围: {port}",
+                _locate(key_lines, "napcat_server.port"),
+            )
+        )
+
+    for list_type_key, list_key in (
+        ("features.group_list_type", "features.group_list"),
+        ("features.private_list_type", "features.private_list"),
+    ):
+        list_type, present = _get_path(data, list_type_key)
+        if present and isinstance(list_type, str) and list_type not in LIST_TYPES:
+            issues.append(
+                _issue(
+                    "error",
+                    file,
+                    list_type_key,
+                    f"取值错误：应为 'whitelist' 或 'blacklist'，实际为 {list_type!r}",
+                    _locate(key_lines, list_type_key),
+                )
+            )
+        items, present = _get_path(data, list_key)
+        if present and isinstance(items, list):
+            bad = [item for item in items if not _is_qq(item)]
+            if bad:
+                issues.append(
+                    _issue(
+                        "error",
+                        file,
+                        list_key,
+                        f"包含无效的群号/QQ号: {bad!r}",
+                        _locate(key_lines, list_key),
+                    )
+                )
+    return issues
+
+
+def _check_onebot_link(
+    base_path: Path, bot_config: Optional[dict], adapter_config: Optional[dict]
+) -> Tuple[List[dict], Optional[Path]]:
+    """检查适配器监听端口与 Napcat OneBot WS 客户端地址是否一致。"""
+    if bot_config is None:
+        return [], None
+    qq_account, _ = _get_path(bot_config, "bot.qq_account")
+    if not _is_qq(qq_account):
+        return [], None
+
+    onebot_path = (
+        base_path / "core" / "Napcat" / "config" / f"onebot11_{int(qq_account)}.json"
+    )
+    file = f"Napcat/config/{onebot_path.name}"
+    if not onebot_path.exists():
+        return [
+            _issue(
+                "warning",
+                file,
+                "",
+                "未找到 Napcat 的 OneBot 配置文件，请运行配置向导自动生成",
+            )
+        ], onebot_path
+
+    try:
+        onebot_config = json.loads(onebot_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        return [_issue("error", file, "", f"JSON 解析失败: {e}")], onebot_path
+
+    adapter_port, adapter_token = DEFAULT_ADAPTER_PORT, ""
+    if adapter_config is not None:
+        port, present = _get_path(adapter_config, "napcat_server.port")
+        if present and _type_ok(port, int):
+            adapter_port = port
+        token, present = _get_path(adapter_config, "napcat_server.access_token")
+        if present and isinstance(token, str):
+            adapter_token = token
+
+    clients = [
+        client
+        for client in onebot_config.get("network", {}).get("websocketClients", [])
+        if isinstance(client, dict) and client.get("enable")
+    ]
+    if not clients:
+        return [
+            _issue("error", file, "network.websocketClients", "没有启用的 WebSocket 客户端，Napcat 将无法连接 Bot")
+        ], onebot_path
+
+    issues = []
+    for index, client in enumerate(clients):
+        key = f"network.websocketClients[{index}]"
+        try:
+            client_port = urlparse(str(client.get("url", ""))).port
+        except ValueError:
+            client_port = None
+        if client_port != adapter_port:
+            issues.append(
+                _issue(
+                    "error",
+                    file,
+                    f"{key}.url",
+                    f"WS 地址 {client.get('url')!r} 与适配器端口 {adapter_port} 不一致",
+                )
+            )
+        if (client.get("token") or "") != adapter_token:
+            issues.append(
+                _issue("error", file, f"{key}.token", "token 与适配器 napcat_server.access_token 不一致")
+            )
+    return issues, onebot_path
+
+
+def _load_toml(raw: bytes, file: str) -> Tuple[Optional[dict], List[dict]]:
+    try:
+        return tomllib.loads(raw.decode("utf-8")), []
+    except UnicodeDecodeError as e:
+        return None, [_issue("error", file, "", f"文件编码不是 UTF-8: {e}")]
+    except tomllib.TOMLDecodeError as e:
+        # TOMLDecodeError 的消息中自带 "(at line X, column Y)"
+        line_match = re.search(r"line (\d+)", str(e))
+        return None, [
+            _issue(
+                "error",
+                file,
+                "",
+                f"TOML 语法错误: {e}",
+                int(line_match.group(1)) if line_match else 0,
+            )
+        ]
+
+
+def _run_checks(base_path: Path, raw_files: Dict[str, Optional[bytes]]) -> List[dict]:
+    checkers = {
+        "bot_config.toml": _check_bot_config,
+        "model_config.toml": _check_model_config,
+        "napcat_adapter/config.toml": _check_napcat_adapter,
+    }
+    issues: List[dict] = []
+    parsed: Dict[str, Optional[dict]] = {}
+    for file, checker in checkers.items():
+        raw = raw_files.get(file)
+        if raw is None:
+            # 适配器配置在首次启动插件后才会生成，缺失时仅提示
+            level = "warning" if file == "napcat_adapter/config.toml" else "error"
+            issues.append(_issue(level, file, "", "配置文件不存在"))
+            parsed[file] = None
+            continue
+        data, load_issues = _load_toml(raw, file)
+        parsed[file] = data
+        issues.extend(load_issues)
+        if data is not None:
+            issues.extend(checker(data, file, _key_lines(raw.decode("utf-8"))))
+
+    link_issues, _ = _check_onebot_link(
+        base_path, parsed["bot_config.toml"], parsed["napcat_adapter/config.toml"]
+    )
+    issues.extend(link_issues)
+    return issues
+
+
+def _read_optional(path: Path) -> Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _onebot_raw(base_path: Path, bot_raw: Optional[bytes]) -> Optional[bytes]:
+    """OneBot 配置也参与跨文件检查，因此同样纳入缓存键。"""
+    if bot_raw is None:
+        return None
+    match = re.search(rb"^\s*qq_account\s*=\s*\"?(\d+)", bot_raw, re.MULTILINE)
+    if not match:
+        return None
+    return _read_optional(
+        base_path / "core" / "Napcat" / "config" / f"onebot11_{match.group(1).decode()}.json"
+    )
+
+
+def validate_configs(
+    base_path: Path, cache_path: Optional[Path] = None, bot_path: Optional[Path] = None
+) -> dict:
+    """
+    校验所有配置文件，返回 {"issues": [...], "cached": bool}。
+    cache_path 指定时，文件哈希未变化则直接返回缓存结果。
+    bot_path 为 Bot（或实例）目录，默认 core/Bot。
+    """
+    bot_path = bot_path or base_path / "core" / "Bot"
+    raw_files = {
+        file: _read_optional(path) for file, path in _config_paths(bot_path).items()
+    }
+    hasher = hashlib.sha1(f"v{SCHEMA_VERSION}:{bot_path}".encode())
+    for file, raw in sorted(raw_files.items()) + [
+        ("onebot", _onebot_raw(base_path, raw_files["bot_config.toml"]))
+    ]:
+        hasher.update(file.encode())
+        hasher.update(hashlib.sha1(raw).digest() if raw is not None else b"<missing>")
+    cache_key = hasher.hexdigest()
+
+    if cache_path and cache_path.exists():
+        try:
+            cached = json.loads(cache_path.read_text(encoding="utf-8"))
+            if cached.get("key") == cache_key:
+                return {"issues": cached["issues"], "cached": True}
+        except (OSError, ValueError, KeyError):
+            pass
+
+    issues = _run_checks(base_path, raw_files)
+
+    if cache_path:
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_text(
+                json.dumps({"key": cache_key, "issues": issues}, ensure_ascii=False),
+                encoding="utf-8",
+            )
+        except OSError:
+            pass  # 缓存写入失败不影响校验结果
+    return {"issues": issues, "cached": False}
+
+
+def format_issue(issue: dict) -> str:
+    location = issue["file"]
+    if issue.get("line"):
+        location += f":{issue['line']}"
+    if issue.get("key"):
+        location += f" [{issue['key']}]"
+    return f"{location} {issue['message']}"
@@ -5,6 +5,9 @@ import re
 import json
 import subprocess
 import copy
+import sys
+import argparse
+import tomllib
 from collections.abc import MutableMapping
 
 # --- 路径定义 ---
@@ -15,6 +18,24 @@ NAPCAT_ADAPTER_CONFIG_PATH = os.path.join(
     BASE_DIR, "core", "Bot", "config", "plugins", "napcat_adapter", "config.toml"
 )
 ENV_PATH = os.path.join(BASE_DIR, "core", "Bot", ".env")
+NAPCAT_CONFIG_DIR = os.path.join(BASE_DIR, "core", "Napcat", "config")
+
+# --- 批量模式 ---
+# 答案文件/环境变量中的键 -> 说明；环境变量名为 ONEKEY_ + 键名大写
+ANSWER_KEYS = {
+    "eula": "是否同意 EULA 协议 (true/false)",
+    "qq_account": "Bot 登录的 QQ 号",
+    "master_users": "主人 QQ 号，可填多个",
+    "api_key": "SiliconFlow API Key",
+    "group_list_type": "群聊名单模式 whitelist/blacklist",
+    "group_list": "群聊名单",
+    "private_list_type": "私聊名单模式 whitelist/blacklist",
+    "private_list": "私聊名单",
+    "enable_video_analysis": "适配器是否处理视频",
+    "port": "适配器监听端口（Napcat 通过该端口连接 Bot）",
+}
+DEFAULT_ADAPTER_PORT = 8095
+ENV_PREFIX = "ONEKEY_"
 
 
 # --- 注释定义 ---
@@ -62,57 +83,65 @@ def ask_for_config(config, comments, parent_key=""):
                 new_value_str = input("   请输入新值 (直接回车则不修改): ").strip()
 
                 if new_value_str:
-                    original_type = type(value)
                     try:
-                        new_value = None
-                        if key == "master_users":
-                            # master_users 的格式是 [['qq', '...']]
-                            current_list = (
-                                value.tolist()
-                                if hasattr(value, "tolist")
-                                else list(value)
-                            )
-                            current_list.append(["qq", new_value_str])
-                            # 去重
-                            unique_list = []
-                            seen = set()
-                            for item in current_list:
-                                t_item = tuple(item)
-                                if t_item not in seen:
-                                    unique_list.append(item)
-                                    seen.add(t_item)
-                            new_value = unique_list
-                        elif original_type == bool:
-                            new_value = new_value_str.lower() in [
-                                "true",
-                                "1",
-                                "t",
-                                "y",
-                                "yes",
-                            ]
-                        elif original_type == list:
-                            new_value = [
-                                item.strip()
-                                for item in re.split(r"[\s,]+", new_value_str)
-                                if item.strip()
-                            ]
-                        elif original_type == int:  # noqa: E721
-                            new_value = tomlkit.integer(int(new_value_str))
-                        elif original_type == float:
-                            new_value = float(new_value_str)
-                        else:
-                            new_value = original_type(new_value_str)
-
+                        new_value = convert_input(key, value, new_value_str)
                         if new_value is not None:
                             config[key] = new_value
                             print(f"   '{key}' 已更新为: {new_value}")
 
                     except (ValueError, TypeError) as e:
                         print(
-                            f"   输入格式错误或转换失败！'{key}' 的值类型应为 {original_type.__name__}。错误：{e}。跳过此项。"
+                            f"   输入格式错误或转换失败！'{key}' 的值类型应为 {type(value).__name__}。错误：{e}。跳过此项。"
                         )
 
 
+def convert_input(key, value, new_value_str):
+    """把用户输入的字符串按原配置项的类型转换为新值（交互模式与批量模式共用）。"""
+    original_type = type(value)
+    new_value = None
+    if key == "master_users":
+        # master_users 的格式是 [['qq', '...']]
+        current_list = (
+            value.tolist()
+            if hasattr(value, "tolist")
+            else list(value)
+        )
+        current_list.append(["qq", new_value_str])
+        # 去重
+        unique_list = []
+        seen = set()
+        for item in current_list:
+            t_item = tuple(item)
+            if t_item not in seen:
+                unique_list.append(item)
+                seen.add(t_item)
+        new_value = unique_list
+    # tomlkit 返回的是 Integer/String/Array 等子类，需用 isinstance 判断
+    elif isinstance(value, bool):
+        new_value = new_value_str.lower() in [
+            "true",
+            "1",
+            "t",
+            "y",
+            "yes",
+        ]
+    elif isinstance(value, list):
+        new_value = [
+            item.strip()
+            for item in re.split(r"[\s,]+", new_value_str)
+            if item.strip()
+        ]
+    elif isinstance(value, int):
+        new_value = tomlkit.integer(int(new_value_str))
+    elif isinstance(value, float):
+        new_value = float(new_value_str)
+    elif isinstance(value, str):
+        new_value = new_value_str
+    else:
+        new_value = original_type(new_value_str)
+    return new_value
+
+
 def configure_bot():
     """配置 bot_config.toml 文件。"""
     try:
@@ -169,8 +198,7 @@ def configure_bot():
         print(f"处理 `bot_config.toml` 时发生未知错误：{e}")
 
 
-def check_eula():
-    """检查并处理EULA协议确认。"""
+def _read_env():
     env_content = {}
     if os.path.exists(ENV_PATH):
         with open(ENV_PATH, "r", encoding="utf-8") as f:
@@ -179,6 +207,18 @@ def check_eula():
                 if "=" in line and not line.startswith("#"):
                     key, value = line.split("=", 1)
                     env_content[key.strip()] = value.strip()
+    return env_content
+
+
+def _write_env(env_content):
+    with open(ENV_PATH, "w", encoding="utf-8") as f:
+        for key, value in env_content.items():
+            f.write(f"{key}={value}\n")
+
+
+def check_eula():
+    """检查并处理EULA协议确认。"""
+    env_content = _read_env()
     if env_content.get("EULA_CONFIRMED", "false").lower() == "true":
         print("您已同意 EULA 协议。")
         return True
@@ -198,9 +238,7 @@ def check_eula():
         if confirm in ["yes", "y"]:
             env_content["EULA_CONFIRMED"] = "true"
             try:
-                with open(ENV_PATH, "w", encoding="utf-8") as f:
-                    for key, value in env_content.items():
-                        f.write(f"{key}={value}\n")
+                _write_env(env_content)
                 print("感谢您的同意! EULA 状态已更新。")
                 return True
             except Exception as e:
@@ -298,11 +336,22 @@ def configure_napcat_adapter():
         print(f"处理 `napcat_adapter_config.toml` 时发生未知错误：{e}")
 
 
-def auto_configure_onebot_for_napcat():
+def _adapter_server_settings():
+    """读取适配器监听的端口和 token，Napcat 的 WS 客户端需要与之一致。"""
+    port, token = DEFAULT_ADAPTER_PORT, ""
+    if os.path.exists(NAPCAT_ADAPTER_CONFIG_PATH):
+        with open(NAPCAT_ADAPTER_CONFIG_PATH, "r", encoding="utf-8") as f:
+            server = tomlkit.load(f).get("napcat_server", {})
+        port = int(server.get("port", port))
+        token = str(server.get("access_token", token))
+    return port, token
+
+
+def auto_configure_onebot_for_napcat(port=None):
     """
     静默检查并为 Napcat-Adapter 自动配置 OneBot v11 的 JSON 文件。
     - 仅在配置文件不存在时创建。
-    - 创建的配置文件默认启用 WS 客户端。
+    - 创建的配置文件默认启用 WS 客户端，地址指向适配器配置的端口（默认 8095）。
     - 整个过程无用户交互。
     """
     try:
@@ -317,7 +366,7 @@ def auto_configure_onebot_for_napcat():
             return  # 没有 QQ 号，静默退出
 
         # 2. 确定 Napcat 内的配置文件路径
-        napcat_config_dir = os.path.join(BASE_DIR, "core", "Napcat", "config")
+        napcat_config_dir = NAPCAT_CONFIG_DIR
         onebot_config_path = os.path.join(
             napcat_config_dir, f"onebot11_{qq_account}.json"
         )
@@ -330,6 +379,8 @@ def auto_configure_onebot_for_napcat():
         os.makedirs(napcat_config_dir, exist_ok=True)
 
         # 5. 定义默认配置并写入文件
+        adapter_port, token = _adapter_server_settings()
+        port = port or adapter_port
         default_config = {
             "network": {
                 "httpServers": [],
@@ -339,11 +390,11 @@ def auto_configure_onebot_for_napcat():
                     {
                         "name": "MoFox-Bot-clinet",
                         "enable": True,  # 默认启用
-                        "url": "ws://localhost:8095",
+                        "url": f"ws://localhost:{port}",
                         "messagePostFormat": "array",
                         "reportSelfMessage": False,
                         "reconnectInterval": 5000,
-                        "token": "",
+                        "token": token,
                         "debug": False,
                         "heartInterval": 30000,
                     }
@@ -401,7 +452,220 @@ def auto_configure_ffmpeg():
         print(f"自动配置 FFmpeg 时发生错误：{e}")
 
 
+# ==================== 批量（非交互）模式 ====================
+def set_paths(bot_dir=None, napcat_config_dir=None):
+    """重新指定要配置的 Bot 目录和 Napcat 配置目录，便于批量配置多个实例。"""
+    global BOT_CONFIG_PATH, MODEL_CONFIG_PATH, NAPCAT_ADAPTER_CONFIG_PATH
+    global ENV_PATH, NAPCAT_CONFIG_DIR
+    if bot_dir:
+        BOT_CONFIG_PATH = os.path.join(bot_dir, "config", "bot_config.toml")
+        MODEL_CONFIG_PATH = os.path.join(bot_dir, "config", "model_config.toml")
+        NAPCAT_ADAPTER_CONFIG_PATH = os.path.join(
+            bot_dir, "config", "plugins", "napcat_adapter", "config.toml"
+        )
+        ENV_PATH = os.path.join(bot_dir, ".env")
+    if napcat_config_dir:
+        NAPCAT_CONFIG_DIR = napcat_config_dir
+
+
+def load_answers(answers_path=None, use_env=True):
+    """从 JSON/TOML 答案文件和 ONEKEY_* 环境变量读取答案，环境变量优先。"""
+    answers = {}
+    if answers_path:
+        if answers_path.lower().endswith(".toml"):
+            with open(answers_path, "rb") as f:
+                answers.update(tomllib.load(f))
+        else:
+            with open(answers_path, "r", encoding="utf-8") as f:
+                answers.update(json.load(f))
+    if use_env:
+        for key in ANSWER_KEYS:
+            env_value = os.environ.get(ENV_PREFIX + key.upper())
+            if env_value is not None and env_value.strip():
+                answers[key] = env_value.strip()
+
+    unknown = set(answers) - set(ANSWER_KEYS)
+    if unknown:
+        raise ValueError(f"答案中包含未知的键: {', '.join(sorted(unknown))}")
+    return answers
+
+
+def _answer_inputs(key, answer):
+    """把答案转换成与交互输入相同的字符串，确保走同一套转换逻辑。"""
+    if isinstance(answer, bool):
+        return ["true" if answer else "false"]
+    if key == "master_users":
+        # 每个主人 QQ 号相当于在交互模式中输入一次
+        items = answer if isinstance(answer, list) else re.split(r"[\s,]+", str(answer))
+        return [str(item).strip() for item in items if str(item).strip()]
+    if isinstance(answer, list):
+        return [",".join(str(item) for item in answer)]
+    return [str(answer)]
+
+
+def apply_answers(config, comments, answers, errors, handled=None):
+    """
+    按 ask_for_config 相同的规则，把答案写入配置；转换失败的项记入 errors。
+    在配置中找到对应项的答案键加入 handled（无论转换是否成功），用于发现没有写入任何地方的答案。
+    """
+    for key, value in config.items():
+        if isinstance(value, MutableMapping):
+            if key in comments:
+                apply_answers(value, comments.get(key, {}), answers, errors, handled)
+        elif key in comments and key in answers:
+            if handled is not None:
+                handled.add(key)
+            try:
+                for new_value_str in _answer_inputs(key, answers[key]):
+                    new_value = convert_input(key, config[key], new_value_str)
+                    if new_value is not None:
+                        config[key] = new_value
+                print(f"   '{key}' 已更新为: {config[key]}")
+            except (ValueError, TypeError) as e:
+                errors.append(f"'{key}' 的值 {answers[key]!r} 无法转换为 {type(value).__name__}: {e}")
+
+
+def _apply_toml_answers(path, comments, answers, errors, handled, prepare=None):
+    with open(path, "r", encoding="utf-8") as f:
+        config = tomlkit.load(f)
+    if prepare:
+        prepare(config)
+    apply_answers(config, comments, answers, errors, handled)
+    with open(path, "w", encoding="utf-8") as f:
+        tomlkit.dump(config, f)
+
+
+def _enable_napcat_plugin(config):
+    # 与交互模式一致：自动启用 Napcat 适配器插件
+    plugin_section = config.get("plugin")
+    if isinstance(plugin_section, MutableMapping) and not plugin_section.get("enabled", False):
+        plugin_section["enabled"] = True
+
+
+def _set_adapter_port(port):
+    """写入适配器监听端口；配置文件尚未生成时只写入最小配置，其余项由插件补全。"""
+    if os.path.exists(NAPCAT_ADAPTER_CONFIG_PATH):
+        with open(NAPCAT_ADAPTER_CONFIG_PATH, "r", encoding="utf-8") as f:
+            config = tomlkit.load(f)
+    else:
+        os.makedirs(os.path.dirname(NAPCAT_ADAPTER_CONFIG_PATH), exist_ok=True)
+        config = tomlkit.document()
+        config["plugin"] = {"enabled": True}
+    if "napcat_server" not in config:
+        config["napcat_server"] = tomlkit.table()
+    config["napcat_server"]["port"] = tomlkit.integer(int(port))
+    with open(NAPCAT_ADAPTER_CONFIG_PATH, "w", encoding="utf-8") as f:
+        tomlkit.dump(config, f)
+    print(f"   适配器端口已设置为: {port}")
+
+
+def run_batch(answers):
+    """非交互地应用全部答案，返回错误列表（为空表示成功）；没有写入任何配置的答案也算错误。"""
+    errors = []
+    handled = {"eula"}
+
+    env_content = _read_env()
+    if env_content.get("EULA_CONFIRMED", "false").lower() != "true":
+        if str(answers.get("eula", "false")).lower() not in ["true", "1", "y", "yes"]:
+            return ["未同意 EULA 协议：请在答案中设置 eula = true"]
+        env_content["EULA_CONFIRMED"] = "true"
+        _write_env(env_content)
+        print("EULA 状态已更新。")
+
+    auto_configure_ffmpeg()
+
+    try:
+        _apply_toml_answers(BOT_CONFIG_PATH, BOT_CONFIG_COMMENTS, answers, errors, handled)
+    except FileNotFoundError:
+        errors.append(f"找不到 `bot_config.toml` 文件，路径：{BOT_CONFIG_PATH}")
+        handled.update(key for section in BOT_CONFIG_COMMENTS.values() for key in section)
+
+    if "api_key" in answers:
+        handled.add("api_key")
+        try:
+            with open(MODEL_CONFIG_PATH, "r", encoding="utf-8") as f:
+                config = tomlkit.load(f)
+            providers = config.get("api_providers") or []
+            for provider in providers:
+                if provider.get("name") == "SiliconFlow":
+                    provider["api_key"] = str(answers["api_key"])
+                    print("   SiliconFlow API Key 已更新！")
+                    break
+            else:
+                errors.append("未找到 SiliconFlow 的配置项，请检查 `model_config.toml` 文件。")
+            with open(MODEL_CONFIG_PATH, "w", encoding="utf-8") as f:
+                tomlkit.dump(config, f)
+        except FileNotFoundError:
+            errors.append(f"找不到 `model_config.toml` 文件，路径：{MODEL_CONFIG_PATH}")
+
+    if "port" in answers:
+        handled.add("port")
+        try:
+            _set_adapter_port(answers["port"])
+        except (ValueError, TypeError) as e:
+            errors.append(f"'port' 的值 {answers['port']!r} 无效: {e}")
+
+    if os.path.exists(NAPCAT_ADAPTER_CONFIG_PATH):
+        _apply_toml_answers(
+            NAPCAT_ADAPTER_CONFIG_PATH,
+            NAPCAT_CONFIG_COMMENTS,
+            answers,
+            errors,
+            handled,
+            prepare=_enable_napcat_plugin,
+        )
+
+    for key in answers:
+        if key in handled:
+            continue
+        if key in NAPCAT_CONFIG_COMMENTS["features"]:
+            # 只设置端口时生成的适配器配置没有 [features]，其余项由插件首次运行时补全
+            errors.append(
+                f"Napcat 适配器配置中没有 [features] {key}，未能写入: {NAPCAT_ADAPTER_CONFIG_PATH}"
+                "（请先启动一次 Bot 生成完整的适配器配置后重新运行）"
+            )
+        else:
+            errors.append(f"配置文件中没有 '{key}' 项，未能写入")
+
+    auto_configure_onebot_for_napcat()
+    return errors
+
+
+def main_batch(args):
+    set_paths(args.bot_dir, args.napcat_config_dir)
+    try:
+        answers = load_answers(args.answers, use_env=True)
+    except (OSError, ValueError) as e:
+        print(f"读取答案失败: {e}")
+        return 1
+    errors = run_batch(answers)
+    for error in errors:
+        print(f"错误：{error}")
+    if errors:
+        return 1
+    print("批量配置完成。")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MoFox-Bot 配置向导")
+    parser.add_argument("--answers", help="JSON 或 TOML 答案文件，使用后不再询问")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help=f"非交互模式，只从 {ENV_PREFIX}* 环境变量读取答案",
+    )
+    parser.add_argument("--bot-dir", help="要配置的 Bot 目录（默认 core/Bot）")
+    parser.add_argument("--napcat-config-dir", help="Napcat 配置目录（默认 core/Napcat/config）")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.answers or args.batch:
+        sys.exit(main_batch(args))
+
+    set_paths(args.bot_dir, args.napcat_config_dir)
     if not check_eula():
         input("按 Enter 键退出...")
     else:
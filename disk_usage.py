@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+磁盘占用分析与清理
+多线程并发遍历一键包目录（每个目录一个 os.scandir 任务，不跟随符号链接和目录联接），
+统计占用最大的目录和各类文件的总大小，同时收集可清理的内容：
+- 字节码：__pycache__ 中源文件已不存在的 .pyc
+- 残留目录：pip 中断安装留下的临时目录 (pip-*-build-*、site-packages/~* 等) 和离线包导入时保留的
+  Bot.old-* 旧目录，超过 stale_dir_days 天未修改才清理
+- 旧日志：logs 目录及 core/.onekey/traces 中超过 log_retention_days 天未修改的日志
+- Git 垃圾：执行 Git 仓库维护（repack + prune，见 git_maintenance.py），按 .git 大小的变化计算
+清理策略保存在 cleanup_policy.json，例如 {"log_retention_days": 30, "stale_dir_days": 7}。
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import git_maintenance
+from git_maintenance import format_size
+from log_index import LOG_SUFFIXES
+
+MAX_WORKERS = 16
+TOP_DEPTH = 3
+TOP_COUNT = 15
+DEFAULT_POLICY = {"log_retention_days": 14, "stale_dir_days": 7}
+# pip 中断后留下的临时目录，以及卸载时改名的 ~开头的包目录
+STALE_DIR_PATTERNS = ("pip-*-build-*", "pip-req-build-*", "pip-install-*", "pip-unpack-*", "pip-ephem-wheel-cache-*")
+ACTIONS = {
+    "bytecode": "孤立的字节码",
+    "stale": "残留的构建/备份目录",
+    "logs": "过期日志",
+    "git": "Git 垃圾",
+}
+
+
+def load_policy(base_path: Path) -> dict:
+    try:
+        with open(base_path / "cleanup_policy.json", "r", encoding="utf-8") as f:
+            return {**DEFAULT_POLICY, **json.load(f)}
+    except (OSError, ValueError):
+        return dict(DEFAULT_POLICY)
+
+
+def _is_junction(entry: os.DirEntry) -> bool:
+    if os.name != "nt":
+        return False
+    # 3.12 之前 DirEntry 不识别目录联接（多实例目录使用），用 readlink 判断
+    try:
+        os.readlink(entry.path)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def _category(path: str, name: str, in_git: bool) -> str:
+    if in_git:
+        return "Git 对象"
+    suffix = os.path.splitext(name)[1].lower()
+    if suffix == ".pyc":
+        return "Python 字节码"
+    if suffix in (".db", ".sqlite", ".sqlite3", ".db-wal", ".db-shm"):
+        return "数据库"
+    if name.endswith(LOG_SUFFIXES) and f"{os.sep}logs{os.sep}" in path:
+        return "日志"
+    if suffix in (".whl", ".gz", ".zip", ".tar"):
+        return "安装包/压缩包"
+    if f"{os.sep}site-packages{os.sep}" in path:
+        return "Python 依赖"
+    if f"{os.sep}node_modules{os.sep}" in path:
+        return "Node 模块"
+    return "其他"
+
+
+class ScanResult:
+    def __init__(self, root: Path):
+        self.root = root
+        self.parents: Dict[str, Optional[str]] = {}
+        self.own_bytes: Dict[str, int] = {}
+        self.totals: Dict[str, int] = {}
+        self.categories: Dict[str, int] = {}
+        self.files = 0
+        self.errors = 0
+        self.seconds = 0.0
+        # 清理候选：[(路径, 大小)]；目录的大小在扫描结束后按 totals 填入
+        self.bytecode: List[Tuple[str, int]] = []
+        self.old_logs: List[Tuple[str, int]] = []
+        self.stale_dirs: List[Tuple[str, int]] = []
+
+    @property
+    def total_bytes(self) -> int:
+        return self.totals.get(str(self.root), 0)
+
+    def top_directories(self, depth: int = TOP_DEPTH, count: int = TOP_COUNT) -> List[Tuple[str, int]]:
+        root_depth = len(self.root.parts)
+        candidates = [
+            (path, size)
+            for path, size in self.totals.items()
+            if 0 < len(Path(path).parts) - root_depth <= depth
+        ]
+        return sorted(candidates, key=lambda item: item[1], reverse=True)[:count]
+
+
+def _scan_dir(path: str, in_git: bool, log_cutoff: float, stale_cutoff: float) -> dict:
+    """扫描单个目录，只统计直接包含的文件，子目录交给其他任务"""
+    result = {"path": path, "bytes": 0, "files": 0, "subdirs": [], "categories": {}, "bytecode": [], "logs": [], "stale": []}
+    in_pycache = os.path.basename(path) == "__pycache__"
+    in_logs = f"{os.sep}logs{os.sep}" in path + os.sep or path.endswith(f"{os.sep}traces")
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_symlink():
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if _is_junction(entry):
+                        continue
+                    name = entry.name
+                    child_in_git = in_git or name == ".git"
+                    result["subdirs"].append((entry.path, child_in_git))
+                    if not child_in_git and (
+                        any(fnmatch.fnmatch(name, pattern) for pattern in STALE_DIR_PATTERNS)
+                        or (name.startswith("~") and path.endswith("site-packages"))
+                        or fnmatch.fnmatch(name, "Bot.old-*")
+                    ) and entry.stat(follow_symlinks=False).st_mtime < stale_cutoff:
+                        result["stale"].append(entry.path)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            size = st.st_size
+            result["bytes"] += size
+            result["files"] += 1
+            category = _category(entry.path, entry.name, in_git)
+            result["categories"][category] = result["categories"].get(category, 0) + size
+            if in_pycache and entry.name.endswith(".pyc"):
+                result["bytecode"].append((entry.path, size))
+            elif in_logs and entry.name.endswith(LOG_SUFFIXES) and st.st_mtime < log_cutoff:
+                result["logs"].append((entry.path, size))
+    return result
+
+
+def scan(root: Path, policy: Optional[dict] = None, workers: int = MAX_WORKERS) -> ScanResult:
+    policy = policy or DEFAULT_POLICY
+    now = time.time()
+    log_cutoff = now - policy["log_retention_days"] * 86400
+    stale_cutoff = now - policy["stale_dir_days"] * 86400
+    scan_result = ScanResult(root)
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, str(root), False, log_cutoff, stale_cutoff)}
+        scan_result.parents[str(root)] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except OSError:
+                    scan_result.errors += 1
+                    continue
+                path = result["path"]
+                scan_result.own_bytes[path] = result["bytes"]
+                scan_result.files += result["files"]
+                for category, size in result["categories"].items():
+                    scan_result.categories[category] = scan_result.categories.get(category, 0) + size
+                scan_result.bytecode += result["bytecode"]
+                scan_result.old_logs += result["logs"]
+                scan_result.stale_dirs += [(stale, 0) for stale in result["stale"]]
+                for subdir, in_git in result["subdirs"]:
+                    scan_result.parents[subdir] = path
+                    pending.add(pool.submit(_scan_dir, subdir, in_git, log_cutoff, stale_cutoff))
+
+    # 由深到浅把各目录大小累加到上级目录
+    totals = dict(scan_result.own_bytes)
+    for path in sorted(totals, key=lambda p: p.count(os.sep), reverse=True):
+        parent = scan_result.parents.get(path)
+        if parent is not None and parent in totals:
+            totals[parent] += totals[path]
+    scan_result.totals = totals
+    scan_result.stale_dirs = [(path, totals.get(path, 0)) for path, _ in scan_result.stale_dirs]
+    # 源文件仍存在的字节码不算孤立：__pycache__/模块名.cpython-311.pyc -> ../模块名.py
+    scan_result.bytecode = [
+        (path, size)
+        for path, size in scan_result.bytecode
+        if not os.path.exists(
+            os.path.join(os.path.dirname(os.path.dirname(path)), os.path.basename(path).split(".", 1)[0] + ".py")
+        )
+    ]
+    scan_result.seconds = time.perf_counter() - start
+    return scan_result
+
+
+# ==================== 清理 ====================
+def plan(scan_result: ScanResult) -> Dict[str, dict]:
+    """各清理动作可回收的空间；Git 垃圾需要实际维护后才知道，预估为 None"""
+    return {
+        "bytecode": {"count": len(scan_result.bytecode), "bytes": sum(size for _, size in scan_result.bytecode)},
+        "stale": {"count": len(scan_result.stale_dirs), "bytes": sum(size for _, size in scan_result.stale_dirs)},
+        "logs": {"count": len(scan_result.old_logs), "bytes": sum(size for _, size in scan_result.old_logs)},
+        "git": {"count": None, "bytes": None},
+    }
+
+
+def _remove_files(files: List[Tuple[str, int]]) -> dict:
+    removed = reclaimed = 0
+    pycache_dirs = set()
+    for path, size in files:
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        removed += 1
+        reclaimed += size
+        if os.path.basename(os.path.dirname(path)) == "__pycache__":
+            pycache_dirs.add(os.path.dirname(path))
+    for directory in pycache_dirs:
+        try:
+            os.rmdir(directory)  # 只删除已经清空的 __pycache__
+        except OSError:
+            pass
+    return {"count": removed, "bytes": reclaimed}
+
+
+def _remove_dirs(dirs: List[Tuple[str, int]]) -> dict:
+    removed = reclaimed = 0
+    for path, size in dirs:
+        shutil.rmtree(path, ignore_errors=True)
+        if not os.path.exists(path):
+            removed += 1
+            reclaimed += size
+    return {"count": removed, "bytes": reclaimed}
+
+
+def _clean_git(base_path: Path, state_path: Path, log: Callable[[str], None]) -> dict:
+    reports = git_maintenance.maintain_all(base_path, state_path, log)
+    reclaimed = sum(
+        max(0, report["before"]["size_bytes"] - report["after"]["size_bytes"]) for report in reports.values()
+    )
+    return {"count": len(reports), "bytes": reclaimed}
+
+
+def clean(
+    scan_result: ScanResult,
+    actions: List[str],
+    base_path: Path,
+    state_path: Path,
+    log: Optional[Callable[[str], None]] = None,
+) -> Dict[str, dict]:
+    """执行选定的清理动作，返回每个动作实际删除的数量和回收的字节数"""
+    log = log or (lambda message: None)
+    results = {}
+    for action in actions:
+        if action == "bytecode":
+            results[action] = _remove_files(scan_result.bytecode)
+        elif action == "stale":
+            results[action] = _remove_dirs(scan_result.stale_dirs)
+        elif action == "logs":
+            results[action] = _remove_files(scan_result.old_logs)
+        elif action == "git":
+            results[action] = _clean_git(base_path, state_path, log)
+        log(f"✅ {ACTIONS[action]}: 回收 {format_size(results[action]['bytes'])}")
+    return results
+
+
+def format_report(scan_result: ScanResult) -> List[str]:
+    lines = [
+        f"共 {scan_result.files} 个文件，{format_size(scan_result.total_bytes)}，"
+        f"扫描用时 {scan_result.seconds:.1f} 秒" + (f"（{scan_result.errors} 个目录无法读取）" if scan_result.errors else ""),
+        "",
+        "占用最大的目录：",
+    ]
+    for path, size in scan_result.top_directories():
+        lines.append(f"  {format_size(size):>10}  {os.path.relpath(path, scan_result.root)}")
+    lines += ["", "按文件类型："]
+    for category, size in sorted(scan_result.categories.items(), key=lambda item: item[1], reverse=True):
+        lines.append(f"  {format_size(size):>10}  {category}")
+    return lines
+
+
+def format_plan(planned: Dict[str, dict]) -> List[str]:
+    lines = []
+    for action, entry in planned.items():
+        if entry["bytes"] is None:
+            lines.append(f"  {action:<9} {ACTIONS[action]}: 执行仓库维护后统计")
+        else:
+            lines.append(f"  {action:<9} {ACTIONS[action]}: {entry['count']} 项，{format_size(entry['bytes'])}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="磁盘占用分析与清理")
+    parser.add_argument("--clean", help=f"执行清理，多个用逗号隔开: {','.join(ACTIONS)} 或 all")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent.absolute()
+    state_path = base_path / "core" / ".onekey"
+    scan_result = scan(base_path, load_policy(base_path), args.workers)
+    planned = plan(scan_result)
+    actions = []
+    if args.clean:
+        actions = list(ACTIONS) if args.clean == "all" else [item.strip() for item in args.clean.split(",")]
+        unknown = [action for action in actions if action not in ACTIONS]
+        if unknown:
+            print(f"未知的清理动作: {', '.join(unknown)}")
+            sys.exit(1)
+    if not args.json:
+        for line in format_report(scan_result):
+            print(line)
+        print()
+        print("可清理：")
+        for line in format_plan(planned):
+            print(line)
+        if actions:
+            print()
+    results = clean(scan_result, actions, base_path, state_path, None if args.json else print)
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "files": scan_result.files,
+                    "bytes": scan_result.total_bytes,
+                    "seconds": scan_result.seconds,
+                    "top": scan_result.top_directories(),
+                    "categories": scan_result.categories,
+                    "plan": planned,
+                    "cleaned": results,
+                },
+                indent=2,
+                ensure_ascii=False,
+            )
+        )
+        return
+    if results:
+        print(f"共回收 {format_size(sum(entry['bytes'] for entry in results.values()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+多安装目录批量管理（fleet）
+同一台机器上有多个一键包安装目录时，在一个命令中对所有目录执行 更新 / 安装依赖 / 启动 / 停止 / 状态查看，
+按 --concurrency 限制同时处理的目录数，并汇总每个目录的结果。
+各目录共用的工作只做一次：
+- 每个上游仓库在 core/.onekey/fleet/repos 中保留一份镜像，只从网络拉取一次，
+  各目录再从本地镜像预取并记录到各自的 prefetch.json，更新时直接本地快进（见 prefetch.py）
+- 依赖 wheel 按 requirements.txt 内容去重，只下载一次到共享目录，各目录的 pip 从该目录离线安装
+启动/停止/状态通过各目录自己的 `onekey.py --start/--stop/--status` 执行，更新通过各自的 update.py，
+因此每个目录都按自己的代码版本运行。
+"""
+
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 内置的嵌入式Python不会自动把脚本所在目录加入 sys.path
+sys.path.insert(0, str(Path(__file__).parent.absolute()))
+
+import git_tools  # noqa: E402
+import prefetch  # noqa: E402
+from background_update import UpdateJob  # noqa: E402
+
+DEFAULT_CONCURRENCY = 4
+MIRROR_TIMEOUT = 1800
+COMMAND_TIMEOUT = 600
+# 镜像拉取与 wheel 下载以较低优先级运行
+FLEET_LIMITS = {"priority": "below_normal"}
+
+
+def _python_executable(root: Path) -> str:
+    embedded = root / "python_embedded" / "python.exe"
+    return str(embedded) if embedded.exists() else sys.executable
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+def load_roots(config_path: Optional[Path], roots: List[str]) -> Tuple[List[Path], dict]:
+    """合并 fleet.json 与命令行中的安装目录，按真实路径去重"""
+    config = {}
+    if config_path and config_path.exists():
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    unique: Dict[str, Path] = {}
+    for root in [*config.get("installs", []), *roots]:
+        path = Path(root).expanduser().resolve()
+        unique.setdefault(str(path).lower() if sys.platform == "win32" else str(path), path)
+    return list(unique.values()), config
+
+
+class Fleet:
+    def __init__(self, roots: List[Path], cache_path: Path, concurrency: int = DEFAULT_CONCURRENCY):
+        self.roots = roots
+        self.cache_path = cache_path
+        self.concurrency = max(1, concurrency)
+        self.git = git_tools.find_git_executable(Path(__file__).parent.absolute())
+        self.wheel_dir = cache_path / "wheels"
+
+    def name(self, root: Path) -> str:
+        names = [other.name for other in self.roots]
+        return root.name if names.count(root.name) == 1 else str(root)
+
+    def for_each(self, action: Callable[[Path], Tuple[bool, str]]) -> List[dict]:
+        """对每个安装目录并发执行 action，返回按目录顺序排列的结果"""
+
+        def run(root: Path) -> dict:
+            start = time.time()
+            try:
+                ok, summary = action(root)
+            except Exception as e:
+                ok, summary = False, f"出错: {e}"
+            return {"install": self.name(root), "root": str(root), "ok": ok, "summary": summary, "seconds": time.time() - start}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return list(pool.map(run, self.roots))
+
+    # ==================== 共享工作 ====================
+    def _mirror_path(self, repo_url: str) -> Path:
+        return self.cache_path / "repos" / f"{_digest(repo_url)}.git"
+
+    def sync_mirrors(self) -> Dict[str, dict]:
+        """每个上游仓库只从网络拉取一次，返回 {repo_url: {"ok", "error"}}"""
+        urls = sorted({
+            repo["repo_url"]
+            for root in self.roots
+            for repo in self._repos(root).values()
+            if repo.get("repo_url") and not repo.get("bundle_source") and (repo["path"] / ".git").exists()
+        })
+
+        def sync(url: str) -> Tuple[str, dict]:
+            mirror = self._mirror_path(url)
+            if (mirror / "HEAD").exists():
+                ok, _, stderr = git_tools.run_git(
+                    self.git, mirror, ["fetch", "--prune", "--quiet", "origin"],
+                    timeout=MIRROR_TIMEOUT, limits=FLEET_LIMITS,
+                )
+            else:
+                mirror.parent.mkdir(parents=True, exist_ok=True)
+                ok, _, stderr = git_tools.run_git(
+                    self.git, mirror.parent, ["clone", "--mirror", "--quiet", url, str(mirror)],
+                    timeout=MIRROR_TIMEOUT, limits=FLEET_LIMITS,
+                )
+            return url, {"ok": ok, "error": "" if ok else stderr.strip()[:300]}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            return dict(pool.map(sync, urls))
+
+    def download_wheels(self, requirements: List[str], index_url: Optional[str] = None) -> Dict[str, bool]:
+        """相同内容的 requirements 只下载一次；已下载的 wheel 不会重复下载"""
+        results = {}
+        requirements_dir = self.cache_path / "requirements"
+        requirements_dir.mkdir(parents=True, exist_ok=True)
+        self.wheel_dir.mkdir(parents=True, exist_ok=True)
+        for text in dict.fromkeys(requirements):
+            digest = _digest(text)
+            path = requirements_dir / f"{digest}.txt"
+            path.write_text(text, encoding="utf-8")
+            cmd = [
+                _python_executable(Path(__file__).parent.absolute()),
+                "-m", "pip", "download", "-r", str(path), "-d", str(self.wheel_dir),
+                "--disable-pip-version-check", "--quiet",
+            ]
+            if index_url:
+                cmd += ["-i", index_url]
+            results[digest] = subprocess.run(cmd).returncode == 0
+        return results
+
+    def _repos(self, root: Path) -> Dict[str, dict]:
+        try:
+            return git_tools.load_repos(root)
+        except (OSError, ValueError):
+            return {}
+
+    def _mirror_requirements(self, repo: dict) -> Optional[str]:
+        mirror = self._mirror_path(repo["repo_url"])
+        ok, stdout, _ = git_tools.run_git(
+            self.git, mirror, ["show", f"refs/heads/{repo.get('branch', 'master')}:requirements.txt"]
+        )
+        return stdout if ok else None
+
+    # ==================== 各项操作 ====================
+    def update(self, index_url: Optional[str] = None) -> List[dict]:
+        if not self.git:
+            raise RuntimeError("未找到 Git")
+        print("正在同步共享仓库镜像 ...", flush=True)
+        mirrors = self.sync_mirrors()
+        for url, result in mirrors.items():
+            if not result["ok"]:
+                print(f"⚠️ 镜像同步失败，相关目录将直接从网络更新: {url}: {result['error']}")
+        # 依赖以各分支最新提交的 requirements.txt 为准
+        requirements = [
+            text
+            for root in self.roots
+            for repo in self._repos(root).values()
+            if mirrors.get(repo.get("repo_url"), {}).get("ok")
+            for text in [self._mirror_requirements(repo)]
+            if text
+        ]
+        if requirements:
+            print(f"正在下载依赖 wheel（{len(set(requirements))} 份不同的 requirements）...", flush=True)
+            self.download_wheels(requirements, index_url)
+
+        def update_one(root: Path) -> Tuple[bool, str]:
+            state_path = root / "core" / ".onekey"
+            for key, repo in self._repos(root).items():
+                if not mirrors.get(repo.get("repo_url"), {}).get("ok") or not (repo["path"] / ".git").exists():
+                    continue
+                local = {**repo, "repo_url": str(self._mirror_path(repo["repo_url"]))}
+                prefetch.record_fetch(state_path, key, prefetch.prefetch_repo(self.git, local))
+            job = UpdateJob(
+                Path(_python_executable(root)),
+                root / "update.py",
+                self.cache_path / "logs" / f"{_digest(str(root))}-update.log",
+                extra_args=["--find-links", str(self.wheel_dir)],
+            )
+            job.start()
+            job.wait()
+            changed = job.changed_services()
+            failed = [f"{p['service']} {p['phase']}" for p in job.phases if p["status"] == "failed"]
+            if failed:
+                return False, f"失败: {', '.join(failed)}，日志: {job.log_path}"
+            if not job.succeeded:
+                return False, f"更新程序退出码 {job.process.returncode}，日志: {job.log_path}"
+            return True, f"已更新: {', '.join(changed)}" if changed else "已是最新"
+
+        return self.for_each(update_one)
+
+    def install(self, index_url: Optional[str] = None) -> List[dict]:
+        requirements = {
+            root: (root / "core" / "Bot" / "requirements.txt").read_text(encoding="utf-8")
+            for root in self.roots
+            if (root / "core" / "Bot" / "requirements.txt").exists()
+        }
+        self.download_wheels(list(requirements.values()), index_url)
+
+        def install_one(root: Path) -> Tuple[bool, str]:
+            if root not in requirements:
+                return True, "无需安装依赖"
+            result = subprocess.run(
+                [
+                    _python_executable(root), "-m", "pip", "install",
+                    "-r", str(root / "core" / "Bot" / "requirements.txt"),
+                    "--no-index", "--find-links", str(self.wheel_dir),
+                    "--disable-pip-version-check", "--quiet",
+                ],
+                capture_output=True, text=True, encoding="utf-8", errors="ignore",
+            )
+            if result.returncode != 0:
+                return False, (result.stderr.strip().splitlines() or ["pip 安装失败"])[-1]
+            return True, "依赖已安装"
+
+        return self.for_each(install_one)
+
+    def _onekey(self, root: Path, args: List[str]) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            [_python_executable(root), str(root / "onekey.py"), *args],
+            cwd=str(root), capture_output=True, text=True, encoding="utf-8", errors="ignore",
+            timeout=COMMAND_TIMEOUT,
+        )
+
+    def start(self, services: List[str]) -> List[dict]:
+        def start_one(root: Path) -> Tuple[bool, str]:
+            result = self._onekey(root, ["--start", *services])
+            lines = [line for line in result.stdout.splitlines() if line.strip()]
+            return result.returncode == 0, lines[-1] if lines else f"退出码 {result.returncode}"
+
+        return self.for_each(start_one)
+
+    def stop(self, services: List[str]) -> List[dict]:
+        def stop_one(root: Path) -> Tuple[bool, str]:
+            result = self._onekey(root, ["--stop", *services])
+            return result.returncode == 0, "已停止" if result.returncode == 0 else result.stdout.strip()[-200:]
+
+        return self.for_each(stop_one)
+
+    def status(self) -> List[dict]:
+        def status_one(root: Path) -> Tuple[bool, str]:
+            result = self._onekey(root, ["--status", "--json"])
+            if result.returncode != 0:
+                return False, (result.stderr.strip().splitlines() or [f"退出码 {result.returncode}"])[-1]
+            status = json.loads(result.stdout.strip().splitlines()[-1])
+            running = [f"{key}({entry['pid']})" for key, entry in status.items() if entry["running"]]
+            return True, f"运行中: {', '.join(running)}" if running else "没有运行中的服务"
+
+        return self.for_each(status_one)
+
+
+def format_results(results: List[dict]) -> str:
+    width = max((len(result["install"]) for result in results), default=0)
+    lines = [
+        f"{'✅' if result['ok'] else '❌'} {result['install']:<{width}}  {result['seconds']:6.1f}s  {result['summary']}"
+        for result in results
+    ]
+    failed = sum(not result["ok"] for result in results)
+    lines.append(f"共 {len(results)} 个安装目录，成功 {len(results) - failed}，失败 {failed}")
+    return "\n".join(lines)
+
+
+def main():
+    base_path = Path(__file__).parent.absolute()
+    parser = argparse.ArgumentParser(description="批量管理多个一键包安装目录")
+    parser.add_argument("command", choices=["update", "install", "start", "stop", "status"])
+    parser.add_argument("services", nargs="*", help="start/stop 的服务名，默认 bot napcat；stop 可用 all")
+    parser.add_argument("--config", type=Path, default=base_path / "fleet.json", help="安装目录列表文件")
+    parser.add_argument("--root", action="append", default=[], help="安装目录，可重复指定")
+    parser.add_argument("--concurrency", type=int, help=f"同时处理的目录数，默认 {DEFAULT_CONCURRENCY}")
+    parser.add_argument("--index-url", help="下载依赖使用的 PyPI 镜像")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出结果")
+    args = parser.parse_args()
+
+    roots, config = load_roots(args.config, args.root)
+    if not roots:
+        raise SystemExit("没有安装目录：请在 fleet.json 的 installs 中列出，或使用 --root 指定")
+    fleet = Fleet(
+        roots,
+        base_path / "core" / ".onekey" / "fleet",
+        args.concurrency or config.get("concurrency", DEFAULT_CONCURRENCY),
+    )
+    if args.command == "update":
+        results = fleet.update(args.index_url)
+    elif args.command == "install":
+        results = fleet.install(args.index_url)
+    elif args.command == "start":
+        results = fleet.start(args.services or ["bot", "napcat"])
+    elif args.command == "stop":
+        results = fleet.stop(args.services or ["all"])
+    else:
+        results = fleet.status()
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print(format_results(results))
+    sys.exit(0 if all(result["ok"] for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
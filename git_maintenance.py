@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Git 仓库维护
+对 update_config.json 中的仓库执行：
+- repack 合并松散对象和零散的包，prune 清理两周前的不可达对象
+- 写入 commit-graph 和 multi-pack-index，打包引用 (pack-refs)
+- 开启 untracked cache，以及支持的平台上的内置 fsmonitor
+并记录维护前后 `git status` 的耗时和 .git 占用空间。
+管理程序启动时若距上次维护超过 MAINTENANCE_INTERVAL_DAYS 天会在后台自动执行，
+也可以用 `python git_maintenance.py --if-due` 配合系统计划任务定期运行。
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import git_tools
+
+MAINTENANCE_INTERVAL_DAYS = 7
+PRUNE_EXPIRE = "2.weeks.ago"
+# 维护任务不急，降低优先级避免影响正在运行的 Bot
+MAINTENANCE_LIMITS = {"priority": "below_normal"}
+# 内置 fsmonitor 守护进程仅在 Windows/macOS 上可用 (Git 2.37+)
+FSMONITOR_PLATFORMS = ("win32", "darwin")
+LOCK_STALE_SECONDS = 3600
+
+
+def repo_stats(repo_path: Path) -> dict:
+    """统计 .git 目录大小、松散对象数和包文件数。"""
+    git_dir = repo_path / ".git"
+    objects = git_dir / "objects"
+    size = loose = packs = 0
+    for root, _, files in os.walk(git_dir):
+        root_path = Path(root)
+        for name in files:
+            try:
+                size += os.path.getsize(root_path / name)
+            except OSError:
+                continue
+        if root_path.parent == objects and len(root_path.name) == 2:
+            loose += len(files)
+        elif root_path == objects / "pack":
+            packs += sum(name.endswith(".pack") for name in files)
+    return {"size_bytes": size, "loose_objects": loose, "packs": packs}
+
+
+def time_status(git: str, repo_path: Path, runs: int = 2) -> Optional[float]:
+    """测量 `git status --porcelain` 的耗时（毫秒），取多次中最快的一次以排除冷缓存影响。"""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        ok, _, _ = git_tools.run_git(git, repo_path, ["status", "--porcelain"])
+        elapsed = (time.perf_counter() - start) * 1000
+        if not ok:
+            return None
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _steps(git: str) -> List[tuple]:
+    version = git_tools.git_version(git)
+    steps = [
+        ("开启 untracked cache", ["config", "core.untrackedCache", "true"]),
+        ("开启 commit-graph", ["config", "core.commitGraph", "true"]),
+        ("拉取时更新 commit-graph", ["config", "fetch.writeCommitGraph", "true"]),
+    ]
+    if sys.platform in FSMONITOR_PLATFORMS and version >= (2, 37):
+        steps.append(("开启 fsmonitor", ["config", "core.fsmonitor", "true"]))
+    steps += [
+        ("打包引用", ["pack-refs", "--all", "--prune"]),
+        ("重新打包对象", ["repack", "-a", "-d", "-q"]),
+        ("清理不可达对象", ["prune", f"--expire={PRUNE_EXPIRE}"]),
+        ("写入 commit-graph", ["commit-graph", "write", "--reachable", "--changed-paths"]),
+        ("写入 multi-pack-index", ["multi-pack-index", "write"]),
+        ("刷新 untracked cache", ["update-index", "--untracked-cache", "--refresh", "-q"]),
+    ]
+    return steps
+
+
+def maintain_repo(git: str, repo_path: Path, log: Optional[Callable[[str], None]] = None) -> dict:
+    log = log or (lambda message: None)
+    report = {
+        "path": str(repo_path),
+        "before": {**repo_stats(repo_path), "status_ms": time_status(git, repo_path)},
+        "steps": [],
+    }
+    for name, args in _steps(git):
+        start = time.perf_counter()
+        ok, _, stderr = git_tools.run_git(git, repo_path, args, limits=MAINTENANCE_LIMITS)
+        seconds = time.perf_counter() - start
+        report["steps"].append({"name": name, "ok": ok, "seconds": seconds, "error": stderr.strip() if not ok else ""})
+        log(f"{'✅' if ok else '⚠️'} {name} ({seconds:.1f}s)" + ("" if ok else f": {stderr.strip()[:200]}"))
+    report["after"] = {**repo_stats(repo_path), "status_ms": time_status(git, repo_path)}
+    return report
+
+
+def _acquire_lock(lock_path: Path) -> bool:
+    """防止管理程序和计划任务同时维护同一批仓库。"""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if time.time() - lock_path.stat().st_mtime > LOCK_STALE_SECONDS:
+            lock_path.unlink()
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def load_state(state_path: Path) -> dict:
+    try:
+        with open(state_path / "git_maintenance.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def is_due(state_path: Path, interval_days: float = MAINTENANCE_INTERVAL_DAYS) -> bool:
+    last_run = load_state(state_path).get("last_run", 0)
+    return time.time() - last_run >= interval_days * 86400
+
+
+def maintain_all(base_path: Path, state_path: Path, log: Optional[Callable[[str], None]] = None) -> Dict[str, dict]:
+    """维护所有仓库并保存报告；已有维护在进行时返回空字典。"""
+    log = log or (lambda message: None)
+    git = git_tools.find_git_executable(base_path)
+    if not git:
+        log("❌ 未找到 Git")
+        return {}
+    lock_path = state_path / "git_maintenance.lock"
+    if not _acquire_lock(lock_path):
+        log("⚠️ 已有维护任务正在进行")
+        return {}
+    reports = {}
+    try:
+        for key, repo in git_tools.load_repos(base_path).items():
+            if not (repo["path"] / ".git").is_dir():
+                continue
+            log(f"--- {repo['name']} ---")
+            reports[key] = maintain_repo(git, repo["path"], log)
+        with open(state_path / "git_maintenance.json", "w", encoding="utf-8") as f:
+            json.dump({"last_run": time.time(), "reports": reports}, f, indent=2, ensure_ascii=False)
+    finally:
+        lock_path.unlink(missing_ok=True)
+    return reports
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_report(report: dict) -> List[str]:
+    before, after = report["before"], report["after"]
+
+    def status(value):
+        return f"{value:.0f}ms" if value is not None else "失败"
+
+    return [
+        f"git status: {status(before['status_ms'])} → {status(after['status_ms'])}",
+        f"仓库大小: {format_size(before['size_bytes'])} → {format_size(after['size_bytes'])}",
+        f"松散对象: {before['loose_objects']} → {after['loose_objects']} | 包文件: {before['packs']} → {after['packs']}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Git 仓库维护")
+    parser.add_argument("--if-due", action="store_true", help="仅在距上次维护超过间隔时执行（用于计划任务）")
+    parser.add_argument("--interval-days", type=float, default=MAINTENANCE_INTERVAL_DAYS)
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent.absolute()
+    state_path = base_path / "core" / ".onekey"
+    state_path.mkdir(parents=True, exist_ok=True)
+    if args.if_due and not is_due(state_path, args.interval_days):
+        print("距上次维护未超过间隔，跳过")
+        return
+    for key, report in maintain_all(base_path, state_path, print).items():
+        print(f"{key}:")
+        for line in format_report(report):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
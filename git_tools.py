@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Git 辅助函数
+供管理程序各功能共用，尽量直接读取 .git 目录，避免为简单查询启动 git 进程。
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import resource_limits
+
+
+def _git_dir(repo_path: Path) -> Optional[Path]:
+    git_path = repo_path / ".git"
+    if git_path.is_dir():
+        return git_path
+    if git_path.is_file():
+        # 工作树/子模块中的 .git 是一个指向真实目录的文件
+        content = git_path.read_text(encoding="utf-8").strip()
+        if content.startswith("gitdir:"):
+            return (repo_path / content[len("gitdir:"):].strip()).resolve()
+    return None
+
+
+def read_ref(repo_path: Path, ref: str) -> Optional[str]:
+    """读取引用（如 refs/remotes/origin/master）指向的提交，依次查找松散引用和 packed-refs。"""
+    git_dir = _git_dir(repo_path)
+    if git_dir is None:
+        return None
+    ref_file = git_dir / ref
+    if ref_file.is_file():
+        return ref_file.read_text(encoding="utf-8").strip() or None
+    packed = git_dir / "packed-refs"
+    if packed.is_file():
+        for line in packed.read_text(encoding="utf-8").splitlines():
+            if line.endswith(" " + ref) and not line.startswith(("#", "^")):
+                return line.split(" ", 1)[0]
+    return None
+
+
+def read_head_commit(repo_path: Path) -> Optional[str]:
+    """返回 HEAD 指向的提交 SHA，仓库不存在或无法解析时返回 None。"""
+    git_dir = _git_dir(repo_path)
+    if git_dir is None:
+        return None
+    try:
+        head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+        if head.startswith("ref:"):
+            return read_ref(repo_path, head[len("ref:"):].strip())
+        return head or None
+    except OSError:
+        return None
+
+
+def find_git_executable(base_path: Path) -> Optional[str]:
+    """优先使用内置的 PortableGit，其次使用 PATH 中的 git。"""
+    git_exe_path = base_path / "PortableGit" / "bin" / "git.exe"
+    if git_exe_path.exists():
+        return str(git_exe_path)
+    return shutil.which("git")
+
+
+def git_env() -> dict:
+    env = os.environ.copy()
+    env["GIT_TERMINAL_PROMPT"] = "0"
+    return env
+
+
+def run_git(
+    git: str,
+    repo_path: Path,
+    args: List[str],
+    timeout: Optional[float] = None,
+    limits: Optional[dict] = None,
+) -> Tuple[bool, str, str]:
+    """执行一条 git 命令，返回 (是否成功, stdout, stderr)；limits 见 resource_limits.py。"""
+    limits = resource_limits.normalize(limits) if limits else {}
+    try:
+        process = subprocess.Popen(
+            [git, *args],
+            cwd=str(repo_path),
+            env=git_env(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="ignore",
+            **resource_limits.popen_options(limits, "git"),
+        )
+        resource_limits.after_launch(process, limits, "git")
+        stdout, stderr = process.communicate(timeout=timeout)
+        return process.returncode == 0, stdout, stderr
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        return False, "", "timeout"
+    except OSError as e:
+        return False, "", str(e)
+
+
+def git_version(git: str) -> Tuple[int, ...]:
+    ok, stdout, _ = run_git(git, Path.cwd(), ["--version"])
+    match = re.search(r"(\d+)\.(\d+)(?:\.(\d+))?", stdout) if ok else None
+    if not match:
+        return (0,)
+    return tuple(int(part) for part in match.groups() if part is not None)
+
+
+def load_repos(base_path: Path) -> Dict[str, dict]:
+    """读取 update_config.json 中的仓库列表，路径转换为绝对路径。"""
+    with open(base_path / "update_config.json", "r", encoding="utf-8") as f:
+        repos = json.load(f)
+    for settings in repos.values():
+        settings["path"] = (base_path / settings["path"]).resolve()
+    return repos
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+多实例管理
+多个 QQ 账号共用同一份 core/Bot 代码和 python_embedded 环境：
+- 每个实例位于 core/instances/<名称>，拥有独立的 config、data（含 MaiBot.db）、logs 和 .env
+- 其余文件（src、plugins、__main__.py 等）以目录联接/链接的方式指向 core/Bot，不复制代码
+- 适配器端口和 Bot 服务端口自动分配，互不冲突
+"""
+
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import tomllib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 每个实例独享的条目，其余条目都链接到共享的 core/Bot
+PER_INSTANCE_ENTRIES = {"config", "data", "logs", ".env", ".git", "__pycache__"}
+
+# 主实例（core/Bot）占用的默认端口
+DEFAULT_ADAPTER_PORT = 8095
+DEFAULT_SERVER_PORT = 8000
+
+NAME_RE = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def _port_is_free(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("127.0.0.1", port))
+        except OSError:
+            return False
+    return True
+
+
+def _link_dir(source: Path, target: Path):
+    if os.name == "nt":
+        # 目录联接不需要管理员权限
+        import _winapi
+
+        _winapi.CreateJunction(str(source), str(target))
+    else:
+        os.symlink(source, target, target_is_directory=True)
+
+
+def _link_file(source: Path, target: Path):
+    try:
+        os.link(source, target)
+    except OSError:
+        # 跨磁盘等无法硬链接的情况退回到复制
+        shutil.copy2(source, target)
+
+
+def _is_link(path: Path) -> bool:
+    # os.readlink 在 Windows 上同样可以识别目录联接
+    try:
+        os.readlink(path)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def _remove_entry(target: Path):
+    if _is_link(target):
+        # 只删除链接本身，不影响共享目录里的内容
+        if os.name == "nt" and target.is_dir():
+            os.rmdir(target)
+        else:
+            target.unlink()
+    elif target.is_dir():
+        shutil.rmtree(target)
+    else:
+        target.unlink()
+
+
+class InstanceManager:
+    def __init__(self, base_path: Path, python_executable: Path):
+        self.base_path = base_path
+        self.python_executable = python_executable
+        self.bot_path = base_path / "core" / "Bot"
+        self.napcat_path = base_path / "core" / "Napcat"
+        self.instances_path = base_path / "core" / "instances"
+        self.registry_file = self.instances_path / "instances.json"
+        self.instances: Dict[str, dict] = self._load()
+
+    # ==================== 实例登记 ====================
+    def _load(self) -> Dict[str, dict]:
+        if not self.registry_file.exists():
+            return {}
+        try:
+            with open(self.registry_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        self.instances_path.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.registry_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self.instances, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_file, self.registry_file)
+
+    def instance_path(self, name: str) -> Path:
+        return self.instances_path / name
+
+    def _allocate_port(self, kind: str, start: int) -> int:
+        used = {instance["ports"][kind] for instance in self.instances.values()}
+        port = start + 1
+        while port in used or not _port_is_free(port):
+            port += 1
+        return port
+
+    def main_qq_account(self) -> Optional[str]:
+        """主实例 core/Bot 配置中的 QQ 号，未配置或无法读取时返回 None"""
+        try:
+            with open(self.bot_path / "config" / "bot_config.toml", "rb") as f:
+                qq_account = tomllib.load(f).get("bot", {}).get("qq_account")
+        except (OSError, tomllib.TOMLDecodeError):
+            return None
+        return str(qq_account).strip() if qq_account else None
+
+    # ==================== 创建与同步 ====================
+    def create(self, name: str, qq_account: str) -> dict:
+        """创建实例：复制配置模板、分配端口并用配置向导的批量模式写入 QQ 号和端口。"""
+        if not NAME_RE.match(name):
+            raise ValueError("实例名称只能包含字母、数字、下划线和短横线")
+        if name in self.instances or self.instance_path(name).exists():
+            raise ValueError(f"实例 {name} 已存在")
+        if not qq_account.isdigit():
+            raise ValueError(f"QQ 号无效: {qq_account}")
+        # 与主实例同号时会生成同一份 onebot11_<QQ>.json，把主实例的 Napcat 改到新实例的端口上
+        if self.main_qq_account() == qq_account:
+            raise ValueError(f"QQ 号 {qq_account} 已被主实例 (core/Bot) 使用")
+        for other_name, other in self.instances.items():
+            if other["qq_account"] == qq_account:
+                raise ValueError(f"QQ 号 {qq_account} 已被实例 {other_name} 使用")
+        if not (self.bot_path / "config").exists():
+            raise FileNotFoundError(f"未找到配置模板目录: {self.bot_path / 'config'}")
+
+        instance = {
+            "qq_account": qq_account,
+            "ports": {
+                "adapter": self._allocate_port("adapter", DEFAULT_ADAPTER_PORT),
+                "server": self._allocate_port("server", DEFAULT_SERVER_PORT),
+            },
+        }
+        path = self.instance_path(name)
+        path.mkdir(parents=True)
+        shutil.copytree(self.bot_path / "config", path / "config")
+        (path / "data").mkdir()
+        (path / "logs").mkdir()
+        self._write_env(path, instance["ports"]["server"])
+        self.sync_tree(name)
+
+        env = os.environ.copy()
+        env["ONEKEY_QQ_ACCOUNT"] = qq_account
+        env["ONEKEY_PORT"] = str(instance["ports"]["adapter"])
+        result = subprocess.run(
+            [
+                str(self.python_executable),
+                str(self.base_path / "config_wizard.py"),
+                "--batch",
+                "--bot-dir",
+                str(path),
+                "--napcat-config-dir",
+                str(self.napcat_path / "config"),
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="ignore",
+        )
+        if result.returncode != 0:
+            shutil.rmtree(path, ignore_errors=True)
+            raise RuntimeError((result.stdout + result.stderr).strip() or "配置向导执行失败")
+
+        self.instances[name] = instance
+        self._save()
+        return instance
+
+    def _write_env(self, path: Path, server_port: int):
+        """沿用主实例的 .env（如 EULA 确认），只替换服务端口。"""
+        lines = []
+        main_env = self.bot_path / ".env"
+        if main_env.exists():
+            with open(main_env, "r", encoding="utf-8") as f:
+                lines = [
+                    line.rstrip("\n")
+                    for line in f
+                    if not line.strip().startswith("PORT=")
+                ]
+        lines.append(f"PORT={server_port}")
+        with open(path / ".env", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def sync_tree(self, name: str):
+        """让实例目录中的共享条目与 core/Bot 保持一致（更新代码后文件可能被替换）。"""
+        path = self.instance_path(name)
+        shared = {
+            entry.name: entry
+            for entry in self.bot_path.iterdir()
+            if entry.name not in PER_INSTANCE_ENTRIES
+        }
+        for entry in path.iterdir():
+            if entry.name not in PER_INSTANCE_ENTRIES and entry.name not in shared:
+                _remove_entry(entry)
+
+        for entry_name, source in shared.items():
+            target = path / entry_name
+            if source.is_dir():
+                if target.exists() or _is_link(target):
+                    continue
+                _link_dir(source, target)
+            else:
+                if target.exists():
+                    try:
+                        if os.path.samefile(source, target):
+                            continue
+                    except OSError:
+                        pass
+                    target.unlink()
+                _link_file(source, target)
+
+    # ==================== 服务定义 ====================
+    def services(self) -> Dict[str, dict]:
+        """生成各实例对应的服务定义，键为 bot@名称 / napcat@名称。"""
+        services = {}
+        for name, instance in self.instances.items():
+            services[f"bot@{name}"] = {
+                "name": f"MoFox_Bot 主程序 [{name}]",
+                "path": self.instance_path(name),
+                "main_file": "__main__.py",
+                "type": "python",
+                "instance": name,
+            }
+            services[f"napcat@{name}"] = {
+                "name": f"Napcat 服务 [{name}]",
+                "path": self.napcat_path,
+                "main_file": "napcat.bat",
+                "type": "batch",
+                # Napcat 按 QQ 号快速登录，多个账号共用同一份 Napcat
+                "args": ["-q", instance["qq_account"]],
+                "instance": name,
+            }
+        return services
+
+    def resolve_names(self, selection: str) -> List[str]:
+        """解析用户输入的实例列表，支持逗号/空格分隔或 all。"""
+        selection = selection.strip()
+        if selection.lower() in ("all", "*"):
+            return list(self.instances)
+        names = [item for item in re.split(r"[\s,]+", selection) if item]
+        unknown = [name for name in names if name not in self.instances]
+        if unknown:
+            raise ValueError(f"未知实例: {', '.join(unknown)}")
+        return names
+
+
+def describe(instance: dict) -> str:
+    ports = instance["ports"]
+    return f"QQ {instance['qq_account']} | 适配器端口 {ports['adapter']} | 服务端口 {ports['server']}"
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Bot ⇄ Napcat 链路延迟探针
+在后台以合成的 OneBot v11 客户端连接 Bot 适配器的 WS 端口，周期性地：
+1. 发送 ping，测量往返时延 (RTT)
+2. 发送 heartbeat 元事件并紧跟一个 ping，测量事件被服务端读取确认的时延 (ACK)
+并维护最近若干个样本的 p50/p95/p99。
+探针使用独立的 self_id，不冒充真实的 QQ 账号。
+适配器同一时间只服务一个 OneBot 客户端，探针只能在 Napcat 未运行时使用（管理程序会拒绝在
+Napcat 运行时开启，并在启动 Napcat 前关闭探针）；探针收到的 API 调用一律返回失败。
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from onebot_ws import (
+    OP_PING,
+    OP_PONG,
+    OP_TEXT,
+    StandInBot,
+    WebSocketClient,
+    WebSocketClosed,
+    make_event,
+    percentiles,
+)
+
+PROBE_SELF_ID = 10000
+
+
+class LatencyProbe(threading.Thread):
+    def __init__(
+        self,
+        url: str,
+        token: str = "",
+        interval: float = 5.0,
+        timeout: float = 3.0,
+        window: int = 720,
+        self_id: int = PROBE_SELF_ID,
+    ):
+        super().__init__(daemon=True)
+        self.url = url
+        self.token = token
+        self.interval = interval
+        self.timeout = timeout
+        self.self_id = self_id
+        self.rtt_ms: deque = deque(maxlen=window)
+        self.ack_ms: deque = deque(maxlen=window)
+        self.connected = False
+        self.failures = 0
+        self.last_error = ""
+        self._seq = 0
+        self._client: Optional[WebSocketClient] = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._client:
+            self._client.close()
+
+    def run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            try:
+                self._client = WebSocketClient(
+                    self.url, self.self_id, self.token, timeout=self.timeout
+                )
+                self.connected = True
+                backoff = 1.0
+                while not self._stop_event.is_set():
+                    self._probe_once()
+                    self._stop_event.wait(self.interval)
+            except (OSError, WebSocketClosed, ConnectionError) as e:
+                self.failures += 1
+                self.last_error = str(e) or type(e).__name__
+            finally:
+                self.connected = False
+                if self._client:
+                    self._client.close()
+                    self._client = None
+            # 断线后指数退避重连，最长 30 秒
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    def _probe_once(self):
+        client = self._client
+        self._seq += 1
+        token = f"rtt-{self._seq}".encode()
+        start = time.perf_counter()
+        client.send_ping(token)
+        self._wait_pong(token)
+        self.rtt_ms.append((time.perf_counter() - start) * 1000)
+
+        token = f"ack-{self._seq}".encode()
+        heartbeat = make_event(
+            self.self_id,
+            "meta_event",
+            meta_event_type="heartbeat",
+            status={"online": True, "good": True},
+            interval=int(self.interval * 1000),
+        )
+        start = time.perf_counter()
+        client.send_json(heartbeat)
+        # 服务端按顺序读取帧，收到紧随事件之后的 pong 即说明事件已被读取
+        client.send_ping(token)
+        self._wait_pong(token)
+        self.ack_ms.append((time.perf_counter() - start) * 1000)
+
+    def _wait_pong(self, token: bytes):
+        client = self._client
+        deadline = time.perf_counter() + self.timeout
+        while True:
+            client.sock.settimeout(max(0.01, deadline - time.perf_counter()))
+            opcode, payload = client.recv()
+            if opcode == OP_PONG and payload == token:
+                return
+            if opcode == OP_PING:
+                client.send(OP_PONG, payload)
+            elif opcode == OP_TEXT:
+                self._reject_action(payload)
+
+    def _reject_action(self, payload: bytes):
+        """探针不是真正的 Napcat，收到的 API 调用一律返回失败，避免对端一直等待。"""
+        try:
+            request = json.loads(payload)
+        except ValueError:
+            return
+        if "echo" in request:
+            self._client.send_json(
+                {
+                    "status": "failed",
+                    "retcode": 1404,
+                    "data": None,
+                    "message": "latency probe",
+                    "echo": request["echo"],
+                }
+            )
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "samples": len(self.rtt_ms),
+            "rtt_ms": percentiles(list(self.rtt_ms)),
+            "ack_ms": percentiles(list(self.ack_ms)),
+        }
+
+
+def format_snapshot(snapshot: dict) -> str:
+    def fmt(values):
+        if not values:
+            return "暂无数据"
+        return " / ".join(f"{key} {value:.1f}ms" for key, value in values.items())
+
+    state = "已连接" if snapshot["connected"] else f"未连接 ({snapshot['last_error'] or '连接中'})"
+    return f"{state} | RTT {fmt(snapshot['rtt_ms'])} | ACK {fmt(snapshot['ack_ms'])} | 样本 {snapshot['samples']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot ⇄ Napcat 链路延迟探针")
+    parser.add_argument("--url", help="Bot 适配器的 WS 地址，如 ws://127.0.0.1:8095")
+    parser.add_argument("--token", default="")
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--selftest", action="store_true", help="连接本地替身服务端进行自测")
+    args = parser.parse_args()
+
+    stand_in = None
+    url = args.url
+    if args.selftest or not url:
+        stand_in = StandInBot().start()
+        url = stand_in.url
+    probe = LatencyProbe(url, args.token, interval=args.interval)
+    probe.start()
+    time.sleep(args.duration)
+    probe.stop()
+    if stand_in:
+        stand_in.stop()
+    print(format_snapshot(probe.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
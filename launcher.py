@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+服务启动方式
+- console：Windows 默认。Python 服务通过 `powershell.exe -NoExit`、批处理通过 `cmd.exe /k`
+  直接在新控制台窗口中运行，服务退出后窗口保留，便于查看报错。记录到的 PID 是承载服务的
+  powershell / cmd 窗口进程而不是服务本身：窗口存活期间可以接管，停止时用 taskkill /T
+  连同窗口中启动的服务进程一起结束（见 service_state.terminate_tree）；CPU/内存统计包含其子进程。
+- direct：Linux 默认（也可在 Windows 上设置环境变量 ONEKEY_LAUNCH=direct 使用）。直接执行服务本身：
+  Python 服务为 `<python> __main__.py`，Napcat 为目录中的 napcat.sh 或 napcat 可执行文件，
+  不经过额外的外壳，启动更快，记录的 PID 就是服务进程。环境变量和工作目录显式传入，
+  输出写入 core/.onekey/logs/<服务>.log；服务在独立的会话中运行，关闭管理程序不会连带结束服务。
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+ENV_VAR = "ONEKEY_LAUNCH"
+
+
+class LaunchError(Exception):
+    pass
+
+
+def python_executable(base_path: Path) -> Path:
+    """一键包内置的 Python；Linux 上没有 python.exe 时使用 python_embedded/bin/python3 或当前解释器"""
+    embedded = base_path / "python_embedded" / "python.exe"
+    if os.name == "nt" or embedded.exists():
+        return embedded
+    posix_embedded = base_path / "python_embedded" / "bin" / "python3"
+    if posix_embedded.exists():
+        return posix_embedded
+    return Path(sys.executable)
+
+
+def backend() -> str:
+    # console 方式依赖 powershell.exe / cmd.exe，只在 Windows 上可用
+    if os.name != "nt":
+        return "direct"
+    return "direct" if os.environ.get(ENV_VAR, "").strip().lower() == "direct" else "console"
+
+
+def find_program(service_path: Path, main_file: str) -> Path:
+    """Linux 上把 napcat.bat / code.exe 对应到 napcat.sh、napcat、bin/code 等"""
+    if os.name == "nt":
+        return service_path / main_file
+    stem = Path(main_file).stem
+    for candidate in (service_path / f"{stem}.sh", service_path / stem, service_path / "bin" / stem):
+        if candidate.is_file():
+            return candidate
+    found = shutil.which(stem)
+    if found:
+        return Path(found)
+    raise LaunchError(f"在 {service_path} 中未找到 {stem}.sh 或 {stem}，PATH 中也没有 {stem}")
+
+
+def _program_argv(program: Path) -> List[str]:
+    if os.name == "nt" and program.suffix.lower() in (".bat", ".cmd"):
+        # 批处理只能由 cmd.exe 解释，/c 执行完即退出，PID 仍对应运行服务的那个 cmd
+        return ["cmd.exe", "/c", str(program)]
+    if os.name != "nt" and program.suffix == ".sh" and not os.access(program, os.X_OK):
+        return ["/bin/sh", str(program)]
+    return [str(program)]
+
+
+def direct_command(service: dict, python: Path, base_path: Path) -> List[str]:
+    service_path = service["path"]
+    main_file = service["main_file"]
+    service_type = service.get("type", "python")
+    if service_type == "python":
+        return [str(python), main_file]
+    if service_type in ("batch", "exe"):
+        command = _program_argv(find_program(service_path, main_file)) + service.get("args", [])
+        if service.get("name") == "VSCode":
+            command += ["-n", str(base_path / "core" / "Bot")]
+        return command
+    raise LaunchError(f"不支持的服务类型: {service_type}")
+
+
+def service_env(extra: Optional[dict] = None) -> dict:
+    env = os.environ.copy()
+    # 代替 console 方式中的 chcp 65001，保证中文输出不乱码
+    env["PYTHONIOENCODING"] = "utf-8"
+    env["PYTHONUNBUFFERED"] = "1"
+    env.update(extra or {})
+    return env
+
+
+def log_path(state_path: Path, service_key: str) -> Path:
+    return state_path / "logs" / f"{service_key.replace('@', '_')}.log"
+
+
+def launch_direct(
+    service_key: str,
+    service: dict,
+    python: Path,
+    base_path: Path,
+    state_path: Path,
+    launch_options: dict,
+    creationflags: int = 0,
+) -> subprocess.Popen:
+    command = direct_command(service, python, base_path)
+    log_file = log_path(state_path, service_key)
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_file, "ab") as log:
+        log.write(
+            f"\n===== {time.strftime('%Y-%m-%d %H:%M:%S')} {subprocess.list2cmdline(command)} =====\n".encode("utf-8")
+        )
+        log.flush()
+        options = dict(launch_options)
+        if os.name == "nt":
+            options["creationflags"] = creationflags | subprocess.CREATE_NO_WINDOW
+        else:
+            options["start_new_session"] = True
+        # 子进程持有日志文件的副本，这里关闭不影响写入
+        return subprocess.Popen(
+            command,
+            cwd=str(service["path"]),
+            env=service_env(),
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            **options,
+        )
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+知识库学习队列
+把要学习的文件（或目录中的所有文本文件）加入队列，在后台由工作线程（数量见 settings.workers）各自启动一个
+学习工具进程处理，记录每一项的状态、耗时、最近一行输出和失败原因。
+- 队列保存在 core/.onekey/learning_queue.json，每项状态变化都会立即写入；
+  管理程序退出或崩溃后重新开始处理时，已完成的项不会重复执行，中断的项重新排队
+- 学习工具进程以低优先级运行（默认 idle，见 resource_limits.py），不影响在线的 Bot
+- 已完成的文件再次加入时，内容（大小和修改时间）未变化则跳过
+- settings 可在队列文件中修改：workers 并发数（默认 1；学习工具写入同一个知识库，
+  未确认它能安全地并发写入，调高需自行承担风险），retries 失败重试次数，
+  command 启动命令，{python} / {input} 会替换为 Python 路径和要学习的文件（也可从环境变量
+  ONEKEY_LEARNING_INPUT 读取）。学习工具本身是交互式的，没有确定的非交互用法，因此 command
+  默认不设置，未设置时队列不会开始；填写的命令须能不读标准输入地学习单个文件，退出码 0 即视为已学习
+每项的输出写入 core/.onekey/learning/<编号>.log。
+命令行：python learning_queue.py add <文件或目录>... | run | status
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import launcher
+import resource_limits
+
+LEARNING_LIMITS = {"priority": "idle"}
+INPUT_SUFFIXES = (".txt", ".md", ".json")
+DEFAULT_SETTINGS = {
+    # 多个学习工具进程会同时写入 Bot 的知识库，默认逐个处理
+    "workers": 1,
+    "retries": 1,
+    # 需由用户填写，见模块说明
+    "command": None,
+}
+# 早期版本默认写入队列文件的命令：学习工具并不接受该参数，视为未设置
+_GUESSED_COMMAND = ["{python}", "lpmm_learning_tool.py", "{input}"]
+COMMAND_NOT_SET = (
+    "学习队列的启动命令尚未设置：请在 {queue_file} 的 settings.command 中填写能以非交互方式学习单个文件的命令，"
+    '例如 ["{{python}}", "脚本.py", "{{input}}"]；命令退出码为 0 时该项记为已完成'
+)
+STATUS_NAMES = {"pending": "等待中", "running": "进行中", "done": "已完成", "failed": "失败"}
+
+
+def _signature(path: Path) -> Optional[list]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def expand_inputs(paths: Iterable[Path]) -> List[Path]:
+    """目录展开为其中的文本文件（递归），按路径排序"""
+    files = []
+    for path in paths:
+        path = path.absolute()
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in INPUT_SUFFIXES))
+        elif path.is_file():
+            files.append(path)
+    return files
+
+
+class LearningQueue:
+    def __init__(
+        self,
+        tool_dir: Path,
+        state_path: Path,
+        python_executable: Path,
+        limits: Optional[dict] = None,
+    ):
+        self.tool_dir = tool_dir
+        self.state_path = state_path
+        self.python_executable = python_executable
+        self.limits = limits if limits is not None else dict(LEARNING_LIMITS)
+        self.queue_file = state_path / "learning_queue.json"
+        self.log_dir = state_path / "learning"
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._processes: Dict[int, subprocess.Popen] = {}
+        # 每项最近一行输出，只保存在内存中用于显示进度
+        self.last_lines: Dict[int, str] = {}
+        self.settings, self.items = self._load()
+
+    # ==================== 队列文件 ====================
+    def _load(self):
+        try:
+            with open(self.queue_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        items = data.get("items", [])
+        for item in items:
+            # 上次运行被中断的项重新排队
+            if item["status"] == "running":
+                item["status"] = "pending"
+        settings = {**DEFAULT_SETTINGS, **data.get("settings", {})}
+        if settings["command"] == _GUESSED_COMMAND:
+            settings["command"] = None
+        return settings, items
+
+    def _save(self):
+        """调用方需持有 self._lock"""
+        self.state_path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.queue_file.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"settings": self.settings, "items": self.items}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.queue_file)
+
+    # ==================== 队列操作 ====================
+    def add(self, paths: Iterable[Path]) -> dict:
+        """加入队列，返回 {"added", "skipped"}；未变化的已完成项和已在队列中的项跳过"""
+        added = skipped = 0
+        with self._lock:
+            by_path = {item["path"]: item for item in self.items}
+            next_id = max((item["id"] for item in self.items), default=0) + 1
+            for path in expand_inputs(paths):
+                signature = _signature(path)
+                item = by_path.get(str(path))
+                if item and (item["status"] in ("pending", "running") or (
+                    item["status"] == "done" and item["signature"] == signature
+                )):
+                    skipped += 1
+                    continue
+                if item:
+                    # 失败过或内容已变化的文件重新排队
+                    item.update({"status": "pending", "signature": signature, "attempts": 0, "error": None})
+                else:
+                    self.items.append(
+                        {
+                            "id": next_id,
+                            "path": str(path),
+                            "signature": signature,
+                            "status": "pending",
+                            "attempts": 0,
+                            "error": None,
+                            "started_at": None,
+                            "finished_at": None,
+                            "seconds": None,
+                        }
+                    )
+                    next_id += 1
+                added += 1
+            self._save()
+        return {"added": added, "skipped": skipped}
+
+    def retry_failed(self) -> int:
+        with self._lock:
+            failed = [item for item in self.items if item["status"] == "failed"]
+            for item in failed:
+                item.update({"status": "pending", "attempts": 0, "error": None})
+            self._save()
+        return len(failed)
+
+    def clear_done(self) -> int:
+        with self._lock:
+            before = len(self.items)
+            self.items = [item for item in self.items if item["status"] != "done"]
+            self._save()
+        return before - len(self.items)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {status: 0 for status in STATUS_NAMES}
+            for item in self.items:
+                counts[item["status"]] += 1
+        return counts
+
+    # ==================== 后台处理 ====================
+    @property
+    def running(self) -> bool:
+        return any(worker.is_alive() for worker in self._workers)
+
+    def start(self, workers: Optional[int] = None) -> int:
+        """启动工作线程，返回线程数；队列处理完后线程自动退出。未设置启动命令时抛出 ValueError"""
+        if self.running:
+            return 0
+        if not self.settings.get("command"):
+            raise ValueError(COMMAND_NOT_SET.format(queue_file=self.queue_file))
+        self._stop_event.clear()
+        self._workers = [
+            threading.Thread(target=self._worker, daemon=True, name=f"learning-{n}")
+            for n in range(max(1, int(workers or self.settings["workers"])))
+        ]
+        for worker in self._workers:
+            worker.start()
+        return len(self._workers)
+
+    def stop(self):
+        """停止处理：结束正在运行的学习进程，这些项重新排队，下次从它们继续"""
+        self._stop_event.set()
+        with self._lock:
+            processes = list(self._processes.values())
+        for process in processes:
+            try:
+                process.terminate()
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.join(timeout=10)
+
+    def wait(self):
+        for worker in self._workers:
+            worker.join()
+
+    def _next_item(self) -> Optional[dict]:
+        with self._lock:
+            for item in self.items:
+                if item["status"] == "pending":
+                    item.update({"status": "running", "started_at": time.time(), "finished_at": None})
+                    item["attempts"] += 1
+                    self._save()
+                    return item
+        return None
+
+    def _command(self, item: dict) -> List[str]:
+        return [
+            part.replace("{python}", str(self.python_executable)).replace("{input}", item["path"])
+            for part in self.settings["command"]
+        ]
+
+    def _worker(self):
+        while not self._stop_event.is_set():
+            item = self._next_item()
+            if item is None:
+                return
+            returncode, error = self._run_item(item)
+            with self._lock:
+                item["finished_at"] = time.time()
+                item["seconds"] = item["finished_at"] - item["started_at"]
+                if self._stop_event.is_set() and returncode != 0:
+                    # 被手动停止，不计为失败
+                    item["status"] = "pending"
+                    item["attempts"] -= 1
+                elif returncode == 0:
+                    item.update({"status": "done", "error": None})
+                elif item["attempts"] <= int(self.settings["retries"]):
+                    item.update({"status": "pending", "error": error})
+                else:
+                    item.update({"status": "failed", "error": error})
+                self._save()
+
+    def _run_item(self, item: dict) -> tuple:
+        """运行学习工具处理一项，返回 (退出码, 失败原因)"""
+        if not Path(item["path"]).exists():
+            return -1, "文件不存在"
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        limits = resource_limits.normalize(self.limits)
+        env = os.environ.copy()
+        env["PYTHONIOENCODING"] = "utf-8"
+        env["ONEKEY_LEARNING_INPUT"] = item["path"]
+        with open(self.log_dir / f"{item['id']}.log", "w", encoding="utf-8") as log:
+            try:
+                process = subprocess.Popen(
+                    self._command(item),
+                    cwd=str(self.tool_dir),
+                    env=env,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    encoding="utf-8",
+                    errors="ignore",
+                    **resource_limits.popen_options(limits, f"learning_{item['id']}"),
+                )
+            except OSError as e:
+                return -1, str(e)
+            resource_limits.after_launch(process, limits, f"learning_{item['id']}")
+            with self._lock:
+                self._processes[item["id"]] = process
+            if self._stop_event.is_set():
+                process.terminate()
+            last_line = ""
+            for line in process.stdout:
+                log.write(line)
+                if line.strip():
+                    last_line = line.strip()
+                    self.last_lines[item["id"]] = last_line
+            returncode = process.wait()
+        with self._lock:
+            self._processes.pop(item["id"], None)
+        self.last_lines.pop(item["id"], None)
+        return returncode, None if returncode == 0 else f"退出码 {returncode}: {last_line[:200]}"
+
+    def describe(self, item: dict) -> str:
+        status = STATUS_NAMES[item["status"]]
+        text = f"[{item['id']}] {status:<4} {item['path']}"
+        if item["status"] == "running":
+            text += f" ({time.time() - item['started_at']:.0f}s) {self.last_lines.get(item['id'], '')[:60]}"
+        elif item["status"] == "done" and item["seconds"] is not None:
+            text += f" ({item['seconds']:.0f}s)"
+        elif item["error"]:
+            text += f" - {item['error']}"
+        return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库学习队列")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add_parser = sub.add_parser("add", help="加入要学习的文件或目录")
+    add_parser.add_argument("paths", nargs="+")
+    run_parser = sub.add_parser("run", help="处理队列直到全部完成")
+    run_parser.add_argument("--workers", type=int, help="本次使用的并发数")
+    sub.add_parser("status", help="查看队列")
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent.absolute()
+    queue = LearningQueue(
+        base_path / "core" / "Bot" / "scripts",
+        base_path / "core" / ".onekey",
+        launcher.python_executable(base_path),
+    )
+    if args.command == "add":
+        result = queue.add(Path(path) for path in args.paths)
+        print(f"已加入 {result['added']} 项，跳过 {result['skipped']} 项")
+    elif args.command == "run":
+        try:
+            queue.start(args.workers)
+        except ValueError as e:
+            print(e)
+            raise SystemExit(2)
+        try:
+            queue.wait()
+        except KeyboardInterrupt:
+            print("正在停止，未完成的项下次继续...")
+            queue.stop()
+        counts = queue.counts()
+        print("，".join(f"{STATUS_NAMES[status]} {count}" for status, count in counts.items()))
+        raise SystemExit(1 if counts["failed"] else 0)
+    else:
+        for item in queue.items:
+            print(queue.describe(item))
+
+
+if __name__ == "__main__":
+    main()
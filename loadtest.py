@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+OneBot 事件回放压测
+扮演 Napcat，按生成的 onebot11_<qq>.json 中 WS 客户端的方式连接 Bot，
+以指定速率和并发回放录制的（或合成的）群聊/私聊消息事件，统计：
+- 回复延迟 p50/p95/p99、吞吐量、错误率（超时未回复/发送失败）
+- 压测期间 Bot 进程的 CPU 与内存
+结果按 core/Bot 的提交保存到 core/.onekey/loadtest/<commit>.json，便于对比不同版本。
+注意：压测前请停止 Napcat，压测客户端会占用它的连接位置。
+"""
+
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import tomllib
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import git_tools
+import service_state
+from onebot_ws import (
+    OP_CLOSE,
+    OP_PING,
+    OP_PONG,
+    OP_TEXT,
+    StandInBot,
+    WebSocketClient,
+    WebSocketClosed,
+    make_event,
+    percentiles,
+)
+
+REPLY_ACTIONS = {"send_group_msg", "send_private_msg", "send_msg"}
+SAMPLE_TEXTS = ["你好", "今天天气怎么样", "讲个笑话吧", "在吗", "晚上吃什么好呢", "帮我总结一下刚才的聊天"]
+
+
+# ==================== 事件来源 ====================
+def synthetic_events(self_id: int, conversations: int) -> Iterator[dict]:
+    """合成消息事件：在若干个群聊和私聊之间轮换，群消息会 @Bot 以确保触发回复。"""
+    for index in itertools.count():
+        slot = index % conversations
+        text = random.choice(SAMPLE_TEXTS)
+        if slot % 2 == 0:
+            group_id = 900000 + slot
+            user_id = 800000 + slot
+            yield make_event(
+                self_id,
+                "message",
+                message_type="group",
+                sub_type="normal",
+                group_id=group_id,
+                user_id=user_id,
+                message=[
+                    {"type": "at", "data": {"qq": str(self_id)}},
+                    {"type": "text", "data": {"text": f" {text}"}},
+                ],
+                raw_message=f"[CQ:at,qq={self_id}] {text}",
+                sender={"user_id": user_id, "nickname": f"压测用户{slot}", "role": "member"},
+                font=0,
+            )
+        else:
+            user_id = 800000 + slot
+            yield make_event(
+                self_id,
+                "message",
+                message_type="private",
+                sub_type="friend",
+                user_id=user_id,
+                message=[{"type": "text", "data": {"text": text}}],
+                raw_message=text,
+                sender={"user_id": user_id, "nickname": f"压测用户{slot}"},
+                font=0,
+            )
+
+
+def recorded_events(path: Path, self_id: int) -> Iterator[dict]:
+    """循环回放录制的事件文件（每行一个 OneBot 事件 JSON），仅回放消息事件。"""
+    with open(path, "r", encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events = [event for event in events if event.get("post_type") == "message"]
+    if not events:
+        raise ValueError(f"{path} 中没有消息事件")
+    for event in itertools.cycle(events):
+        yield {**event, "time": int(time.time()), "self_id": self_id}
+
+
+def conversation_key(data: dict) -> Optional[tuple]:
+    """事件和回复动作都映射到 (类型, 会话ID)，用于匹配回复。"""
+    params = data.get("params", data)
+    message_type = params.get("message_type")
+    if data.get("action") == "send_group_msg" or message_type == "group":
+        return ("group", int(params["group_id"])) if params.get("group_id") else None
+    if params.get("user_id"):
+        return ("private", int(params["user_id"]))
+    return None
+
+
+def bot_qq_account(bot_path: Path) -> Optional[int]:
+    """读取 Bot 配置中的 QQ 号，压测事件以该账号的身份上报。"""
+    try:
+        with open(bot_path / "config" / "bot_config.toml", "rb") as f:
+            return int(tomllib.load(f).get("bot", {}).get("qq_account"))
+    except (OSError, TypeError, ValueError, tomllib.TOMLDecodeError):
+        return None
+
+
+# ==================== 资源采样 ====================
+class ResourceSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent: List[float] = []
+        self.rss_mb: List[float] = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        previous = service_state.process_usage(self.pid)
+        last_time = time.perf_counter()
+        while previous and not self._stop_event.wait(self.interval):
+            current = service_state.process_usage(self.pid)
+            now = time.perf_counter()
+            if current is None:
+                break
+            self.cpu_percent.append((current[0] - previous[0]) / (now - last_time) * 100)
+            self.rss_mb.append(current[1] / 1024 / 1024)
+            previous, last_time = current, now
+
+    def stop(self) -> dict:
+        self._stop_event.set()
+        self.join(timeout=2)
+        if not self.rss_mb:
+            return {}
+        return {
+            "cpu_percent_avg": sum(self.cpu_percent) / len(self.cpu_percent),
+            "cpu_percent_max": max(self.cpu_percent),
+            "rss_mb_avg": sum(self.rss_mb) / len(self.rss_mb),
+            "rss_mb_max": max(self.rss_mb),
+        }
+
+
+# ==================== 压测主体 ====================
+class LoadTest:
+    def __init__(
+        self,
+        url: str,
+        self_id: int,
+        events: Iterator[dict],
+        token: str = "",
+        rate: float = 5.0,
+        concurrency: int = 10,
+        count: int = 100,
+        reply_timeout: float = 60.0,
+        bot_pid: Optional[int] = None,
+    ):
+        self.url = url
+        self.self_id = self_id
+        self.events = events
+        self.token = token
+        self.rate = rate
+        self.concurrency = concurrency
+        self.count = count
+        self.reply_timeout = reply_timeout
+        self.bot_pid = bot_pid
+
+        self.latencies_ms: List[float] = []
+        self.sent = 0
+        self.timeouts = 0
+        self.send_errors = 0
+        # 没有会话 ID 的事件（如通知、元事件）无法与回复对应，不发送，单独计数
+        self.skipped = 0
+        self._pending: Dict[tuple, deque] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(concurrency)
+        self._message_id = itertools.count(1)
+        self._client: Optional[WebSocketClient] = None
+        self._done = threading.Event()
+
+    def run(self) -> dict:
+        self._client = WebSocketClient(self.url, self.self_id, self.token, timeout=10)
+        self._client.sock.settimeout(None)
+        # 与 Napcat 一致，连接后先上报 lifecycle 事件
+        self._client.send_json(
+            make_event(self.self_id, "meta_event", meta_event_type="lifecycle", sub_type="connect")
+        )
+        reader = threading.Thread(target=self._read_loop, daemon=True)
+        reader.start()
+        sampler = ResourceSampler(self.bot_pid) if self.bot_pid else None
+        if sampler:
+            sampler.start()
+
+        start = time.perf_counter()
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        for index, event in zip(range(self.count), self.events):
+            if conversation_key(event) is None:
+                self.skipped += 1
+                continue
+            # 按固定速率发送，并发上限由信号量控制（等待回复中的事件数）
+            target = start + index * interval
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._reap_timeouts()
+            while not self._slots.acquire(timeout=0.5):
+                self._reap_timeouts()
+            self._send(event)
+
+        # 等待最后一批事件回复或超时
+        while True:
+            self._reap_timeouts()
+            with self._lock:
+                if not any(self._pending.values()):
+                    break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+
+        self._done.set()
+        self._client.close()
+        resources = sampler.stop() if sampler else {}
+        replied = len(self.latencies_ms)
+        return {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "url": self.url,
+            "rate": self.rate,
+            "concurrency": self.concurrency,
+            "sent": self.sent,
+            "replied": replied,
+            "timeouts": self.timeouts,
+            "send_errors": self.send_errors,
+            "skipped": self.skipped,
+            "error_rate": (self.timeouts + self.send_errors) / max(1, self.sent + self.send_errors),
+            "throughput_per_s": replied / elapsed if elapsed else 0.0,
+            "duration_s": elapsed,
+            "latency_ms": percentiles(self.latencies_ms),
+            "resources": resources,
+        }
+
+    def _send(self, event: dict):
+        event = {**event, "message_id": next(self._message_id), "time": int(time.time())}
+        key = conversation_key(event)
+        try:
+            with self._lock:
+                self._pending[key].append(time.perf_counter())
+            self._client.send_json(event)
+            self.sent += 1
+        except OSError:
+            with self._lock:
+                self._pending[key].pop()
+            self.send_errors += 1
+            self._slots.release()
+
+    def _reap_timeouts(self):
+        now = time.perf_counter()
+        with self._lock:
+            for queue in self._pending.values():
+                while queue and now - queue[0] > self.reply_timeout:
+                    queue.popleft()
+                    self.timeouts += 1
+                    self._slots.release()
+
+    def _read_loop(self):
+        try:
+            while not self._done.is_set():
+                opcode, payload = self._client.recv()
+                if opcode == OP_PING:
+                    self._client.send(OP_PONG, payload)
+                elif opcode == OP_CLOSE:
+                    return
+                elif opcode == OP_TEXT:
+                    self._handle_action(json.loads(payload))
+        except (OSError, WebSocketClosed, ValueError):
+            return
+
+    def _handle_action(self, request: dict):
+        action = request.get("action", "")
+        if action in REPLY_ACTIONS:
+            key = conversation_key(request)
+            with self._lock:
+                queue = self._pending.get(key)
+                if queue:
+                    self.latencies_ms.append((time.perf_counter() - queue.popleft()) * 1000)
+                    self._slots.release()
+        if "echo" in request:
+            self._client.send_json(
+                {
+                    "status": "ok",
+                    "retcode": 0,
+                    "data": self._fake_response(action, request.get("params", {})),
+                    "echo": request["echo"],
+                }
+            )
+
+    def _fake_response(self, action: str, params: dict):
+        """对 Bot 发来的 API 调用返回看起来合理的数据，保证 Bot 流程能继续。"""
+        if action in REPLY_ACTIONS:
+            return {"message_id": next(self._message_id)}
+        if action == "get_login_info":
+            return {"user_id": self.self_id, "nickname": "LoadTest"}
+        if action == "get_group_info":
+            group_id = params.get("group_id")
+            return {"group_id": group_id, "group_name": f"压测群{group_id}", "member_count": 10, "max_member_count": 200}
+        if action in ("get_group_member_info", "get_stranger_info"):
+            user_id = params.get("user_id")
+            return {"user_id": user_id, "nickname": f"压测用户{user_id}", "card": "", "role": "member"}
+        if action.endswith("_list"):
+            return []
+        return {}
+
+
+# ==================== 结果保存与对比 ====================
+def save_result(results_dir: Path, commit: Optional[str], result: dict) -> Path:
+    results_dir.mkdir(parents=True, exist_ok=True)
+    commit = commit or "unknown"
+    result = {**result, "commit": commit}
+    path = results_dir / f"{commit[:12]}.json"
+    runs = []
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            runs = json.load(f)
+    runs.append(result)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(runs, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def previous_result(results_dir: Path, commit: Optional[str]) -> Optional[dict]:
+    """找到其它提交最近一次的压测结果，作为对比基准。"""
+    if not results_dir.exists():
+        return None
+    current = (commit or "unknown")[:12]
+    candidates = sorted(
+        (path for path in results_dir.glob("*.json") if path.stem != current),
+        key=lambda path: path.stat().st_mtime,
+    )
+    for path in reversed(candidates):
+        with open(path, "r", encoding="utf-8") as f:
+            runs = json.load(f)
+        if runs:
+            return runs[-1]
+    return None
+
+
+def format_result(result: dict, baseline: Optional[dict] = None) -> List[str]:
+    lines = [
+        f"发送 {result['sent']} | 回复 {result['replied']} | 超时 {result['timeouts']} | "
+        f"发送失败 {result['send_errors']} | 错误率 {result['error_rate'] * 100:.1f}%",
+        f"吞吐量 {result['throughput_per_s']:.2f} 条/秒 | 用时 {result['duration_s']:.1f} 秒",
+    ]
+    if result.get("skipped"):
+        lines.append(f"跳过 {result['skipped']} 个没有会话 ID、无法匹配回复的事件")
+    latency = result.get("latency_ms")
+    if latency:
+        lines.append("回复延迟 " + " / ".join(f"{k} {v:.0f}ms" for k, v in latency.items()))
+    resources = result.get("resources")
+    if resources:
+        lines.append(
+            f"Bot CPU 平均 {resources['cpu_percent_avg']:.0f}% 峰值 {resources['cpu_percent_max']:.0f}% | "
+            f"内存 平均 {resources['rss_mb_avg']:.0f}MB 峰值 {resources['rss_mb_max']:.0f}MB"
+        )
+    if baseline and baseline.get("latency_ms") and latency:
+        old_p95 = baseline["latency_ms"]["p95"]
+        change = (latency["p95"] - old_p95) / old_p95 * 100 if old_p95 else 0.0
+        lines.append(
+            f"对比提交 {baseline['commit'][:8]}: p95 {old_p95:.0f}ms → {latency['p95']:.0f}ms ({change:+.0f}%), "
+            f"吞吐量 {baseline['throughput_per_s']:.2f} → {result['throughput_per_s']:.2f} 条/秒"
+        )
+    return lines
+
+
+def run_and_record(
+    base_path: Path,
+    url: str,
+    self_id: int,
+    token: str = "",
+    events_file: Optional[Path] = None,
+    bot_path: Optional[Path] = None,
+    **options,
+) -> tuple:
+    """执行压测并按 Bot 当前提交保存结果，返回 (结果, 对比基准, 保存路径)。"""
+    bot_path = bot_path or base_path / "core" / "Bot"
+    conversations = max(2, options.get("concurrency", 10))
+    events = (
+        recorded_events(events_file, self_id)
+        if events_file
+        else synthetic_events(self_id, conversations)
+    )
+    result = LoadTest(url, self_id, events, token=token, **options).run()
+    commit = git_tools.read_head_commit(bot_path)
+    results_dir = base_path / "core" / ".onekey" / "loadtest"
+    baseline = previous_result(results_dir, commit)
+    path = save_result(results_dir, commit, result)
+    return result, baseline, path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OneBot 事件回放压测")
+    parser.add_argument("--url", help="Bot 适配器的 WS 地址，如 ws://127.0.0.1:8095")
+    parser.add_argument("--token", default="")
+    parser.add_argument("--self-id", type=int, default=10001, help="Bot 的 QQ 号")
+    parser.add_argument("--events", help="录制的事件文件 (JSON Lines)，不指定则使用合成事件")
+    parser.add_argument("--rate", type=float, default=5.0, help="每秒发送的事件数")
+    parser.add_argument("--concurrency", type=int, default=10, help="最多同时等待回复的事件数")
+    parser.add_argument("--count", type=int, default=100, help="发送的事件总数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单条消息等待回复的超时秒数")
+    parser.add_argument("--pid", type=int, help="采样 CPU/内存的 Bot 进程 PID")
+    parser.add_argument("--selftest", action="store_true", help="对本地替身服务端进行压测")
+    args = parser.parse_args()
+
+    stand_in = None
+    url = args.url
+    if args.selftest or not url:
+        stand_in = StandInBot(reply_delay=0.01).start()
+        url = stand_in.url
+    base_path = Path(__file__).parent.absolute()
+    result, baseline, path = run_and_record(
+        base_path,
+        url,
+        args.self_id,
+        token=args.token,
+        events_file=Path(args.events) if args.events else None,
+        rate=args.rate,
+        concurrency=args.concurrency,
+        count=args.count,
+        reply_timeout=args.timeout,
+        bot_pid=args.pid,
+    )
+    if stand_in:
+        stand_in.stop()
+    for line in format_result(result, baseline):
+        print(line)
+    print(f"结果已保存: {path}")
+
+
+if __name__ == "__main__":
+    main()
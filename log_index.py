@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+日志索引与搜索
+为每个日志文件维护一份紧凑的索引（保存在 core/.onekey/log_index/），
+记录每个时间段 (BUCKET_SECONDS) 内各日志级别所在的字节区间。
+查询时只定位并读取命中的区间，不再整份扫描几 GB 的日志。
+索引随日志追加增量更新：只处理上次索引之后新增的完整行，
+文件被截断或替换（日志轮转）时才会重建。
+同时支持 Bot 的 JSON Lines 日志（"timestamp"/"level" 字段）和普通文本日志。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+INDEX_VERSION = 1
+BUCKET_SECONDS = 60
+CHUNK_SIZE = 1024 * 1024
+HEAD_BYTES = 256
+# 同一时间段、同一级别的两段间隔不超过该字节数时合并为一段，
+# 读取时多读少量其它级别的行并过滤掉，换取更小的索引
+RUN_MERGE_GAP = 4096
+LOG_SUFFIXES = (".log", ".jsonl", ".txt")
+
+LEVEL_ALIASES = {
+    "TRACE": "DEBUG",
+    "SUCCESS": "INFO",
+    "WARN": "WARNING",
+    "FATAL": "CRITICAL",
+}
+# 没有级别信息、也无法从上一行继承时使用
+UNKNOWN_LEVEL = "OTHER"
+
+TIMESTAMP_RE = re.compile(
+    rb"(?:(\d{4})[-/])?(\d{1,2})[-/](\d{1,2})[ T](\d{1,2}):(\d{2})(?::(\d{2}))?"
+)
+LEVEL_RE = re.compile(
+    rb"\b(TRACE|DEBUG|INFO|SUCCESS|WARNING|WARN|ERROR|CRITICAL|FATAL)\b", re.IGNORECASE
+)
+JSON_TIMESTAMP_RE = re.compile(rb'"timestamp"\s*:\s*"([^"]+)"')
+JSON_LEVEL_RE = re.compile(rb'"level"\s*:\s*"(\w+)"')
+
+
+def normalize_level(level: str) -> str:
+    level = level.upper()
+    return LEVEL_ALIASES.get(level, level)
+
+
+class LineParser:
+    """解析一行日志的时间戳（秒）和级别，同一分钟的时间换算结果会被缓存。"""
+
+    def __init__(self, default_year: int):
+        self.default_year = default_year
+        self._minute_cache: Dict[tuple, float] = {}
+
+    def timestamp(self, text: bytes) -> Optional[float]:
+        match = TIMESTAMP_RE.search(text)
+        if not match:
+            return None
+        year, month, day, hour, minute, second = match.groups()
+        key = (year, month, day, hour, minute)
+        minute_start = self._minute_cache.get(key)
+        if minute_start is None:
+            fields = (int(year) if year else self.default_year, int(month), int(day), int(hour), int(minute))
+            try:
+                minute_start = time.mktime((*fields, 0, 0, 0, -1))
+            except (OverflowError, ValueError):
+                return None
+            self._minute_cache[key] = minute_start
+        return minute_start + (int(second) if second else 0)
+
+    def parse(self, line: bytes) -> Tuple[Optional[float], Optional[str]]:
+        if line.startswith(b"{"):
+            ts_match = JSON_TIMESTAMP_RE.search(line)
+            level_match = JSON_LEVEL_RE.search(line)
+            ts = self.timestamp(ts_match.group(1)) if ts_match else None
+            level = normalize_level(level_match.group(1).decode()) if level_match else None
+            return ts, level
+        head = line[:160]
+        ts = self.timestamp(head[:64])
+        level_match = LEVEL_RE.search(head)
+        return ts, normalize_level(level_match.group(1).decode()) if level_match else None
+
+
+class LogIndex:
+    def __init__(self, log_path: Path, index_dir: Path):
+        self.log_path = Path(log_path)
+        key = hashlib.sha1(str(self.log_path.absolute()).encode("utf-8")).hexdigest()[:16]
+        self.index_path = Path(index_dir) / f"{key}.json"
+        self.data = self._load()
+
+    def _empty(self) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "path": str(self.log_path),
+            "head": "",
+            "indexed_size": 0,
+            # 续行（如异常堆栈）没有时间戳和级别，沿用上一条日志的
+            "last_ts": None,
+            "last_level": None,
+            "first_ts": None,
+            "buckets": {},
+        }
+
+    def _load(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                return data
+        except (OSError, ValueError):
+            pass
+        return self._empty()
+
+    def _save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def _head_digest(self, f) -> str:
+        f.seek(0)
+        return hashlib.sha1(f.read(HEAD_BYTES)).hexdigest()
+
+    def update(self) -> int:
+        """索引新增的完整行，返回本次处理的字节数。"""
+        size = self.log_path.stat().st_size
+        with open(self.log_path, "rb") as f:
+            data = self.data
+            if data["indexed_size"]:
+                # 文件变小或开头内容变化说明发生了轮转/截断，需要重建
+                head_changed = data["indexed_size"] >= HEAD_BYTES and self._head_digest(f) != data["head"]
+                if size < data["indexed_size"] or head_changed:
+                    data = self.data = self._empty()
+            if size == data["indexed_size"]:
+                return 0
+            start = data["indexed_size"]
+            parser = LineParser(datetime.fromtimestamp(self.log_path.stat().st_mtime).year)
+            f.seek(start)
+            offset = start
+            leftover = b""
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                lines = (leftover + chunk).split(b"\n")
+                leftover = lines.pop()
+                for line in lines:
+                    end = offset + len(line) + 1
+                    self._add_line(parser, line, offset, end)
+                    offset = end
+            # 末尾不完整的行留到下次，等写完后再索引
+            data["indexed_size"] = offset
+            if offset >= HEAD_BYTES or not data["head"]:
+                data["head"] = self._head_digest(f)
+        self._save()
+        return offset - start
+
+    def _add_line(self, parser: LineParser, line: bytes, start: int, end: int):
+        data = self.data
+        ts, level = parser.parse(line)
+        if ts is None:
+            ts = data["last_ts"]
+        else:
+            data["last_ts"] = ts
+            if data["first_ts"] is None:
+                data["first_ts"] = ts
+            # 新的一条日志没有级别时不沿用上一条的级别
+            level = level or UNKNOWN_LEVEL
+        level = level or data["last_level"] or UNKNOWN_LEVEL
+        data["last_level"] = level
+
+        bucket = str(int(ts // BUCKET_SECONDS * BUCKET_SECONDS)) if ts is not None else "-1"
+        runs = data["buckets"].setdefault(bucket, {}).setdefault(level, [])
+        if runs and start - runs[-1] <= RUN_MERGE_GAP:
+            runs[-1] = end  # 与上一段足够近，直接延长
+        else:
+            runs.extend((start, end))
+
+    def ranges(
+        self,
+        levels: Optional[List[str]] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> List[Tuple[int, int, float]]:
+        """返回命中条件的字节区间 (起始, 结束, 所在时间段起点)，按位置排序。"""
+        wanted = {normalize_level(level) for level in levels} if levels else None
+        first_bucket = start // BUCKET_SECONDS * BUCKET_SECONDS if start is not None else None
+        result = []
+        for bucket_key, by_level in self.data["buckets"].items():
+            bucket = int(bucket_key)
+            if bucket < 0:
+                if start is not None or end is not None:
+                    continue
+            elif (first_bucket is not None and bucket < first_bucket) or (end is not None and bucket > end):
+                continue
+            for level, runs in by_level.items():
+                if wanted is not None and level not in wanted:
+                    continue
+                for i in range(0, len(runs), 2):
+                    result.append((runs[i], runs[i + 1], float(bucket)))
+        result.sort()
+        # 不同级别的区间合并后可能互相重叠，合并以免重复输出
+        merged: List[Tuple[int, int, float]] = []
+        for item in result:
+            if merged and item[0] <= merged[-1][1]:
+                previous = merged[-1]
+                merged[-1] = (previous[0], max(previous[1], item[1]), min(previous[2], item[2]))
+            else:
+                merged.append(item)
+        return merged
+
+    def search(
+        self,
+        levels: Optional[List[str]] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        pattern: Optional[re.Pattern] = None,
+    ) -> Iterator[Tuple[int, str]]:
+        """逐行产出 (字节位置, 行内容)，只读取索引命中的区间。"""
+        parser = LineParser(datetime.fromtimestamp(self.log_path.stat().st_mtime).year)
+        wanted = {normalize_level(level) for level in levels} if levels else None
+        check_time = start is not None or end is not None
+        with open(self.log_path, "rb") as f:
+            for range_start, range_end, bucket in self.ranges(levels, start, end):
+                f.seek(range_start)
+                ts, level = bucket, None
+                offset = range_start
+                for line in f.read(range_end - range_start).split(b"\n")[:-1]:
+                    line_offset = offset
+                    offset += len(line) + 1
+                    line_ts, line_level = parser.parse(line)
+                    if line_ts is None:
+                        level = line_level or level
+                    else:
+                        ts, level = line_ts, line_level or UNKNOWN_LEVEL
+                    # 合并后的区间里夹带了其它级别的行，时间段边界处的行也要按精确时间再筛一次
+                    if wanted is not None and level not in wanted:
+                        continue
+                    if check_time and ((start is not None and ts < start) or (end is not None and ts > end)):
+                        continue
+                    text = line.decode("utf-8", errors="replace").rstrip("\r")
+                    if pattern is None or pattern.search(text):
+                        yield line_offset, text
+
+    @property
+    def time_span(self) -> Tuple[Optional[float], Optional[float]]:
+        return self.data["first_ts"], self.data["last_ts"]
+
+
+# ==================== 多文件搜索 ====================
+def log_files(log_dirs: List[Path]) -> List[Path]:
+    files = []
+    for log_dir in log_dirs:
+        if log_dir.is_dir():
+            files.extend(
+                path for path in log_dir.iterdir() if path.is_file() and path.name.endswith(LOG_SUFFIXES)
+            )
+    return sorted(files, key=lambda path: path.stat().st_mtime)
+
+
+def search_logs(
+    files: List[Path],
+    index_dir: Path,
+    levels: Optional[List[str]] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    keyword: Optional[str] = None,
+) -> Iterator[Tuple[Path, int, str]]:
+    """在多个日志文件中搜索，先增量更新各自的索引，再按索引定位读取。"""
+    pattern = re.compile(re.escape(keyword), re.IGNORECASE) if keyword else None
+    for path in files:
+        try:
+            index = LogIndex(path, index_dir)
+            index.update()
+        except OSError:
+            continue
+        first_ts, last_ts = index.time_span
+        # 整个文件都不在查询时间范围内时直接跳过
+        if first_ts is not None and last_ts is not None:
+            if (end is not None and first_ts > end) or (start is not None and last_ts < start):
+                continue
+        for offset, text in index.search(levels, start, end, pattern):
+            yield path, offset, text
+
+
+def parse_time(text: str, now: Optional[datetime] = None) -> Optional[float]:
+    """解析查询时间，支持 "2025-10-19 02:00"、"10-19 02:00" 和 "02:00"（当天）。"""
+    text = text.strip()
+    if not text:
+        return None
+    now = now or datetime.now()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ("%m-%d %H:%M:%S", "%m-%d %H:%M"):
+        try:
+            return datetime.strptime(text, fmt).replace(year=now.year).timestamp()
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            parsed = datetime.strptime(text, fmt)
+            return now.replace(hour=parsed.hour, minute=parsed.minute, second=parsed.second, microsecond=0).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"无法识别的时间: {text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按时间和级别搜索日志")
+    parser.add_argument("paths", nargs="+", help="日志文件或日志目录")
+    parser.add_argument("--level", default="", help="日志级别，多个用逗号隔开，如 ERROR,CRITICAL")
+    parser.add_argument("--since", default="", help="开始时间，如 02:00 或 2025-10-19 02:00")
+    parser.add_argument("--until", default="", help="结束时间")
+    parser.add_argument("--grep", default="", help="关键字（不区分大小写）")
+    parser.add_argument("--index-dir", default=str(Path(__file__).parent / "core" / ".onekey" / "log_index"))
+    args = parser.parse_args()
+
+    files = []
+    for item in map(Path, args.paths):
+        files.extend(log_files([item]) if item.is_dir() else [item])
+    levels = [level for level in args.level.split(",") if level.strip()] or None
+    start = time.perf_counter()
+    count = 0
+    for path, _, text in search_logs(
+        files,
+        Path(args.index_dir),
+        levels,
+        parse_time(args.since),
+        parse_time(args.until),
+        args.grep or None,
+    ):
+        print(f"{path.name}: {text}")
+        count += 1
+    print(f"共 {count} 行，用时 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+"""
+定时维护
+按 maintenance_schedule.json 中类似 cron 的规则（分 时 日 月 周）在管理程序内自动执行维护任务：
+- fetch：预取各仓库的上游提交
+- update：运行更新程序（只安装缺少或版本不符的依赖），Bot 有新版本时重启正在运行的 Bot
+- database：对各 Bot 的 MaiBot.db 执行 WAL 检查点和 VACUUM
+所有任务由同一个线程依次执行，手动执行也使用同一把锁，任务之间不会重叠；
+某个任务执行期间到点的任务在它结束后补上，超出窗口的记为跳过。
+到点时若 Bot 正在对话（最近 quiet_minutes 分钟内有日志输出）或负载过高，暂不执行并在
+window_minutes 分钟内持续重试，超过窗口则跳过本次，维护只会发生在计划时间附近。
+每次执行（及跳过）的耗时和结果记录在 core/.onekey/maintenance.json 和 maintenance.log。
+命令行：python maintenance_scheduler.py [--check "0 4 * * *"]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import service_state
+
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+DEFAULT_SCHEDULE = {
+    "enabled": False,
+    # 到点后因 Bot 忙碌未能执行时，最多推迟的分钟数
+    "window_minutes": 30,
+    # 最近这么多分钟内 Bot 有日志输出，视为正在对话
+    "quiet_minutes": 5,
+    # Bot 进程的 CPU 占用（单核百分比）超过该值时视为负载过高
+    "max_cpu_percent": 50,
+    # 系统平均负载 / CPU 核数 超过该值时视为负载过高（仅 Linux/macOS）
+    "max_load": 0.8,
+    "jobs": [
+        {"name": "fetch", "action": "fetch", "schedule": "0 * * * *"},
+        {"name": "update", "action": "update", "schedule": "0 4 * * *", "restart": True},
+        {"name": "database", "action": "database", "schedule": "30 4 * * 1"},
+    ],
+}
+ACTION_NAMES = {"fetch": "预取上游提交", "update": "更新并重启", "database": "数据库检查点与 VACUUM"}
+STATUS_NAMES = {"done": "完成", "failed": "失败", "skipped": "跳过"}
+HISTORY_LIMIT = 20
+CHECK_INTERVAL = 20.0
+
+
+# ==================== 规则 ====================
+class CronRule:
+    """五段式规则：分 时 日 月 周（0 和 7 都表示周日），支持 * , - / 以及 @hourly 等别名"""
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"规则应为 5 段（分 时 日 月 周）: {expression}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(field, *bounds) for field, bounds in zip(fields, FIELD_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        # 日和周都被限定时，满足其一即可（与 cron 相同）
+        self.days_restricted = fields[2] != "*"
+        self.weekdays_restricted = fields[4] != "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            base, _, step_text = part.partition("/")
+            try:
+                step = int(step_text) if step_text else 1
+                if base == "*":
+                    start, end = low, high
+                elif "-" in base:
+                    start, end = (int(value) for value in base.split("-", 1))
+                else:
+                    start = int(base)
+                    end = high if step_text else start
+            except ValueError:
+                raise ValueError(f"无法解析规则中的 {part!r}") from None
+            if step < 1 or not low <= start <= end <= high:
+                raise ValueError(f"{part!r} 超出范围 {low}-{high}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day or weekday
+        return day and weekday
+
+    def matches(self, moment: datetime) -> bool:
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and moment.month in self.months
+            and self._day_matches(moment)
+        )
+
+    def next_after(self, moment: datetime) -> Optional[datetime]:
+        """moment 之后第一个匹配的整分钟，一年内没有则返回 None"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366)
+        while candidate < limit:
+            if candidate.month not in self.months or not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        return None
+
+
+# ==================== 配置与记录 ====================
+def load_schedule(base_path: Path) -> dict:
+    try:
+        with open(base_path / "maintenance_schedule.json", "r", encoding="utf-8") as f:
+            return {**DEFAULT_SCHEDULE, **json.load(f)}
+    except (OSError, ValueError):
+        return json.loads(json.dumps(DEFAULT_SCHEDULE))
+
+
+def save_schedule(base_path: Path, schedule: dict):
+    tmp_path = base_path / "maintenance_schedule.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(schedule, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, base_path / "maintenance_schedule.json")
+
+
+def parse_jobs(schedule: dict) -> List[dict]:
+    """校验任务配置并解析规则，配置有误时抛出 ValueError"""
+    jobs = []
+    for job in schedule.get("jobs", []):
+        if job.get("action") not in ACTION_NAMES:
+            raise ValueError(f"任务 {job.get('name')} 的 action 无效，可选: {', '.join(ACTION_NAMES)}")
+        jobs.append({**job, "name": job.get("name") or job["action"], "rule": CronRule(job["schedule"])})
+    return jobs
+
+
+def load_history(state_path: Path) -> Dict[str, dict]:
+    try:
+        with open(state_path / "maintenance.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_history(state_path: Path, history: Dict[str, dict]):
+    state_path.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path / "maintenance.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, state_path / "maintenance.json")
+
+
+# ==================== 负载判断 ====================
+def busy_reason(settings: dict, pids: List[int], log_files: List[Path]) -> Optional[str]:
+    """Bot 正在对话或负载过高时返回原因，否则返回 None；会采样 1 秒 CPU 占用"""
+    now = time.time()
+    quiet_seconds = float(settings["quiet_minutes"]) * 60
+    for path in log_files:
+        try:
+            idle = now - path.stat().st_mtime
+        except OSError:
+            continue
+        if idle < quiet_seconds:
+            return f"Bot {idle:.0f} 秒前仍有日志输出，可能正在对话"
+    if hasattr(os, "getloadavg"):
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+        if load > float(settings["max_load"]):
+            return f"系统负载过高 ({load:.2f}/核)"
+    before = {pid: service_state.process_usage(pid) for pid in pids}
+    if any(before.values()):
+        time.sleep(1)
+        for pid, usage in before.items():
+            after = service_state.process_usage(pid) if usage else None
+            if after:
+                percent = (after[0] - usage[0]) * 100
+                if percent > float(settings["max_cpu_percent"]):
+                    return f"Bot CPU 占用过高 ({percent:.0f}%)"
+    return None
+
+
+# ==================== 维护任务 ====================
+def vacuum_database(db_path: Path, timeout: float = 30.0) -> dict:
+    """WAL 检查点 + VACUUM，返回 {"before", "after"}（字节，含 -wal 文件）"""
+
+    def size() -> int:
+        return sum(
+            path.stat().st_size
+            for path in (db_path, db_path.with_name(db_path.name + "-wal"))
+            if path.exists()
+        )
+
+    before = size()
+    connection = sqlite3.connect(str(db_path), timeout=timeout, isolation_level=None)
+    try:
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("VACUUM")
+        # VACUUM 在 WAL 模式下会写入 -wal 文件，再做一次检查点写回主文件
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        connection.close()
+    return {"before": before, "after": size()}
+
+
+# ==================== 调度 ====================
+class MaintenanceScheduler(threading.Thread):
+    """
+    actions: {action: fn(job) -> (是否成功, 说明)}；
+    busy_check: fn(job) -> 忙碌原因或 None，在每次执行前调用
+    """
+
+    def __init__(
+        self,
+        schedule: dict,
+        state_path: Path,
+        actions: Dict[str, Callable[[dict], tuple]],
+        busy_check: Callable[[dict], Optional[str]],
+        check_interval: float = CHECK_INTERVAL,
+    ):
+        super().__init__(daemon=True, name="maintenance")
+        self.schedule = schedule
+        self.jobs = parse_jobs(schedule)
+        self.state_path = state_path
+        self.actions = actions
+        self.busy_check = busy_check
+        self.check_interval = check_interval
+        self.history = load_history(state_path)
+        # 到点但尚未执行的任务: {任务名: {"due", "deadline", "reason"}}
+        self.pending: Dict[str, dict] = {}
+        self.current: Optional[str] = None
+        # 上次检查的整分钟，从上一分钟开始，启动时恰好到点的任务也会执行
+        self._last_tick = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=1)
+        self._run_lock = threading.Lock()
+        self._history_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._tick(datetime.now())
+            except Exception as e:
+                # 调度出错不影响管理程序，记录后下次再试
+                self._log(f"调度出错: {e}")
+            self._stop_event.wait(self.check_interval)
+
+    def _tick(self, now: datetime):
+        minute = now.replace(second=0, microsecond=0)
+        # 长任务在本线程执行期间不会检查，按上次检查以来经过的每一分钟补算到点的任务（最多回看一天）
+        since = max(self._last_tick, minute - timedelta(days=1))
+        self._last_tick = minute
+        window = float(self.schedule["window_minutes"]) * 60
+        for job in self.jobs:
+            due_times = []
+            due = job["rule"].next_after(since)
+            while due is not None and due <= minute:
+                due_times.append(due.timestamp())
+                due = job["rule"].next_after(due)
+            if not due_times:
+                continue
+            with self._history_lock:
+                entry = self.history.setdefault(job["name"], {"last_due": None, "runs": []})
+                # 上次到点的时间已持久化，管理程序在同一分钟内重新加载也不会重复执行
+                due_times = [due for due in due_times if due > (entry["last_due"] or 0)]
+                if not due_times:
+                    continue
+                entry["last_due"] = due_times[-1]
+                _save_history(self.state_path, self.history)
+            missed = [due for due in due_times if due + window < now.timestamp()]
+            if missed:
+                self._record(
+                    job, "schedule", missed[-1], 0.0, "skipped", f"维护线程忙于其他任务，错过 {len(missed)} 次计划时间"
+                )
+            if len(missed) < len(due_times):
+                self.pending.setdefault(
+                    job["name"], {"due": due_times[-1], "deadline": due_times[-1] + window, "reason": None}
+                )
+        for job in self.jobs:
+            pending = self.pending.get(job["name"])
+            if pending is None or self._stop_event.is_set():
+                continue
+            if time.time() > pending["deadline"]:
+                del self.pending[job["name"]]
+                self._record(job, "schedule", time.time(), 0.0, "skipped", pending["reason"] or "超出执行窗口")
+                continue
+            reason = self.busy_check(job) if job.get("skip_when_busy", True) else None
+            if reason:
+                pending["reason"] = reason
+                continue
+            del self.pending[job["name"]]
+            if self.run_job(job, "schedule") is None:
+                # 手动执行的任务尚未结束，下次检查时再试
+                self.pending[job["name"]] = {**pending, "reason": "另一个维护任务正在执行"}
+
+    def run_job(self, job: dict, trigger: str = "manual") -> Optional[dict]:
+        """执行一个任务并记录，已有任务在执行时返回 None"""
+        if not self._run_lock.acquire(blocking=False):
+            return None
+        try:
+            self.current = job["name"]
+            self._log(f"{job['name']} 开始 ({ACTION_NAMES[job['action']]}, {trigger})")
+            start = time.time()
+            try:
+                ok, detail = self.actions[job["action"]](job)
+            except Exception as e:
+                ok, detail = False, str(e)
+            return self._record(job, trigger, start, time.time() - start, "done" if ok else "failed", detail)
+        finally:
+            self.current = None
+            self._run_lock.release()
+
+    def find_job(self, name: str) -> Optional[dict]:
+        return next((job for job in self.jobs if job["name"] == name), None)
+
+    def _record(self, job: dict, trigger: str, started_at: float, seconds: float, status: str, detail: str) -> dict:
+        run = {"started_at": started_at, "seconds": seconds, "status": status, "trigger": trigger, "detail": detail}
+        with self._history_lock:
+            entry = self.history.setdefault(job["name"], {"last_due": None, "runs": []})
+            entry["runs"] = (entry["runs"] + [run])[-HISTORY_LIMIT:]
+            _save_history(self.state_path, self.history)
+        self._log(f"{job['name']} {STATUS_NAMES[status]} {seconds:.1f}s {detail}")
+        return run
+
+    def _log(self, message: str):
+        self.state_path.mkdir(parents=True, exist_ok=True)
+        with open(self.state_path / "maintenance.log", "a", encoding="utf-8") as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}\n")
+
+    def describe(self) -> List[str]:
+        lines = []
+        now = datetime.now()
+        for job in self.jobs:
+            lines.append(f"{job['name']} [{job['schedule']}] {ACTION_NAMES[job['action']]}")
+            lines.extend(f"  {line}" for line in describe_job(job, self.history.get(job["name"]), now))
+            if job["name"] == self.current:
+                lines.append("  正在执行")
+            elif job["name"] in self.pending:
+                reason = self.pending[job["name"]]["reason"]
+                lines.append(f"  等待执行{f'：{reason}' if reason else ''}")
+        return lines
+
+
+def describe_job(job: dict, entry: Optional[dict], now: datetime) -> List[str]:
+    next_run = job["rule"].next_after(now)
+    lines = [f"下次: {next_run.strftime('%Y-%m-%d %H:%M') if next_run else '一年内无'}"]
+    for run in (entry or {}).get("runs", [])[-3:]:
+        started = time.strftime("%m-%d %H:%M", time.localtime(run["started_at"]))
+        lines.append(f"{started} {STATUS_NAMES[run['status']]} {run['seconds']:.1f}s {run['detail'][:80]}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看定时维护计划与执行记录")
+    parser.add_argument("--check", metavar="RULE", help="检查一条规则并列出接下来的 5 次执行时间")
+    args = parser.parse_args()
+
+    if args.check:
+        try:
+            rule = CronRule(args.check)
+        except ValueError as e:
+            print(e)
+            raise SystemExit(2)
+        moment = datetime.now()
+        for _ in range(5):
+            moment = rule.next_after(moment)
+            if moment is None:
+                break
+            print(moment.strftime("%Y-%m-%d %H:%M (%a)"))
+        return
+
+    base_path = Path(__file__).parent.absolute()
+    schedule = load_schedule(base_path)
+    history = load_history(base_path / "core" / ".onekey")
+    print(f"定时维护: {'已开启' if schedule['enabled'] else '已关闭'}")
+    now = datetime.now()
+    for job in parse_jobs(schedule):
+        print(f"{job['name']} [{job['schedule']}] {ACTION_NAMES[job['action']]}")
+        for line in describe_job(job, history.get(job["name"]), now):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
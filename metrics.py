@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 指标接口
+管理程序在本机提供 http://127.0.0.1:<端口>/metrics，以 Prometheus 文本格式输出：
+服务运行状态、重启次数、运行时长、进程内存与 CPU、各仓库最近一次更新的耗时与结果、
+各 pip 镜像最近一次安装耗时、数据库文件大小。
+所有数值由后台采集线程（默认每 5 秒）或事件发生时写入内存，抓取请求只做格式化，不会读取进程或文件。
+是否开启及端口保存在 core/.onekey/metrics.json。
+"""
+
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9464
+COLLECT_INTERVAL = 5.0
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 指标名 -> (类型, 说明)
+METRICS = {
+    "onekey_service_up": ("gauge", "服务是否在运行 (1/0)"),
+    "onekey_service_restarts_total": ("counter", "本次管理程序运行期间服务被再次启动的次数"),
+    "onekey_service_uptime_seconds": ("gauge", "服务已运行的秒数"),
+    "onekey_service_resident_memory_bytes": ("gauge", "服务进程（含子进程）的常驻内存"),
+    "onekey_service_cpu_seconds_total": ("counter", "服务进程（含子进程）累计 CPU 时间"),
+    "onekey_update_success": ("gauge", "仓库最近一次更新是否成功 (1/0)"),
+    "onekey_update_duration_seconds": ("gauge", "仓库最近一次更新的耗时"),
+    "onekey_update_timestamp_seconds": ("gauge", "仓库最近一次更新完成的时间"),
+    "onekey_pip_install_success": ("gauge", "使用该镜像最近一次安装依赖是否成功 (1/0)"),
+    "onekey_pip_install_duration_seconds": ("gauge", "使用该镜像最近一次安装依赖的耗时"),
+    "onekey_database_size_bytes": ("gauge", "数据库文件大小"),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """线程安全的指标存储，写入方在状态变化时更新，抓取时只做格式化"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+
+    def set(self, name: str, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def remove(self, name: str, **labels: str):
+        with self._lock:
+            self._values.get(name, {}).pop(tuple(sorted(labels.items())), None)
+
+    def render(self) -> str:
+        with self._lock:
+            snapshot = {name: dict(series) for name, series in self._values.items()}
+        lines = []
+        for name, series in snapshot.items():
+            metric_type, help_text = METRICS.get(name, ("gauge", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in series.items():
+                label_text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text else f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """在后台线程中提供 /metrics"""
+
+    def __init__(self, metrics: Metrics, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # 不在管理程序控制台输出访问日志
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+
+class MetricsCollector(threading.Thread):
+    """定期调用 collect 把状态写入 Metrics"""
+
+    def __init__(self, collect: Callable[[], None], interval: float = COLLECT_INTERVAL):
+        super().__init__(daemon=True)
+        self.collect = collect
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.collect()
+            except Exception:
+                # 采集失败不影响管理程序，下次再试
+                pass
+            self._stop_event.wait(self.interval)
+
+
+def load_settings(state_path: Path) -> dict:
+    try:
+        with open(state_path / "metrics.json", "r", encoding="utf-8") as f:
+            return {"enabled": False, "host": DEFAULT_HOST, "port": DEFAULT_PORT, **json.load(f)}
+    except (OSError, ValueError):
+        return {"enabled": False, "host": DEFAULT_HOST, "port": DEFAULT_PORT}
+
+
+def save_settings(state_path: Path, settings: dict):
+    state_path.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path / "metrics.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=2)
+    os.replace(tmp_path, state_path / "metrics.json")
+
+
+def record_update_result(metrics: Metrics, result: dict):
+    """把 update.py 写入的 last_update.json 内容转为指标"""
+    for repo, entry in result.get("repos", {}).items():
+        metrics.set("onekey_update_success", 1 if entry["success"] else 0, repo=repo)
+        metrics.set("onekey_update_duration_seconds", entry["seconds"], repo=repo)
+        metrics.set("onekey_update_timestamp_seconds", entry["finished_at"], repo=repo)
+    for mirror, entry in result.get("pip", {}).items():
+        record_pip_install(metrics, mirror, entry["seconds"], entry["success"])
+
+
+def record_pip_install(metrics: Metrics, mirror: str, seconds: float, success: bool):
+    metrics.set("onekey_pip_install_success", 1 if success else 0, mirror=mirror)
+    metrics.set("onekey_pip_install_duration_seconds", seconds, mirror=mirror)
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+离线部署包导出/导入（用于无法访问外网的机器）
+导出：把 core/Bot 指定提交的代码（git archive）、requirements.txt 对应的 wheel、
+以及去除密钥后的配置模板流式写入一个 .tar.gz，最后附上所有文件的 SHA256SUMS。
+导入：流式解包到 core/.onekey/offline_import，校验全部哈希后再放到 core/Bot，
+并以 --no-index 方式从包内的 wheel 安装依赖，全程不需要网络。
+两个方向都按块读写，内存占用与离线包大小无关。
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path, PurePosixPath, PureWindowsPath
+from typing import Dict, Iterator, Optional, Tuple
+
+# 内置的嵌入式Python不会自动把脚本所在目录加入 sys.path（首次部署时由批处理直接调用）
+sys.path.insert(0, str(Path(__file__).parent.absolute()))
+
+import git_tools  # noqa: E402
+
+try:
+    import tomlkit
+    import tomlkit.exceptions
+except ImportError:
+    tomlkit = None
+
+FORMAT_VERSION = 1
+DEFAULT_ARCHIVE_NAME = "onekey-offline.tar.gz"
+COPY_BLOCK_SIZE = 1024 * 1024
+SUMS_NAME = "SHA256SUMS"
+# 导出为模板的配置文件（相对 core/Bot）
+CONFIG_TEMPLATES = [
+    "config/bot_config.toml",
+    "config/model_config.toml",
+    "config/plugins/napcat_adapter/config.toml",
+]
+# 键名形如 key / api_key / access_token / secret / password 的字符串或数组值会被清空（任意层级）
+SECRET_KEY_RE = re.compile(r"^(?:\w+_)?(?:key|token|secret|password)s?$", re.IGNORECASE)
+
+
+class OfflineBundleError(Exception):
+    pass
+
+
+def _redact_container(container) -> int:
+    count = 0
+    for key in list(container.keys()):
+        value = container[key]
+        if SECRET_KEY_RE.match(str(key)) and isinstance(value, (str, list)):
+            container[key] = "" if isinstance(value, str) else tomlkit.array()
+            count += 1
+        elif isinstance(value, dict):
+            count += _redact_container(value)
+        elif isinstance(value, list):
+            # 表数组 [[...]] 和数组中的内联表
+            count += sum(_redact_container(item) for item in value if isinstance(item, dict))
+    return count
+
+
+def redact_toml(text: str) -> Tuple[str, int]:
+    """清空密钥类配置项的值（包括多行数组、多行字符串和嵌套表中的项），保留注释和结构，返回 (新内容, 清空的项数)"""
+    if tomlkit is None:
+        raise OfflineBundleError("未安装 tomlkit，无法去除配置中的密钥，已取消导出配置模板")
+    try:
+        document = tomlkit.parse(text)
+    except tomlkit.exceptions.ParseError as e:
+        raise OfflineBundleError(f"配置文件解析失败，无法去除密钥: {e}") from e
+    count = _redact_container(document)
+    return tomlkit.dumps(document), count
+
+
+class _HashingReader:
+    """读取时同步计算 SHA-256，供 tarfile.addfile 流式写入"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.hasher = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size)
+        self.hasher.update(data)
+        return data
+
+
+def _python_executable(base_path: Path) -> str:
+    embedded = base_path / "python_embedded" / "python.exe"
+    return str(embedded) if embedded.exists() else sys.executable
+
+
+# ==================== 导出 ====================
+class _Exporter:
+    def __init__(self, archive: tarfile.TarFile):
+        self.archive = archive
+        self.sums: Dict[str, str] = {}
+        self.total_bytes = 0
+
+    def add_stream(self, name: str, size: int, fileobj, mtime: Optional[float] = None):
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime if mtime is not None else time.time())
+        reader = _HashingReader(fileobj)
+        self.archive.addfile(info, reader)
+        self.sums[name] = reader.hasher.hexdigest()
+        self.total_bytes += size
+
+    def add_bytes(self, name: str, data: bytes):
+        self.add_stream(name, len(data), io.BytesIO(data))
+
+    def add_file(self, name: str, path: Path):
+        with open(path, "rb") as f:
+            self.add_stream(name, path.stat().st_size, f, path.stat().st_mtime)
+
+    def finish(self):
+        lines = "".join(f"{digest}  {name}\n" for name, digest in self.sums.items())
+        data = lines.encode("utf-8")
+        info = tarfile.TarInfo(SUMS_NAME)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self.archive.addfile(info, io.BytesIO(data))
+
+
+def _git_archive_members(git: str, repo_path: Path, commit: str) -> Iterator[Tuple[tarfile.TarInfo, object]]:
+    """逐个返回 git archive 输出中的文件，不在内存或磁盘上保留整个归档"""
+    process = subprocess.Popen(
+        [git, "archive", "--format=tar", commit],
+        cwd=str(repo_path),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=git_tools.git_env(),
+    )
+    try:
+        with tarfile.open(fileobj=process.stdout, mode="r|") as source:
+            for member in source:
+                if member.isfile():
+                    yield member, source.extractfile(member)
+    finally:
+        process.stdout.close()
+        if process.wait() != 0:
+            raise OfflineBundleError(f"git archive {commit} 执行失败")
+
+
+def _download_wheels(python: str, requirements: Path, dest: Path, index_url: Optional[str]) -> bool:
+    cmd = [python, "-m", "pip", "download", "-r", str(requirements), "-d", str(dest), "--disable-pip-version-check"]
+    if index_url:
+        cmd += ["-i", index_url]
+    return subprocess.run(cmd).returncode == 0
+
+
+def export_bundle(
+    base_path: Path,
+    output: Path,
+    ref: str = "HEAD",
+    with_wheels: bool = True,
+    index_url: Optional[str] = None,
+) -> dict:
+    bot_path = base_path / "core" / "Bot"
+    git = git_tools.find_git_executable(base_path)
+    if not git:
+        raise OfflineBundleError("未找到 Git")
+    ok, stdout, stderr = git_tools.run_git(git, bot_path, ["rev-parse", "--verify", f"{ref}^{{commit}}"])
+    if not ok:
+        raise OfflineBundleError(f"无法解析提交 {ref}: {stderr.strip()}")
+    commit = stdout.strip()
+    python = _python_executable(base_path)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_output = output.with_name(output.name + ".tmp")
+    with tempfile.TemporaryDirectory(prefix="onekey-export-") as tmp_dir:
+        wheel_dir = Path(tmp_dir) / "wheels"
+        wheel_dir.mkdir()
+        if with_wheels:
+            # 依赖以导出的提交为准，而不是当前工作区
+            ok, requirements, _ = git_tools.run_git(git, bot_path, ["show", f"{commit}:requirements.txt"])
+            if ok:
+                requirements_path = Path(tmp_dir) / "requirements.txt"
+                requirements_path.write_text(requirements, encoding="utf-8")
+                print("正在下载依赖 wheel ...", flush=True)
+                if not _download_wheels(python, requirements_path, wheel_dir, index_url):
+                    raise OfflineBundleError("下载依赖失败，请检查网络或指定 --index-url")
+
+        with tarfile.open(str(tmp_output), mode="w|gz") as archive:
+            exporter = _Exporter(archive)
+            header = {
+                "format": FORMAT_VERSION,
+                "commit": commit,
+                "created_at": time.time(),
+                "wheels": with_wheels,
+            }
+            exporter.add_bytes("bundle.json", json.dumps(header, ensure_ascii=False, indent=2).encode("utf-8"))
+            for member, fileobj in _git_archive_members(git, bot_path, commit):
+                exporter.add_stream(f"bot/{member.name}", member.size, fileobj, member.mtime)
+            for wheel in sorted(wheel_dir.iterdir()):
+                exporter.add_file(f"wheels/{wheel.name}", wheel)
+            redacted_count = 0
+            for rel in CONFIG_TEMPLATES:
+                config_path = bot_path / rel
+                if config_path.exists():
+                    text, count = redact_toml(config_path.read_text(encoding="utf-8"))
+                    redacted_count += count
+                    exporter.add_bytes(f"templates/{rel}", text.encode("utf-8"))
+            exporter.finish()
+    os.replace(tmp_output, output)
+    return {
+        "commit": commit,
+        "files": len(exporter.sums),
+        "bytes": exporter.total_bytes,
+        "archive_bytes": output.stat().st_size,
+        "redacted": redacted_count,
+    }
+
+
+# ==================== 导入 ====================
+def _safe_member_path(root: Path, name: str) -> Path:
+    """成员名在写入前检查：文件在比对 SHA256SUMS 之前就已落盘，哈希无法防止写到解包目录之外"""
+    path = PurePosixPath(name)
+    windows = PureWindowsPath(name)
+    if (
+        not path.parts
+        or "\\" in name
+        or path.is_absolute()
+        or windows.drive
+        or windows.root
+        or ".." in path.parts
+        or ".." in windows.parts
+        # Windows 上 C:x 这样的部分会让 joinpath 换到另一个盘符
+        or any(":" in part for part in path.parts)
+    ):
+        raise OfflineBundleError(f"离线包中包含不安全的路径: {name}")
+    return root.joinpath(*path.parts)
+
+
+def _copy_hashed(source, dest: Path) -> str:
+    hasher = hashlib.sha256()
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with open(dest, "wb") as f:
+        while block := source.read(COPY_BLOCK_SIZE):
+            hasher.update(block)
+            f.write(block)
+    return hasher.hexdigest()
+
+
+def unpack(archive_path: Path, staging: Path) -> dict:
+    """流式解包并校验哈希，返回 bundle.json 内容"""
+    if staging.exists():
+        shutil.rmtree(staging)
+    staging.mkdir(parents=True)
+    digests: Dict[str, str] = {}
+    sums_text = None
+    with tarfile.open(str(archive_path), mode="r|gz") as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            source = archive.extractfile(member)
+            if member.name == SUMS_NAME:
+                sums_text = source.read().decode("utf-8")
+                continue
+            digests[member.name] = _copy_hashed(source, _safe_member_path(staging, member.name))
+    if sums_text is None:
+        raise OfflineBundleError("离线包不完整：缺少 SHA256SUMS")
+    expected = {}
+    for line in sums_text.splitlines():
+        digest, _, name = line.partition("  ")
+        expected[name] = digest
+    if expected != digests:
+        bad = sorted(name for name in expected.keys() | digests.keys() if expected.get(name) != digests.get(name))
+        raise OfflineBundleError(f"校验失败的文件: {', '.join(bad[:5])}{' ...' if len(bad) > 5 else ''}")
+    with open(staging / "bundle.json", "r", encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format") != FORMAT_VERSION:
+        raise OfflineBundleError(f"不支持的离线包格式: {header.get('format')}")
+    return header
+
+
+def import_bundle(base_path: Path, archive_path: Path, replace: bool = False, install: bool = True) -> dict:
+    bot_path = base_path / "core" / "Bot"
+    state_path = base_path / "core" / ".onekey"
+    if bot_path.exists() and any(bot_path.iterdir()) and not replace:
+        raise OfflineBundleError(f"{bot_path} 已存在，如需覆盖请加 --replace（原目录会被重命名保留）")
+    staging = state_path / "offline_import"
+    print("正在解包并校验 ...", flush=True)
+    try:
+        header = unpack(archive_path, staging)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    backup = None
+    if bot_path.exists():
+        backup = bot_path.with_name(f"Bot.old-{time.strftime('%Y%m%d%H%M%S')}")
+        os.replace(bot_path, backup)
+    bot_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(staging / "bot", bot_path)
+    # 原目录中的用户数据随代码一起迁移
+    for name in ("config", "data", "logs", ".env"):
+        if backup and (backup / name).exists() and not (bot_path / name).exists():
+            os.replace(backup / name, bot_path / name)
+    for rel in CONFIG_TEMPLATES:
+        template = staging / "templates" / rel
+        if template.exists() and not (bot_path / rel).exists():
+            (bot_path / rel).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(template, bot_path / rel)
+
+    wheel_dir = state_path / "wheels"
+    if (staging / "wheels").exists():
+        shutil.rmtree(wheel_dir, ignore_errors=True)
+        os.replace(staging / "wheels", wheel_dir)
+    installed = None
+    requirements = bot_path / "requirements.txt"
+    if install and requirements.exists():
+        print("正在从离线包安装依赖 ...", flush=True)
+        installed = subprocess.run(
+            [
+                _python_executable(base_path),
+                "-m",
+                "pip",
+                "install",
+                "--no-index",
+                "--find-links",
+                str(wheel_dir),
+                "-r",
+                str(requirements),
+                "--disable-pip-version-check",
+            ]
+        ).returncode == 0
+    shutil.rmtree(staging, ignore_errors=True)
+
+    record = {"commit": header["commit"], "imported_at": time.time(), "archive": str(archive_path)}
+    with open(state_path / "offline_import.json", "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2, ensure_ascii=False)
+    return {**record, "backup": str(backup) if backup else None, "installed": installed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线部署包导出/导入")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="导出离线包")
+    export_parser.add_argument("-o", "--output", type=Path, default=Path(DEFAULT_ARCHIVE_NAME), help="输出文件")
+    export_parser.add_argument("--ref", default="HEAD", help="导出的提交或分支，默认 HEAD")
+    export_parser.add_argument("--no-wheels", action="store_true", help="不打包依赖")
+    export_parser.add_argument("--index-url", help="下载依赖使用的 PyPI 镜像")
+    import_parser = subparsers.add_parser("import", help="导入离线包")
+    import_parser.add_argument("archive", type=Path, nargs="?", default=None, help="离线包路径")
+    import_parser.add_argument("--replace", action="store_true", help="覆盖已有的 core/Bot（原目录重命名保留）")
+    import_parser.add_argument("--no-install", action="store_true", help="只解包，不安装依赖")
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent.absolute()
+    try:
+        if args.command == "export":
+            stats = export_bundle(base_path, args.output.absolute(), args.ref, not args.no_wheels, args.index_url)
+            print(
+                f"✅ 已导出 {args.output}: 提交 {stats['commit'][:12]}，{stats['files']} 个文件，"
+                f"压缩后 {stats['archive_bytes'] / 1024**2:.1f} MB，清空了 {stats['redacted']} 项密钥"
+            )
+        else:
+            archive = args.archive or base_path / DEFAULT_ARCHIVE_NAME
+            result = import_bundle(base_path, archive.absolute(), args.replace, not args.no_install)
+            print(f"✅ 已导入提交 {result['commit'][:12]} 到 core/Bot")
+            if result["backup"]:
+                print(f"   原目录已保留为 {result['backup']}")
+            if result["installed"] is False:
+                print("❌ 依赖安装失败，请查看上方 pip 输出")
+                sys.exit(1)
+    except (OfflineBundleError, OSError, EOFError, tarfile.TarError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+OneBot v11 反向 WebSocket 工具
+- WebSocketClient: 以 Napcat 的身份连接 Bot 适配器的 WS 服务端（仅依赖标准库）
+- StandInBot: 本地替身服务端，模拟适配器的行为（响应 ping、回复消息事件），用于自测
+"""
+
+import base64
+import hashlib
+import json
+import math
+import os
+import socket
+import struct
+import threading
+import time
+import tomllib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+DEFAULT_ADAPTER_PORT = 8095
+
+
+class WebSocketClosed(Exception):
+    pass
+
+
+def adapter_endpoint(bot_path: Path) -> Tuple[str, str]:
+    """从 Napcat 适配器配置读取 Bot 监听的 WS 地址和 token。"""
+    port, token = DEFAULT_ADAPTER_PORT, ""
+    config_path = bot_path / "config" / "plugins" / "napcat_adapter" / "config.toml"
+    try:
+        with open(config_path, "rb") as f:
+            server = tomllib.load(f).get("napcat_server", {})
+        port = int(server.get("port", port))
+        token = str(server.get("access_token", token))
+    except (OSError, ValueError, tomllib.TOMLDecodeError):
+        pass
+    return f"ws://127.0.0.1:{port}", token
+
+
+def _accept_key(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise WebSocketClosed("连接已关闭")
+        data += chunk
+    return bytes(data)
+
+
+def _read_http_head(sock: socket.socket) -> bytes:
+    head = bytearray()
+    while b"\r\n\r\n" not in head:
+        chunk = sock.recv(1)
+        if not chunk:
+            raise WebSocketClosed("握手过程中连接被关闭")
+        head += chunk
+        if len(head) > 65536:
+            raise ValueError("握手头部过长")
+    return bytes(head)
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool) -> bytes:
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 65536:
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", length)
+    if not mask:
+        return bytes(header) + payload
+    # 客户端发送的帧必须加掩码
+    mask_key = os.urandom(4)
+    masked = bytes(b ^ mask_key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + mask_key + masked
+
+
+def read_frame(sock: socket.socket) -> Tuple[bool, int, bytes]:
+    first, second = _recv_exact(sock, 2)
+    fin = bool(first & 0x80)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", _recv_exact(sock, 2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", _recv_exact(sock, 8))[0]
+    mask_key = _recv_exact(sock, 4) if second & 0x80 else None
+    payload = _recv_exact(sock, length) if length else b""
+    if mask_key:
+        payload = bytes(b ^ mask_key[i % 4] for i, b in enumerate(payload))
+    return fin, opcode, payload
+
+
+class _Connection:
+    """收发帧的公共逻辑，发送加锁以便多个线程共用一条连接。"""
+
+    def __init__(self, sock: socket.socket, mask: bool):
+        self.sock = sock
+        self.mask = mask
+        self._send_lock = threading.Lock()
+        self.closed = False
+
+    def send(self, opcode: int, payload: bytes = b""):
+        frame = encode_frame(opcode, payload, self.mask)
+        with self._send_lock:
+            self.sock.sendall(frame)
+
+    def send_text(self, text: str):
+        self.send(OP_TEXT, text.encode("utf-8"))
+
+    def send_json(self, data: dict):
+        self.send_text(json.dumps(data, ensure_ascii=False))
+
+    def send_ping(self, payload: bytes = b""):
+        self.send(OP_PING, payload)
+
+    def recv(self) -> Tuple[int, bytes]:
+        """读取一条完整消息，自动合并分片；返回 (opcode, payload)。"""
+        fin, opcode, payload = read_frame(self.sock)
+        if opcode in (OP_PING, OP_PONG, OP_CLOSE):
+            if opcode == OP_CLOSE:
+                self.closed = True
+            return opcode, payload
+        message = bytearray(payload)
+        while not fin:
+            fin, next_opcode, payload = read_frame(self.sock)
+            if next_opcode == OP_PING:
+                self.send(OP_PONG, payload)
+                continue
+            message += payload
+        return opcode, bytes(message)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.send(OP_CLOSE, struct.pack("!H", 1000))
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class WebSocketClient(_Connection):
+    """按 Napcat 反向 WS 客户端的方式连接 Bot（携带 X-Self-ID 与可选的 token）。"""
+
+    def __init__(self, url: str, self_id: int, token: str = "", timeout: float = 5.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.resource = parsed.path or "/"
+        self.self_id = self_id
+        self.token = token
+        sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().__init__(sock, mask=True)
+        self._handshake()
+
+    def _handshake(self):
+        key = base64.b64encode(os.urandom(16)).decode()
+        headers = [
+            f"GET {self.resource} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            "Upgrade: websocket",
+            "Connection: Upgrade",
+            f"Sec-WebSocket-Key: {key}",
+            "Sec-WebSocket-Version: 13",
+            f"X-Self-ID: {self.self_id}",
+            "X-Client-Role: Universal",
+        ]
+        if self.token:
+            headers.append(f"Authorization: Bearer {self.token}")
+        self.sock.sendall(("\r\n".join(headers) + "\r\n\r\n").encode())
+        head = _read_http_head(self.sock).decode("latin-1")
+        status_line, *header_lines = head.split("\r\n")
+        if " 101 " not in status_line + " ":
+            raise ConnectionError(f"握手失败: {status_line}")
+        response = {
+            line.split(":", 1)[0].strip().lower(): line.split(":", 1)[1].strip()
+            for line in header_lines
+            if ":" in line
+        }
+        if response.get("sec-websocket-accept") != _accept_key(key):
+            raise ConnectionError("握手失败: Sec-WebSocket-Accept 不匹配")
+
+
+def make_event(self_id: int, post_type: str, **fields) -> dict:
+    return {"time": int(time.time()), "self_id": self_id, "post_type": post_type, **fields}
+
+
+class StandInBot:
+    """
+    本地替身 Bot：在指定端口提供 WS 服务端，行为与适配器一致：
+    - 回应 ping
+    - 收到消息事件后（可选延迟）调用 send_group_msg / send_private_msg 回复
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, reply_delay: float = 0.0):
+        self.reply_delay = reply_delay
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+        self.url = f"ws://{host}:{self.port}"
+        self.received: List[dict] = []
+        self.connections: List[_Connection] = []
+        self._echo = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self) -> "StandInBot":
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self.server.close()
+        for connection in list(self.connections):
+            connection.close()
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+    def _serve(self, sock: socket.socket):
+        try:
+            head = _read_http_head(sock).decode("latin-1")
+            headers = {
+                line.split(":", 1)[0].strip().lower(): line.split(":", 1)[1].strip()
+                for line in head.split("\r\n")[1:]
+                if ":" in line
+            }
+            accept = _accept_key(headers.get("sec-websocket-key", ""))
+            sock.sendall(
+                (
+                    "HTTP/1.1 101 Switching Protocols\r\n"
+                    "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+                    f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+                ).encode()
+            )
+            connection = _Connection(sock, mask=False)
+            self.connections.append(connection)
+            while not self._stopped.is_set():
+                opcode, payload = connection.recv()
+                if opcode == OP_PING:
+                    connection.send(OP_PONG, payload)
+                elif opcode == OP_CLOSE:
+                    return
+                elif opcode == OP_TEXT:
+                    self._handle(connection, json.loads(payload))
+        except (WebSocketClosed, OSError, ValueError):
+            pass
+        finally:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _handle(self, connection: _Connection, data: dict):
+        with self._lock:
+            self.received.append(data)
+        if data.get("post_type") != "message":
+            return
+        if self.reply_delay:
+            time.sleep(self.reply_delay)
+        with self._lock:
+            self._echo += 1
+            echo = f"standin-{self._echo}"
+        if data.get("message_type") == "group":
+            action = "send_group_msg"
+            params: Dict[str, object] = {"group_id": data.get("group_id")}
+        else:
+            action = "send_private_msg"
+            params = {"user_id": data.get("user_id")}
+        params["message"] = [{"type": "text", "data": {"text": "收到"}}]
+        connection.send_json({"action": action, "params": params, "echo": echo})
+
+
+def percentiles(samples, points=(50, 95, 99)) -> Optional[Dict[str, float]]:
+    """最近邻秩法计算百分位数，单位与样本一致。"""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    result = {}
+    for point in points:
+        index = max(0, math.ceil(point / 100 * len(ordered)) - 1)
+        result[f"p{point}"] = ordered[index]
+    return result
@@ -7,15 +7,45 @@ mofox 一键管理程序
 2. 管理配置文件
 """
 
+import argparse
 import io
 import json
 import os
+import sqlite3
 import subprocess
 import sys
+import threading
 import time
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
 
+# 内置的嵌入式Python不会自动把脚本所在目录加入 sys.path
+sys.path.insert(0, str(Path(__file__).parent.absolute()))
+
+import background_update  # noqa: E402
+import config_validator  # noqa: E402
+import disk_usage  # noqa: E402
+import git_maintenance  # noqa: E402
+import git_tools  # noqa: E402
+import instances  # noqa: E402
+import latency_probe  # noqa: E402
+import launcher  # noqa: E402
+import learning_queue  # noqa: E402
+import loadtest  # noqa: E402
+import maintenance_scheduler  # noqa: E402
+import log_index  # noqa: E402
+import metrics  # noqa: E402
+import onebot_ws  # noqa: E402
+import plugin_requirements  # noqa: E402
+import preflight  # noqa: E402
+import prefetch  # noqa: E402
+import repo_status  # noqa: E402
+import requirements_check  # noqa: E402
+import resource_limits  # noqa: E402
+import service_state  # noqa: E402
+import tracing  # noqa: E402
+
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
 
 
@@ -64,31 +94,328 @@ class Colors:
 
 class MaiBotManager:
     # ==================== 1. 初始化 ====================
-    def __init__(self):
+    def __init__(self, reloaded: bool = False, background_tasks: bool = True):
         self.base_path = Path(__file__).parent.absolute()
-        self.python_executable = self.base_path / "python_embedded" / "python.exe"
+        self.python_executable = launcher.python_executable(self.base_path)
         self.running_processes: Dict[str, subprocess.Popen] = {}
-
+        # 定时维护线程也会启停服务，对 running_processes 和服务登记的修改与遍历都在这把锁内进行
+        self._services_lock = threading.RLock()
+        # 各 Bot 服务的链路延迟探针，键为服务名
+        self.latency_probes: Dict[str, latency_probe.LatencyProbe] = {}
+        # 管理程序自身的状态与缓存文件目录
+        self.state_path = self.base_path / "core" / ".onekey"
+        # 设置 ONEKEY_TRACE=1 时记录每个 git / pip 命令的耗时，见 tracing.py
+        self.tracer = tracing.Tracer.from_env(self.state_path, "onekey")
+        # 后台更新任务，结束后在主菜单提示一次结果
+        self.update_job: Optional[background_update.UpdateJob] = None
+        self._update_reported = True
+
+        # limits: 资源限制，见 resource_limits.py；可在 service_limits.json 中覆盖
         self.services = {
             "bot": {
                 "name": "MoFox_Bot 主程序",
                 "path": self.base_path / "core" / "Bot",
                 "main_file": "__main__.py",
                 "type": "python",
+                "limits": {},
             },
             "napcat": {
                 "name": "Napcat 服务",
                 "path": self.base_path / "core" / "Napcat",
                 "main_file": "napcat.bat",
                 "type": "batch",
+                "limits": {},
             },
             "vscode": {
                 "name": "VSCode",
                 "path": self.base_path / "core" / "vscode",
                 "main_file": "code.exe",
                 "type": "exe",
+                "limits": {},
+            },
+            "learning_tool": {
+                "name": "知识库学习工具",
+                "path": self.base_path / "core" / "Bot" / "scripts",
+                "main_file": "lpmm_learning_tool.py",
+                "type": "python",
+                # 学习工具是重负载的批处理任务，降低优先级避免拖慢在线 Bot 的响应
+                "limits": {"priority": "idle"},
             },
         }
+        self._load_service_limits()
+        # 多实例：共用 core/Bot 代码，每个实例对应一组 bot@名称 / napcat@名称 服务
+        self.instance_manager = instances.InstanceManager(
+            self.base_path, self.python_executable
+        )
+        self._refresh_instance_services()
+        # 知识库学习队列，后台批量学习文件，沿用学习工具的资源限制
+        self.learning_queue = learning_queue.LearningQueue(
+            self.services["learning_tool"]["path"],
+            self.state_path,
+            self.python_executable,
+            self.services["learning_tool"]["limits"],
+        )
+        # 环境预检，启动和更新前的快速检查，Python/Git 版本按文件修改时间缓存
+        self.preflight = preflight.Preflight(self.base_path, self.state_path, self.python_executable)
+        # 后台定期预取上游提交，更新时只需本地快进
+        self.prefetcher = prefetch.Prefetcher(self.base_path, self.state_path)
+        # 命令行模式（见 run_command_line）执行完即退出，不启动后台任务
+        if background_tasks:
+            self._start_scheduled_maintenance()
+            self.prefetcher.start()
+        # 启动时需要告知用户的信息，在第一次显示菜单时输出
+        self.notices: List[str] = []
+        if reloaded:
+            self.notices.append("✅ 管理程序已重新加载")
+        # 持久化的服务进程记录，管理程序重启（或崩溃后重开）时据此重新接管服务
+        self.service_registry = service_state.ServiceRegistry(self.state_path / "services.json")
+        self._reattach_services()
+        # Prometheus 指标接口，数值由采集线程写入内存，抓取时只做格式化
+        self.metrics = metrics.Metrics()
+        self.metrics_server: Optional[metrics.MetricsServer] = None
+        self.metrics_collector: Optional[metrics.MetricsCollector] = None
+        # 本次运行中启动过的服务，再次启动时计为重启
+        self._started_services = set()
+        self._last_update_mtime: Optional[float] = None
+        metrics_settings = metrics.load_settings(self.state_path)
+        if background_tasks and metrics_settings["enabled"]:
+            self._start_metrics(metrics_settings)
+        # 定时维护（更新、重启、数据库整理），见 maintenance_scheduler.py
+        self.maintenance: Optional[maintenance_scheduler.MaintenanceScheduler] = None
+        if background_tasks:
+            self._start_maintenance_scheduler()
+
+    def _start_metrics(self, settings: dict) -> bool:
+        server = metrics.MetricsServer(self.metrics, settings["host"], settings["port"])
+        try:
+            server.start()
+        except OSError as e:
+            self.notices.append(f"⚠️ 指标接口启动失败 ({settings['host']}:{settings['port']}): {e}")
+            return False
+        self.metrics_server = server
+        self.metrics_collector = metrics.MetricsCollector(self._collect_metrics)
+        self.metrics_collector.start()
+        return True
+
+    def _stop_metrics(self):
+        if self.metrics_collector:
+            self.metrics_collector.stop()
+            self.metrics_collector = None
+        if self.metrics_server:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    def _collect_metrics(self):
+        """由采集线程定期调用，把服务与文件状态写入内存中的指标"""
+        now = time.time()
+        for service_key, service in list(self.services.items()):
+            process = self.running_processes.get(service_key)
+            up = process is not None and process.poll() is None
+            self.metrics.set("onekey_service_up", 1 if up else 0, service=service_key)
+            self.metrics.inc("onekey_service_restarts_total", 0, service=service_key)
+            entry = self.service_registry.entries.get(service_key)
+            if up and entry:
+                self.metrics.set("onekey_service_uptime_seconds", now - entry["started_at"], service=service_key)
+            else:
+                self.metrics.remove("onekey_service_uptime_seconds", service=service_key)
+            usage = service_state.process_usage(process.pid) if up else None
+            if usage:
+                self.metrics.set("onekey_service_cpu_seconds_total", usage[0], service=service_key)
+                self.metrics.set("onekey_service_resident_memory_bytes", usage[1], service=service_key)
+            else:
+                self.metrics.remove("onekey_service_cpu_seconds_total", service=service_key)
+                self.metrics.remove("onekey_service_resident_memory_bytes", service=service_key)
+            if service_key.split("@")[0] == "bot":
+                try:
+                    size = (service["path"] / "data" / "MaiBot.db").stat().st_size
+                    self.metrics.set("onekey_database_size_bytes", size, service=service_key)
+                except OSError:
+                    self.metrics.remove("onekey_database_size_bytes", service=service_key)
+        # update.py 结束时写入 last_update.json，文件变化时才重新读取
+        results_path = self.state_path / "last_update.json"
+        try:
+            mtime = results_path.stat().st_mtime
+        except OSError:
+            return
+        if mtime != self._last_update_mtime:
+            with open(results_path, "r", encoding="utf-8") as f:
+                metrics.record_update_result(self.metrics, json.load(f))
+            self._last_update_mtime = mtime
+
+    def toggle_metrics(self):
+        """开启/关闭 Prometheus 指标接口，设置会保存，下次启动管理程序时自动恢复"""
+        settings = metrics.load_settings(self.state_path)
+        if self.metrics_server:
+            self._stop_metrics()
+            metrics.save_settings(self.state_path, {**settings, "enabled": False})
+            print(Colors.green("✅ 指标接口已关闭"))
+            return
+        port_text = input(f"监听端口 (默认 {settings['port']}): ").strip()
+        if port_text:
+            if not port_text.isdigit() or not 0 < int(port_text) < 65536:
+                print(Colors.red("无效端口"))
+                return
+            settings["port"] = int(port_text)
+        if not self._start_metrics(settings):
+            print(Colors.red(self.notices.pop()))
+            return
+        metrics.save_settings(self.state_path, {**settings, "enabled": True})
+        print(Colors.green(f"✅ 指标接口已开启: http://{settings['host']}:{settings['port']}/metrics"))
+        print(Colors.cyan("   数值每 5 秒采集一次，可直接添加到 Prometheus 的 scrape_configs"))
+
+    def _reattach_services(self):
+        """接管上一个管理程序进程启动、且仍在运行的服务"""
+        attached = self.service_registry.reattach(self.services)
+        self.running_processes.update(attached)
+        if attached:
+            names = "、".join(self.services[key]["name"] for key in attached)
+            self.notices.append(f"✅ 已接管正在运行的服务: {names}")
+
+    def _start_scheduled_maintenance(self):
+        """距上次 Git 仓库维护超过间隔时，在后台以低优先级自动执行"""
+        self.state_path.mkdir(parents=True, exist_ok=True)
+        if git_maintenance.is_due(self.state_path):
+            threading.Thread(
+                target=git_maintenance.maintain_all,
+                args=(self.base_path, self.state_path),
+                daemon=True,
+            ).start()
+
+    def _start_maintenance_scheduler(self) -> bool:
+        """maintenance_schedule.json 中开启时，启动定时维护线程"""
+        schedule = maintenance_scheduler.load_schedule(self.base_path)
+        if not schedule["enabled"]:
+            return False
+        try:
+            scheduler = maintenance_scheduler.MaintenanceScheduler(
+                schedule,
+                self.state_path,
+                {
+                    "fetch": self._maintenance_fetch,
+                    "update": self._maintenance_update,
+                    "database": self._maintenance_database,
+                },
+                self._maintenance_busy,
+            )
+        except (ValueError, KeyError, TypeError) as e:
+            self.notices.append(f"⚠️ maintenance_schedule.json 配置有误，定时维护未启动: {e}")
+            return False
+        scheduler.start()
+        self.maintenance = scheduler
+        return True
+
+    def _stop_maintenance_scheduler(self):
+        if self.maintenance:
+            self.maintenance.stop()
+            self.maintenance = None
+
+    def _running_bot_keys(self) -> List[str]:
+        with self._services_lock:
+            return [
+                key
+                for key, process in self.running_processes.items()
+                if key.split("@")[0] == "bot" and process.poll() is None
+            ]
+
+    def _maintenance_busy(self, job: dict) -> Optional[str]:
+        """定时维护执行前的检查：Bot 正在对话、负载过高或有其他后台任务时返回原因"""
+        if self.update_job and self.update_job.running:
+            return "后台更新正在进行"
+        if self.learning_queue.running:
+            return "知识库学习队列正在处理"
+        with self._services_lock:
+            pids = {
+                key: process.pid
+                for key, process in self.running_processes.items()
+                if key.split("@")[0] == "bot" and process.poll() is None
+            }
+        log_files = []
+        for service_key in pids:
+            log_files += log_index.log_files(self._service_log_dirs(service_key))
+            log_files.append(launcher.log_path(self.state_path, service_key))
+        return maintenance_scheduler.busy_reason(self.maintenance.schedule, list(pids.values()), log_files)
+
+    def _maintenance_fetch(self, job: dict) -> tuple:
+        # 与后台预取线程共用 prefetch 模块内的锁，后台正在预取时等待其结束后再拉取
+        state = prefetch.prefetch_all(self.base_path, self.state_path, force=True)
+        failed = [key for key, entry in state.items() if not entry.get("ok")]
+        if failed:
+            return False, f"预取失败: {', '.join(failed)}"
+        return True, f"已预取 {len(state)} 个仓库"
+
+    def _maintenance_update(self, job: dict) -> tuple:
+        """运行更新程序并等待结束；Bot 有新版本时重启正在运行的 Bot"""
+        report = self.preflight.run(self.services, "update", self._running_service_keys())
+        failed = preflight.failures(report)
+        if failed:
+            return False, "环境预检未通过: " + "; ".join(preflight.format_result(result) for result in failed)
+        update_job = background_update.UpdateJob(
+            self.python_executable,
+            self.base_path / "update.py",
+            self.state_path / "update.log",
+        )
+        update_job.start()
+        # 结果由定时维护处理，主菜单不再询问是否重启
+        self.update_job = update_job
+        self._update_reported = True
+        update_job.wait()
+        if not update_job.succeeded:
+            return False, f"部分步骤未成功，见 {update_job.log_path}"
+        changed = update_job.changed_services()
+        details = [f"有更新: {', '.join(changed)}" if changed else "均已是最新版本"]
+        if "bot" in changed and job.get("restart", True):
+            restarted = []
+            # 重启期间持有服务锁，主菜单的启动/状态查看等待重启完成
+            with self._services_lock:
+                for service_key in self._running_bot_keys():
+                    self.stop_service(service_key)
+                    time.sleep(2)  # 等待旧进程释放端口
+                    if self.start_service(service_key):
+                        restarted.append(service_key)
+            if restarted:
+                details.append(f"已重启 {', '.join(restarted)}")
+        if "onekey" in changed:
+            self.notices.append("✅ 管理程序已由定时维护更新，重新打开管理程序后生效")
+        return True, "，".join(details)
+
+    def _maintenance_database(self, job: dict) -> tuple:
+        details = []
+        ok = True
+        for service_key, service in self.services.items():
+            db_path = service["path"] / "data" / "MaiBot.db"
+            if service_key.split("@")[0] != "bot" or not db_path.exists():
+                continue
+            try:
+                result = maintenance_scheduler.vacuum_database(db_path)
+            except sqlite3.Error as e:
+                ok = False
+                details.append(f"{service_key}: {e}")
+                continue
+            details.append(
+                f"{service_key}: {disk_usage.format_size(result['before'])} → {disk_usage.format_size(result['after'])}"
+            )
+        return ok, "，".join(details) or "没有数据库文件"
+
+    def _load_service_limits(self):
+        """从 service_limits.json 读取用户自定义的资源限制，覆盖默认值"""
+        limits_path = self.base_path / "service_limits.json"
+        if not limits_path.exists():
+            return
+        try:
+            with open(limits_path, "r", encoding="utf-8") as f:
+                overrides = json.load(f)
+        except Exception as e:
+            print(Colors.red(f"读取 {limits_path.name} 失败: {e}"))
+            return
+        for service_key, limits in overrides.items():
+            if service_key in self.services:
+                self.services[service_key]["limits"] = limits
+
+    def _refresh_instance_services(self):
+        for service_key, service in self.instance_manager.services().items():
+            # 实例沿用主程序/Napcat 的资源限制
+            service["limits"] = self.services[service_key.split("@")[0]]["limits"]
+            self.services[service_key] = service
 
     # ==================== 2. 主程序运行逻辑 ====================
     def run(self):
@@ -98,7 +425,11 @@ class MaiBotManager:
             self.print_menu()
 
             try:
-                choice = input(Colors.bold("请选择操作 (0-14): ")).strip()
+                for notice in self.notices:
+                    print(Colors.green(notice))
+                self.notices.clear()
+                self._report_finished_update()
+                choice = input(Colors.bold("请选择操作 (0-25): ")).strip()
 
                 actions = {
                     "1": self.start_service_group,
@@ -115,9 +446,23 @@ class MaiBotManager:
                     "12": self.open_data_folder,
                     "13": self.open_plugin_folder,
                     "14": self.delete_database,
+                    "15": self.validate_config_files,
+                    "16": self.manage_instances,
+                    "17": self.toggle_latency_probe,
+                    "18": self.run_load_test,
+                    "19": self.search_logs,
+                    "20": self.run_git_maintenance,
+                    "21": self.start_background_update,
+                    "22": self.self_update,
+                    "23": self.toggle_metrics,
+                    "24": self.analyze_disk_usage,
+                    "25": self.manage_maintenance,
                 }
 
                 if choice == "0":
+                    # 学习队列中进行到一半的项重新排队，下次打开后继续
+                    self.learning_queue.stop()
+                    self._stop_maintenance_scheduler()
                     print(Colors.green("程序退出"))
                     break
 
@@ -131,6 +476,8 @@ class MaiBotManager:
 
             except KeyboardInterrupt:
                 print(Colors.yellow("\n检测到 Ctrl+C，正在安全退出..."))
+                self.learning_queue.stop()
+                self._stop_maintenance_scheduler()
                 self.stop_all_services()
                 break
             except Exception as e:
@@ -153,6 +500,24 @@ class MaiBotManager:
                 "> 请注意！ 这个版本的所有后续更新均为我们的第三方更新，不代表 MaiBot 官方立场"
             )
         )
+        self.print_repo_status()
+
+    def print_repo_status(self):
+        """显示各仓库落后/领先远程的提交数（结果已缓存，引用变化时才会重新计算）"""
+        try:
+            statuses = repo_status.collect(self.base_path, self.state_path)
+        except Exception:
+            return
+        for status in statuses.values():
+            if status.get("behind") is None:
+                continue
+            text = f"{status['name']} ({status['branch']}): {repo_status.describe(status)}"
+            if not status["behind"]:
+                print(Colors.green(text))
+                continue
+            print(Colors.yellow(f"{text}，可使用更新程序更新"))
+            for commit in status["missing"][:3]:
+                print(f"  {Colors.CYAN}{commit['sha']}{Colors.END} {commit['subject']}")
 
     def print_menu(self):
         print(Colors.bold("主菜单："))
@@ -178,18 +543,166 @@ class MaiBotManager:
         print("  4. 启动 vscode")
         print("  5. 查看运行状态")
         print("  6. 启动数据库管理程序")
+        print(f"  17. 链路延迟探针 ({'已开启' if self.latency_probes else '已关闭'})")
+        print("  18. 消息压测")
         print()
         print(Colors.yellow("其他功能："))
         print("  7. 安装/更新依赖包")
         print("  8. 查看系统信息")
         print("  9. 切换Bot主程序分支")
-        print("  10. 启动知识库学习工具")
+        print("  10. 知识库学习 (学习工具 / 后台学习队列)")
+        print("  16. 多实例管理 →")
+        print("  20. Git 仓库维护")
+        print("  21. 后台更新 (更新期间菜单可继续使用)")
+        print("  22. 更新管理程序自身 (不中断运行中的服务)")
+        print(f"  23. Prometheus 指标接口 ({'已开启' if self.metrics_server else '已关闭'})")
+        print("  24. 磁盘占用分析与清理")
+        print(f"  25. 定时维护 ({'已开启' if self.maintenance else '已关闭'})")
+        if self.update_job and self.update_job.running:
+            print()
+            print(Colors.blue("后台更新进度："))
+            for line in self.update_job.progress_lines():
+                print(f"  {line}")
         print()
         print(Colors.magenta(" BOT管理："))
         print("  11. 打开配置文件")
         print("  12. 打开数据文件夹")
         print("  13. 打开插件文件夹")
         print(f"  14. {Colors.RED}删除数据库 (请谨慎操作!){Colors.END}")
+        print("  15. 校验配置文件")
+        print("  19. 搜索日志")
+
+    def start_background_update(self):
+        """在后台运行更新程序，菜单保持可用"""
+        if self.update_job and self.update_job.running:
+            print(Colors.bold("后台更新进度："))
+            for line in self.update_job.progress_lines():
+                print(f"  {line}")
+            for line in list(self.update_job.recent_lines)[-5:]:
+                print(f"    {line}")
+            return
+        if not self.preflight_gate("update", "更新"):
+            return
+        self.update_job = background_update.UpdateJob(
+            self.python_executable,
+            self.base_path / "update.py",
+            self.state_path / "update.log",
+        )
+        try:
+            self.update_job.start()
+        except OSError as e:
+            print(Colors.red(f"❌ 启动更新失败: {e}"))
+            self.update_job = None
+            return
+        self._update_reported = False
+        print(Colors.green("✅ 已在后台开始更新，进度会显示在主菜单中"))
+        print(Colors.cyan("有未提交修改的仓库会被跳过，如需强制更新请使用「启动更新程序.bat」"))
+
+    def self_update(self):
+        """拉取管理程序的新代码，并在不中断服务的情况下重新加载"""
+        if self._update_running():
+            return
+        repo = git_tools.load_repos(self.base_path).get("onekey")
+        git = git_tools.find_git_executable(self.base_path)
+        if not repo or not (self.base_path / ".git").exists():
+            print(Colors.red("❌ 管理程序目录不是 Git 仓库，无法自更新"))
+            return
+        if not git:
+            print(Colors.red("❌ 未找到 Git"))
+            return
+        branch = repo.get("branch", "master")
+        _, current_branch, _ = git_tools.run_git(git, self.base_path, ["rev-parse", "--abbrev-ref", "HEAD"])
+        if current_branch.strip() != branch:
+            print(Colors.yellow(f"⚠️ 当前分支为 {current_branch.strip()}，请先使用更新程序切换到 {branch}"))
+            return
+        _, status, _ = git_tools.run_git(
+            git, self.base_path, ["status", "--porcelain", "--untracked-files=no"]
+        )
+        if status.strip():
+            print(Colors.yellow("⚠️ 管理程序目录有未提交的修改，请使用更新程序处理"))
+            return
+
+        old_head = git_tools.read_head_commit(self.base_path)
+        if not prefetch.is_fresh(self.state_path, "onekey", self.base_path, branch):
+            print(Colors.blue("正在拉取管理程序的最新代码..."))
+            ok, _, stderr = git_tools.run_git(
+                git,
+                self.base_path,
+                ["fetch", "--quiet", "--no-tags", repo["repo_url"], f"+refs/heads/{branch}:refs/remotes/origin/{branch}"],
+            )
+            if not ok:
+                print(Colors.red(f"❌ 拉取失败: {stderr.strip()}"))
+                return
+        ok, _, stderr = git_tools.run_git(git, self.base_path, ["merge", "--ff-only", f"origin/{branch}"])
+        if not ok:
+            print(Colors.red(f"❌ 无法快进到 origin/{branch}: {stderr.strip()}"))
+            return
+        new_head = git_tools.read_head_commit(self.base_path)
+        if new_head == old_head:
+            print(Colors.green("✅ 管理程序已是最新版本"))
+            return
+        print(Colors.green(f"✅ 管理程序已更新到 {(new_head or '')[:8]}"))
+        self.reload_manager()
+
+    def reload_manager(self):
+        """就地重新执行管理程序，新进程会从服务注册表接管正在运行的服务"""
+        if self._update_running():
+            return
+        self.prefetcher.stop()
+        self._stop_maintenance_scheduler()
+        # 进行中的学习项重新排队，由新进程继续；否则旧进程（Windows）或遗留的学习进程（execv 后）会与新进程重复执行
+        if self.learning_queue.running:
+            print(Colors.cyan("正在暂停学习队列，未完成的项会在重新加载后继续..."))
+        self.learning_queue.stop()
+        # Windows 上新进程启动时旧进程仍在，需先释放指标端口
+        self._stop_metrics()
+        for probe in self.latency_probes.values():
+            probe.stop()
+        print(Colors.cyan("正在重新加载管理程序..."))
+        sys.stdout.flush()
+        argv = [sys.executable, str(Path(__file__).absolute()), "--reloaded"]
+        if os.name == "nt":
+            # Windows 上 os.execv 会让控制台立即收回输入，改为等待新进程结束后再退出
+            sys.exit(subprocess.call(argv))
+        os.execv(sys.executable, argv)
+
+    def _update_running(self) -> bool:
+        """后台更新的输出由本进程读取，重新加载会使 update.py 在 git/pip 中途遇到管道断开"""
+        if self.update_job and self.update_job.running:
+            print(Colors.yellow("⚠️ 后台更新正在进行，请等待更新结束后再更新或重新加载管理程序"))
+            return True
+        return False
+
+    def _report_finished_update(self):
+        """后台更新结束后显示结果，有新版本时询问是否重启正在运行的 Bot"""
+        job = self.update_job
+        if job is None or job.running or self._update_reported:
+            return
+        self._update_reported = True
+        print()
+        print(Colors.bold("后台更新已结束："))
+        for line in job.progress_lines():
+            print(f"  {line}")
+        if not job.succeeded:
+            print(Colors.yellow("⚠️ 部分步骤未成功，请查看更新日志"))
+        changed = job.changed_services()
+        if not changed:
+            print(Colors.green("✅ 所有仓库均已是最新版本"))
+            return
+        # 先处理 Bot 重启：重新加载管理程序会就地重新执行，之后的询问不会再出现
+        if "bot" in changed and self._running_bot_keys():
+            choice = input(Colors.bold("Bot 已更新，是否立即重启正在运行的 Bot 以加载新版本？(Y/N): "))
+            if choice.strip().lower() == "y":
+                # 与定时维护的重启相同，持有服务锁完成整个停止-启动过程
+                with self._services_lock:
+                    for service_key in self._running_bot_keys():
+                        self.stop_service(service_key)
+                        time.sleep(2)  # 等待旧进程释放端口
+                        self.start_service(service_key)
+        if "onekey" in changed:
+            choice = input(Colors.bold("管理程序已更新，是否立即重新加载？正在运行的服务不会中断 (Y/N): "))
+            if choice.strip().lower() == "y":
+                self.reload_manager()
 
     def print_service_groups_menu(self):
         print(Colors.bold("选择启动组："))
@@ -202,27 +715,129 @@ class MaiBotManager:
         
     def show_status(self):
         print(Colors.bold("服务运行状态："))
-        for service_key, service in self.services.items():
-            if process := self.running_processes.get(service_key):
-                if process.poll() is None:
-                    status = Colors.green("🟢 运行中")
+        with self._services_lock:
+            for service_key, service in self.services.items():
+                if process := self.running_processes.get(service_key):
+                    if process.poll() is None:
+                        status = Colors.green("🟢 运行中")
+                    else:
+                        status = Colors.red("🔴 已停止")
+                        del self.running_processes[service_key]
+                        self.service_registry.remove(service_key)
                 else:
-                    status = Colors.red("🔴 已停止")
-                    del self.running_processes[service_key]
-            else:
-                status = Colors.yellow("⚪ 未启动")
-            print(f"  {service['name']}: {status}")
+                    status = Colors.yellow("⚪ 未启动")
+                print(f"  {service['name']}: {status}")
+        # 探针与 Napcat 不能同时连接适配器，Napcat 运行时没有延迟数据，明确说明原因
+        probe_keys = [
+            key
+            for key in self.services
+            if key in self.latency_probes or (key.split("@")[0] == "bot" and self._napcat_running(key))
+        ]
+        if probe_keys:
+            print()
+            print(Colors.bold("Bot ⇄ Napcat 链路延迟："))
+            for service_key in probe_keys:
+                if probe := self.latency_probes.get(service_key):
+                    text = latency_probe.format_snapshot(probe.snapshot())
+                else:
+                    text = Colors.yellow("探针已关闭：Napcat 已连接（适配器同一时间只服务一个客户端，无法测量实时链路）")
+                print(f"  {self.services[service_key]['name']}: {text}")
+        prefetch_state = prefetch.load_state(self.state_path)
+        if prefetch_state:
+            print()
+            print(Colors.bold("后台预取："))
+            for repo_key, entry in prefetch_state.items():
+                print(f"  {repo_key}: {prefetch.describe(entry)}")
+
+    def toggle_latency_probe(self):
+        """开启/关闭 Bot ⇄ Napcat 链路延迟探针"""
+        if self.latency_probes:
+            for probe in self.latency_probes.values():
+                probe.stop()
+            self.latency_probes.clear()
+            print(Colors.green("✅ 链路延迟探针已关闭"))
+            return
+
+        for service_key, service in self.services.items():
+            if service_key.split("@")[0] != "bot":
+                continue
+            if self._napcat_running(service_key):
+                # 探针是第二个 OneBot 客户端，会与 Napcat 争用适配器连接，并拒绝发给它的 API 调用
+                print(Colors.yellow(f"⚠️ {service['name']} 的 Napcat 正在运行，已跳过（探针会与 Napcat 争用适配器连接）"))
+                continue
+            url, token = onebot_ws.adapter_endpoint(service["path"])
+            probe = latency_probe.LatencyProbe(url, token)
+            probe.start()
+            self.latency_probes[service_key] = probe
+            print(Colors.green(f"✅ 已开始探测 {service['name']} ({url})"))
+        if self.latency_probes:
+            print(Colors.cyan("延迟数据会显示在「查看运行状态」中；启动对应的 Napcat 时探针会自动关闭"))
+
+    def _napcat_running(self, bot_key: str) -> bool:
+        napcat = self.running_processes.get(bot_key.replace("bot", "napcat", 1))
+        return napcat is not None and napcat.poll() is None
+
+    def run_load_test(self):
+        """扮演 Napcat 向 Bot 回放消息事件，测量回复延迟、吞吐量和资源占用"""
+        bot_keys = [key for key in self.services if key.split("@")[0] == "bot"]
+        service_key = "bot"
+        if len(bot_keys) > 1:
+            names = ", ".join(bot_keys)
+            service_key = input(Colors.bold(f"请选择要压测的 Bot ({names}) [bot]: ")).strip() or "bot"
+            if service_key not in bot_keys:
+                print(Colors.red(f"❌ 未知的服务: {service_key}"))
+                return
+        service = self.services[service_key]
+
+        process = self.running_processes.get(service_key)
+        if process is None or process.poll() is not None:
+            print(Colors.red(f"❌ {service['name']} 未运行，请先启动"))
+            return
+        if self._napcat_running(service_key):
+            print(Colors.yellow("⚠️ Napcat 正在运行，压测客户端会与它争用适配器连接，请先停止 Napcat"))
+            return
+        self_id = loadtest.bot_qq_account(service["path"])
+        if self_id is None:
+            print(Colors.red("❌ 无法从 bot_config.toml 读取 Bot 的 QQ 号"))
+            return
 
-    def show_system_info(self):
-        print(Colors.bold("系统信息："))
         try:
-            result = subprocess.run(
-                [str(self.python_executable), "--version"],
-                capture_output=True,
-                text=True,
+            rate = float(input(Colors.bold("每秒发送事件数 [5]: ")).strip() or 5)
+            concurrency = int(input(Colors.bold("最多同时等待回复数 [10]: ")).strip() or 10)
+            count = int(input(Colors.bold("事件总数 [100]: ")).strip() or 100)
+        except ValueError:
+            print(Colors.red("❌ 请输入数字"))
+            return
+        events_file = input(Colors.bold("录制的事件文件 (留空使用合成事件): ")).strip().strip('"')
+
+        url, token = onebot_ws.adapter_endpoint(service["path"])
+        print(Colors.blue(f"正在压测 {service['name']} ({url})..."))
+        try:
+            result, baseline, path = loadtest.run_and_record(
+                self.base_path,
+                url,
+                self_id,
+                token=token,
+                events_file=Path(events_file) if events_file else None,
+                bot_path=service["path"],
+                rate=rate,
+                concurrency=concurrency,
+                count=count,
+                bot_pid=process.pid,
             )
-            print(f"  Python版本: {Colors.green(result.stdout.strip())}")
-        except Exception:
+        except (OSError, ConnectionError, ValueError) as e:
+            print(Colors.red(f"❌ 压测失败: {e}"))
+            return
+        for line in loadtest.format_result(result, baseline):
+            print(f"  {line}")
+        print(Colors.green(f"✅ 结果已保存: {path}"))
+
+    def show_system_info(self):
+        print(Colors.bold("系统信息："))
+        python_version = self.preflight.python_version() if self.python_executable.exists() else None
+        if python_version:
+            print(f"  Python版本: {Colors.green(python_version)}")
+        else:
             print(f"  Python版本: {Colors.red('获取失败')}")
         print(f"  工作目录: {Colors.cyan(str(self.base_path))}")
         python_status = (
@@ -231,6 +846,30 @@ class MaiBotManager:
             else Colors.red("未配置")
         )
         print(f"  内置Python环境: {python_status}")
+        print()
+        print(Colors.bold("环境预检："))
+        report = self.preflight.run(self.services, "all", self._running_service_keys())
+        colors = {"ok": Colors.green, "warn": Colors.yellow, "fail": Colors.red}
+        for result in report["results"]:
+            print(f"  {colors[result['status']](preflight.format_result(result))}")
+        print(Colors.cyan(f"  共 {len(report['results'])} 项，用时 {report['ms']:.0f} ms"))
+
+    def _running_service_keys(self) -> List[str]:
+        with self._services_lock:
+            return [key for key, process in self.running_processes.items() if process.poll() is None]
+
+    def preflight_gate(self, scope: str, action: str) -> bool:
+        """启动/更新前的快速预检，有失败项时输出原因并返回 False"""
+        report = self.preflight.run(self.services, scope, self._running_service_keys())
+        for result in report["results"]:
+            if result["status"] == "warn":
+                print(Colors.yellow(preflight.format_result(result)))
+        failed = preflight.failures(report)
+        for result in failed:
+            print(Colors.red(preflight.format_result(result)))
+        if failed:
+            print(Colors.red(f"❌ 环境预检未通过，已取消{action}"))
+        return not failed
 
     # ==================== 4. 核心服务管理 ====================
     def start_service_group(self):
@@ -268,6 +907,10 @@ class MaiBotManager:
                 return
 
     def start_service(self, service_key: str):
+        with self._services_lock:
+            return self._start_service(service_key)
+
+    def _start_service(self, service_key: str):
         if service_key not in self.services:
             print(Colors.red(f"未知服务: {service_key}"))
             return False
@@ -276,10 +919,6 @@ class MaiBotManager:
         service_path = service["path"]
         main_file = service["main_file"]
 
-        if not (service_path / main_file).exists():
-            print(Colors.red(f"主程序文件不存在: {service_path / main_file}"))
-            return False
-
         if (
             service_key in self.running_processes
             and self.running_processes[service_key].poll() is None
@@ -287,34 +926,90 @@ class MaiBotManager:
             print(Colors.yellow(f"{service['name']} 已经在运行中"))
             return True
 
+        # 可能已由另一个管理程序窗口或 fleet.py 调用的命令行模式启动，接管而不是再启动一份
+        if attached := self.service_registry.attach(service_key):
+            self.running_processes[service_key] = attached
+            print(Colors.yellow(f"{service['name']} 已在其他进程中启动 (PID: {attached.pid})，已接管"))
+            return True
+
+        if not self.preflight_gate(service_key, f"启动 {service['name']}"):
+            return False
+
+        if service_key.startswith("bot@"):
+            # 更新代码后共享文件可能被替换，启动前重新同步实例目录
+            self.instance_manager.sync_tree(service["instance"])
+
+        if service_key.split("@")[0] == "bot" and not self.check_config_files(
+            service_key
+        ):
+            print(Colors.red(f"❌ 配置文件校验未通过，已取消启动 {service['name']}"))
+            return False
+
+        try:
+            limits = resource_limits.normalize(service.get("limits"))
+        except (ValueError, TypeError) as e:
+            print(Colors.red(f"❌ {service['name']} 的资源限制配置无效: {e}"))
+            return False
+        for warning in resource_limits.check_permissions(limits):
+            print(Colors.yellow(f"⚠️ {warning}"))
+
+        bot_key = service_key.replace("napcat", "bot", 1)
+        if service_key.split("@")[0] == "napcat" and bot_key in self.latency_probes:
+            # 真正的 Napcat 上线前让出适配器连接
+            self.latency_probes.pop(bot_key).stop()
+            print(Colors.yellow(f"⚠️ 已关闭 {self.services[bot_key]['name']} 的链路延迟探针"))
+
         print(Colors.blue(f"正在启动 {service['name']}..."))
 
         try:
+            launch_options = resource_limits.popen_options(limits, service_key)
+            creationflags = launch_options.pop("creationflags", 0)
             service_type = service.get("type", "python")
             service_name = service.get("name", "VScode")
 
-            if service_type == "python":
+            if launcher.backend() == "direct":
+                # 直接执行服务本身，不经过 powershell / cmd 外壳，见 launcher.py
+                try:
+                    process = launcher.launch_direct(
+                        service_key,
+                        service,
+                        self.python_executable,
+                        self.base_path,
+                        self.state_path,
+                        launch_options,
+                        creationflags,
+                    )
+                except (launcher.LaunchError, OSError) as e:
+                    print(Colors.red(f"❌ 启动 {service['name']} 失败: {e}"))
+                    return False
+            elif service_type == "python":
                 powershell_cmd = [
                     "powershell.exe",
                     "-NoExit",
                     "-Command",
-                    f"chcp 65001; Set-Location '{service_path}'; & '{self.python_executable}' __main__.py",
+                    f"chcp 65001; Set-Location '{service_path}'; & '{self.python_executable}' '{main_file}'",
                 ]
                 process = subprocess.Popen(
                     powershell_cmd,
-                    creationflags=subprocess.CREATE_NEW_CONSOLE,
+                    creationflags=subprocess.CREATE_NEW_CONSOLE | creationflags,
                     cwd=service_path,
+                    **launch_options,
                 )
             elif service_type == "batch":
+                args = " ".join(service.get("args", []))
+                # 与 powershell 一样直接在新控制台中运行 cmd /k，记录的 PID 就是承载 Napcat 的窗口进程
+                # （经 cmd /c start 转一手时记录到的外层进程会立即退出，无法接管和停止）
                 cmd_command = [
-                    "cmd.exe",
-                    "/c",
-                    "start",
                     "cmd.exe",
                     "/k",
-                    f"chcp 65001 && {service_path / main_file}",
+                    f"chcp 65001 && {service_path / main_file} {args}".rstrip(),
                 ]
-                process = subprocess.Popen(cmd_command, cwd=service_path)
+                process = subprocess.Popen(
+                    cmd_command,
+                    cwd=service_path,
+                    creationflags=subprocess.CREATE_NEW_CONSOLE | creationflags,
+                    **launch_options,
+                )
             elif service_type == "exe":
                 command = [str(service_path / main_file)]
                 if service_name == "VSCode":
@@ -326,7 +1021,8 @@ class MaiBotManager:
                     process = subprocess.Popen(
                         command,
                         cwd=service_path,
-                        creationflags=subprocess.CREATE_NEW_CONSOLE,
+                        creationflags=subprocess.CREATE_NEW_CONSOLE | creationflags,
+                        **launch_options,
                     )
                 except FileNotFoundError:
                     print(
@@ -340,29 +1036,127 @@ class MaiBotManager:
                 print(Colors.red(f"不支持的服务类型: {service_type}"))
                 return False
 
+            for warning in resource_limits.after_launch(process, limits, service_key):
+                print(Colors.yellow(f"⚠️ {warning}"))
             self.running_processes[service_key] = process
-            print(
-                Colors.green(
-                    f"✅ {service['name']} 已在新窗口启动 (PID: {process.pid})"
+            self.service_registry.record(service_key, process)
+            if service_key in self._started_services:
+                self.metrics.inc("onekey_service_restarts_total", service=service_key)
+            self._started_services.add(service_key)
+            if launcher.backend() == "direct":
+                print(Colors.green(f"✅ {service['name']} 已启动 (PID: {process.pid})"))
+                print(Colors.cyan(f"   输出日志: {launcher.log_path(self.state_path, service_key)}"))
+            else:
+                print(
+                    Colors.green(
+                        f"✅ {service['name']} 已在新窗口启动 (PID: {process.pid})"
+                    )
                 )
-            )
+            if limits:
+                print(Colors.cyan(f"   资源限制: {resource_limits.describe(limits)}"))
             return True
 
         except Exception as e:
             print(Colors.red(f"启动 {service['name']} 失败: {e}"))
             return False
 
+    def stop_service(self, service_key: str) -> bool:
+        with self._services_lock:
+            process = self.running_processes.pop(service_key, None) or self.service_registry.attach(service_key)
+            self.service_registry.remove(service_key)
+        name = self.services[service_key]["name"]
+        if process is None or process.poll() is not None:
+            print(Colors.yellow(f"{name} 未在运行"))
+            return False
+        try:
+            service_state.terminate_tree(process)
+            print(Colors.green(f"✅ 已停止 {name}"))
+            return True
+        except Exception as e:
+            print(Colors.red(f"停止 {name} 失败: {e}"))
+            return False
+
     def stop_all_services(self):
         print(Colors.blue("正在停止所有服务..."))
-        for service_key, process in self.running_processes.items():
-            try:
-                process.terminate()
-                print(Colors.green(f"✅ 已停止 {self.services[service_key]['name']}"))
-            except Exception as e:
-                print(
-                    Colors.red(f"停止 {self.services[service_key]['name']} 失败: {e}")
+        with self._services_lock:
+            for service_key, process in self.running_processes.items():
+                try:
+                    service_state.terminate_tree(process)
+                    print(Colors.green(f"✅ 已停止 {self.services[service_key]['name']}"))
+                except Exception as e:
+                    print(
+                        Colors.red(f"停止 {self.services[service_key]['name']} 失败: {e}")
+                    )
+                # 只删除本进程管理的条目，其他窗口启动的服务记录保留
+                self.service_registry.remove(service_key)
+            self.running_processes.clear()
+
+    def manage_instances(self):
+        """多实例管理：多个QQ账号共用同一份代码和Python环境"""
+        while True:
+            self.clear_screen()
+            print(Colors.bold("多实例管理"))
+            print()
+            self.show_instance_status()
+            print()
+            print("  1. 创建新实例")
+            print("  2. 启动实例")
+            print("  3. 停止实例")
+            print("  0. 返回主菜单")
+
+            choice = input(Colors.bold("请选择操作 (0-3): ")).strip()
+            if choice == "0":
+                break
+            elif choice == "1":
+                self._create_instance()
+            elif choice in ("2", "3"):
+                selection = input(
+                    Colors.bold("请输入实例名称 (多个用逗号隔开, all 表示全部): ")
                 )
-        self.running_processes.clear()
+                try:
+                    names = self.instance_manager.resolve_names(selection)
+                except ValueError as e:
+                    print(Colors.red(f"❌ {e}"))
+                    names = []
+                for name in names:
+                    if choice == "2":
+                        for service_key in (f"bot@{name}", f"napcat@{name}"):
+                            if self.start_service(service_key):
+                                time.sleep(2)  # 延迟启动避免冲突
+                    else:
+                        for service_key in (f"napcat@{name}", f"bot@{name}"):
+                            self.stop_service(service_key)
+            else:
+                print(Colors.red("无效选择"))
+            input("按回车键继续...")
+
+    def show_instance_status(self):
+        if not self.instance_manager.instances:
+            print(Colors.yellow("  尚未创建任何实例"))
+            return
+        for name, instance in self.instance_manager.instances.items():
+            states = []
+            for kind in ("bot", "napcat"):
+                process = self.running_processes.get(f"{kind}@{name}")
+                running = process is not None and process.poll() is None
+                states.append(Colors.green("运行中") if running else Colors.yellow("未启动"))
+            print(
+                f"  {Colors.cyan(name)}: {instances.describe(instance)} | "
+                f"Bot {states[0]} | Napcat {states[1]}"
+            )
+
+    def _create_instance(self):
+        name = input(Colors.bold("请输入实例名称 (字母/数字/下划线): ")).strip()
+        qq_account = input(Colors.bold("请输入该实例的 Bot QQ 号: ")).strip()
+        print(Colors.blue(f"正在创建实例 {name}..."))
+        try:
+            instance = self.instance_manager.create(name, qq_account)
+        except Exception as e:
+            print(Colors.red(f"❌ 创建实例失败: {e}"))
+            return
+        self._refresh_instance_services()
+        print(Colors.green(f"✅ 实例 {name} 已创建: {instances.describe(instance)}"))
+        print(Colors.cyan(f"配置目录: {self.instance_manager.instance_path(name) / 'config'}"))
 
     # ==================== 5. BOT与文件管理 ====================
     def open_config_file(self):
@@ -424,6 +1218,196 @@ class MaiBotManager:
         else:
             print(Colors.red(f"❌ 插件文件夹不存在: {plugin_path}"))
 
+    def check_config_files(self, service_key: str = "bot", show_ok: bool = False) -> bool:
+        """启动前校验配置文件，存在错误时返回 False"""
+        start = time.perf_counter()
+        cache_name = service_key.replace("@", "_")
+        result = config_validator.validate_configs(
+            self.base_path,
+            self.state_path / f"config_validation_{cache_name}.json",
+            bot_path=self.services[service_key]["path"],
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        errors = [i for i in result["issues"] if i["level"] == "error"]
+        warnings = [i for i in result["issues"] if i["level"] == "warning"]
+        for issue in errors:
+            print(Colors.red(f"  ❌ {config_validator.format_issue(issue)}"))
+        for issue in warnings:
+            print(Colors.yellow(f"  ⚠️ {config_validator.format_issue(issue)}"))
+
+        if show_ok or errors:
+            source = "缓存" if result["cached"] else "校验"
+            summary = f"配置{source}完成: {len(errors)} 个错误, {len(warnings)} 个警告 ({elapsed_ms:.1f} ms)"
+            print(Colors.red(summary) if errors else Colors.green(f"✅ {summary}"))
+        return not errors
+
+    def validate_config_files(self):
+        """校验配置文件"""
+        for service_key in self.services:
+            if service_key.split("@")[0] == "bot":
+                print(Colors.bold(f"校验 {self.services[service_key]['name']} 配置文件："))
+                self.check_config_files(service_key, show_ok=True)
+
+    def _service_log_dirs(self, service_key: str) -> List[Path]:
+        path = self.services[service_key]["path"]
+        if service_key.split("@")[0] == "napcat":
+            # Napcat 的日志位于具体版本目录下
+            return [path / "logs", *path.glob("*/logs"), *path.glob("versions/*/resources/app/napcat/logs")]
+        return [path / "logs"]
+
+    def search_logs(self):
+        """按服务、级别、时间段和关键字搜索日志（基于索引，只读取命中的部分）"""
+        keys = [key for key in self.services if key.split("@")[0] in ("bot", "napcat")]
+        service_key = input(Colors.bold(f"请选择服务 ({', '.join(keys)}) [bot]: ")).strip() or "bot"
+        if service_key not in keys:
+            print(Colors.red(f"❌ 未知的服务: {service_key}"))
+            return
+        levels = input(Colors.bold("日志级别，多个用逗号隔开 [ERROR]: ")).strip() or "ERROR"
+        try:
+            start = log_index.parse_time(input(Colors.bold("开始时间 (如 02:00，留空不限): ")))
+            end = log_index.parse_time(input(Colors.bold("结束时间 (如 03:00，留空不限): ")))
+        except ValueError as e:
+            print(Colors.red(f"❌ {e}"))
+            return
+        keyword = input(Colors.bold("关键字 (留空不限): ")).strip() or None
+
+        files = log_index.log_files(self._service_log_dirs(service_key))
+        if not files:
+            print(Colors.yellow(f"⚠️ 没有找到 {self.services[service_key]['name']} 的日志文件"))
+            return
+        limit = 200
+        count = 0
+        started = time.perf_counter()
+        for path, _, text in log_index.search_logs(
+            files,
+            self.state_path / "log_index",
+            [level.strip() for level in levels.split(",") if level.strip()],
+            start,
+            end,
+            keyword,
+        ):
+            count += 1
+            if count <= limit:
+                print(f"{Colors.CYAN}{path.name}{Colors.END}: {text}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if count > limit:
+            print(Colors.yellow(f"仅显示前 {limit} 行，请缩小时间范围或添加关键字"))
+        print(Colors.green(f"✅ 在 {len(files)} 个日志文件中找到 {count} 行 ({elapsed_ms:.0f} ms)"))
+
+    def run_git_maintenance(self):
+        """整理 Git 仓库：重新打包、清理，并开启加速 git status 的选项"""
+        state = git_maintenance.load_state(self.state_path)
+        if state.get("last_run"):
+            last_run = time.strftime("%Y-%m-%d %H:%M", time.localtime(state["last_run"]))
+            print(Colors.cyan(f"上次维护: {last_run}（每 {git_maintenance.MAINTENANCE_INTERVAL_DAYS} 天自动执行一次）"))
+        choice = input(Colors.bold("是否立即执行维护？(Y/N): ")).strip().lower()
+        if choice != "y":
+            return
+        reports = git_maintenance.maintain_all(self.base_path, self.state_path, print)
+        for key, report in reports.items():
+            print(Colors.bold(f"{key}:"))
+            for line in git_maintenance.format_report(report):
+                print(f"  {line}")
+        if reports:
+            print(Colors.green("✅ Git 仓库维护完成"))
+
+    def analyze_disk_usage(self):
+        """统计一键包目录的磁盘占用，按 cleanup_policy.json 的策略清理缓存、旧日志和 Git 垃圾"""
+        print(Colors.blue("正在扫描一键包目录..."))
+        scan_result = disk_usage.scan(self.base_path, disk_usage.load_policy(self.base_path))
+        for line in disk_usage.format_report(scan_result):
+            print(line)
+        print()
+        print(Colors.bold("可清理："))
+        for line in disk_usage.format_plan(disk_usage.plan(scan_result)):
+            print(line)
+        selection = input(
+            Colors.bold(f"要执行的清理，多个用逗号隔开 ({', '.join(disk_usage.ACTIONS)} 或 all，留空跳过): ")
+        ).strip().lower()
+        if not selection:
+            return
+        actions = list(disk_usage.ACTIONS) if selection == "all" else [item.strip() for item in selection.split(",")]
+        unknown = [action for action in actions if action not in disk_usage.ACTIONS]
+        if unknown:
+            print(Colors.red(f"❌ 未知的清理动作: {', '.join(unknown)}"))
+            return
+        results = disk_usage.clean(scan_result, actions, self.base_path, self.state_path, print)
+        total = sum(entry["bytes"] for entry in results.values())
+        print(Colors.green(f"✅ 清理完成，共回收 {disk_usage.format_size(total)}"))
+
+    def manage_maintenance(self):
+        """定时维护：查看计划和执行记录，开启/关闭，或立即执行某个任务"""
+        while True:
+            self.clear_screen()
+            print(Colors.bold("定时维护"))
+            print(Colors.cyan(f"计划在 {self.base_path / 'maintenance_schedule.json'} 中修改（分 时 日 月 周）"))
+            print()
+            if self.maintenance:
+                lines = self.maintenance.describe()
+            else:
+                lines = []
+                history = maintenance_scheduler.load_history(self.state_path)
+                try:
+                    jobs = maintenance_scheduler.parse_jobs(maintenance_scheduler.load_schedule(self.base_path))
+                except (ValueError, KeyError, TypeError) as e:
+                    print(Colors.red(f"❌ 计划配置有误: {e}"))
+                    jobs = []
+                for job in jobs:
+                    lines.append(f"{job['name']} [{job['schedule']}] {maintenance_scheduler.ACTION_NAMES[job['action']]}")
+                    lines += [
+                        f"  {line}" for line in maintenance_scheduler.describe_job(job, history.get(job["name"]), datetime.now())
+                    ]
+            for line in lines:
+                print(f"  {line}")
+            print()
+            print("  1. 关闭定时维护" if self.maintenance else "  1. 开启定时维护")
+            print("  2. 立即执行任务")
+            print("  3. 查看最近的维护日志")
+            print("  0. 返回主菜单")
+
+            choice = input(Colors.bold("请选择操作 (0-3): ")).strip()
+            if choice == "0":
+                break
+            elif choice == "1":
+                schedule = maintenance_scheduler.load_schedule(self.base_path)
+                if self.maintenance:
+                    self._stop_maintenance_scheduler()
+                    maintenance_scheduler.save_schedule(self.base_path, {**schedule, "enabled": False})
+                    print(Colors.green("✅ 定时维护已关闭"))
+                else:
+                    maintenance_scheduler.save_schedule(self.base_path, {**schedule, "enabled": True})
+                    if self._start_maintenance_scheduler():
+                        print(Colors.green("✅ 定时维护已开启，下次打开管理程序时自动恢复"))
+                    else:
+                        print(Colors.red(self.notices.pop()))
+            elif choice == "2":
+                if not self.maintenance:
+                    print(Colors.yellow("请先开启定时维护"))
+                else:
+                    name = input(Colors.bold("任务名称: ")).strip()
+                    job = self.maintenance.find_job(name)
+                    if job is None:
+                        print(Colors.red(f"未知任务: {name}"))
+                    else:
+                        print(Colors.blue(f"正在执行 {name}..."))
+                        run = self.maintenance.run_job(job)
+                        if run is None:
+                            print(Colors.yellow("另一个维护任务正在执行，请稍后再试"))
+                        else:
+                            color = Colors.green if run["status"] == "done" else Colors.red
+                            print(color(f"{maintenance_scheduler.STATUS_NAMES[run['status']]} ({run['seconds']:.1f}s): {run['detail']}"))
+            elif choice == "3":
+                try:
+                    with open(self.state_path / "maintenance.log", "r", encoding="utf-8") as f:
+                        for line in f.readlines()[-20:]:
+                            print(f"  {line.rstrip()}")
+                except OSError:
+                    print(Colors.yellow("  暂无维护记录"))
+            else:
+                print(Colors.red("无效选择"))
+            input("按回车键继续...")
+
     def delete_database(self):
         """删除数据库文件"""
         db_path = self.base_path / "core" / "Bot" / "data" / "MaiBot.db"
@@ -456,8 +1440,9 @@ class MaiBotManager:
         while True:
             self.clear_screen()
             print(Colors.bold("依赖包管理"))
-            print("  1. 更新 / 重装 Bot本体依赖")
-            print("  3. 更新 / 重装 所有依赖")
+            print("  1. 安装 / 修复 Bot本体依赖 (只安装缺少或版本不符的包)")
+            print("  2. 检查依赖是否满足 (不运行 pip)")
+            print("  3. 安装 / 修复 所有依赖 (含插件依赖，先检查冲突)")
             print("  4. 从指定依赖文件安装")
             print("  5. 安装指定依赖包")
             print("  0. 返回主菜单")
@@ -468,6 +1453,10 @@ class MaiBotManager:
                 break
             elif choice == "1":
                 self._install_service_requirements("bot")
+            elif choice == "2":
+                for service_key, service in self.services.items():
+                    if (service["path"] / "requirements.txt").exists():
+                        self._check_service_requirements(service_key)
             elif choice == "3":
                 self._install_all_requirements()
             elif choice == "4":
@@ -485,16 +1474,100 @@ class MaiBotManager:
             print(Colors.yellow(f"{service['name']} 没有 requirements.txt 文件。"))
             return
 
+        install_args = ["-r", str(requirements_file)]
+        if requirements_check.available():
+            report = self._check_service_requirements(service_key)
+            if report is not None:
+                if not report["problems"]:
+                    return
+                problem_args = requirements_check.install_args(report)
+                if problem_args:
+                    # 文件中其它包的版本要求作为约束，避免 pip 为了这几个包升级共用的依赖
+                    constraints = requirements_check.write_constraints(
+                        requirements_file, self.state_path / "constraints" / f"{service_key.replace('@', '_')}.txt"
+                    )
+                    install_args = problem_args + ["-c", str(constraints)]
         print(Colors.blue(f"正在安装 {service['name']} 的依赖..."))
-        self._execute_pip_install(["-r", str(requirements_file)])
+        self._execute_pip_install(install_args)
 
+    def _check_service_requirements(self, service_key: str) -> Optional[dict]:
+        """在进程内对照已安装包的元数据检查 requirements.txt，无法检查时返回 None"""
+        service = self.services[service_key]
+        if not requirements_check.available():
+            print(Colors.yellow("⚠️ 未找到 packaging 库，无法在不运行 pip 的情况下检查依赖"))
+            return None
+        try:
+            report = requirements_check.check_file(
+                service["path"] / "requirements.txt",
+                self.python_executable,
+                self.preflight.python_version(),
+            )
+        except (OSError, ValueError) as e:
+            print(Colors.red(f"❌ 检查 {service['name']} 的依赖失败: {e}"))
+            return None
+        if not report["problems"]:
+            print(Colors.green(f"✅ {service['name']}: {report['checked']} 个包均满足要求 ({report['ms']:.0f} ms)"))
+            return report
+        print(Colors.yellow(f"⚠️ {service['name']}: {len(report['problems'])} 个问题 ({report['ms']:.0f} ms)"))
+        for problem in report["problems"]:
+            print(f"  {requirements_check.format_problem(problem)}")
+        return report
 
     def _install_all_requirements(self):
         for service_key in self.services:
+            # Bot 实例与 core/Bot 共用同一个 Python 环境，Bot 与插件的依赖统一处理
+            if service_key.split("@")[0] == "bot":
+                continue
             if (self.services[service_key]["path"] / "requirements.txt").exists():
                 self._install_service_requirements(service_key)
+        self._install_bot_and_plugin_requirements()
         print(Colors.green("所有依赖安装检查完成"))
 
+    def _install_bot_and_plugin_requirements(self):
+        """合并 Bot 与各插件的依赖，先报告冲突，再一次 pip 调用安装缺少的包"""
+        bot_path = self.services["bot"]["path"]
+        if not requirements_check.available():
+            self._install_service_requirements("bot")
+            return
+        exclude: List[str] = []
+        while True:
+            try:
+                plan = plugin_requirements.plan(
+                    bot_path, self.python_executable, self.preflight.python_version(), exclude
+                )
+            except (OSError, ValueError) as e:
+                print(Colors.red(f"❌ 解析 Bot 与插件的依赖失败: {e}"))
+                return
+            if not plan["conflicts"]:
+                break
+            print(Colors.red(f"❌ 发现 {len(plan['conflicts'])} 个依赖冲突，尚未安装任何包:"))
+            for line in plugin_requirements.format_conflicts(plan["conflicts"]):
+                print(f"  {line}")
+            plugins = sorted({plugin for conflict in plan["conflicts"] for plugin in conflict["plugins"]})
+            if not plugins:
+                print(Colors.yellow("冲突来自 Bot 本体的依赖文件，请先修正后再安装。"))
+                return
+            confirm = input(
+                Colors.bold(f"跳过这些插件的依赖 ({', '.join(plugins)}) 继续安装其余依赖? (y/N): ")
+            ).strip().lower()
+            if confirm != "y":
+                print(Colors.cyan("操作已取消。"))
+                return
+            exclude += plugins
+
+        for item in plan["invalid"]:
+            print(Colors.yellow(f"⚠️ 无法解析 {item['source']} 的依赖: {item['requirement']}"))
+        sources = ", ".join(plan["sources"]) or "无"
+        if not plan["report"]["problems"]:
+            print(Colors.green(f"✅ Bot 与插件的依赖均满足要求 (来源: {sources})"))
+            return
+        print(Colors.yellow(f"⚠️ {len(plan['report']['problems'])} 个包需要安装 (来源: {sources})"))
+        for problem in plan["report"]["problems"]:
+            print(f"  {requirements_check.format_problem(problem)}")
+        constraints = plugin_requirements.write_constraints(plan, self.state_path / "plugin_constraints.txt")
+        print(Colors.blue("正在安装 Bot 与插件的依赖..."))
+        self._execute_pip_install(requirements_check.install_args(plan["report"]) + ["-c", str(constraints)])
+
     def _install_from_file(self):
         """从指定文件安装依赖"""
         file_path_str = input(
@@ -549,7 +1622,9 @@ class MaiBotManager:
                 ]
             )
 
+            start = time.time()
             success, _ = self.run_command(cmd)
+            metrics.record_pip_install(self.metrics, mirror_url, time.time() - start, success)
             if success:
                 print(Colors.green("✅ 依赖安装成功!"))
                 return
@@ -657,31 +1732,67 @@ class MaiBotManager:
             print(Colors.red(f"❌ 启动SQLiteStudio失败: {e}"))
 
     def start_learning_tool(self):
-        """启动知识库学习工具"""
-        script_path = (
-            self.base_path / "core" / "Bot" / "scripts" / "lpmm_learning_tool.py"
-        )
-        if not script_path.exists():
-            print(Colors.red(f"❌ 学习工具脚本未找到: {script_path}"))
-            return
-
-        print(Colors.blue("正在启动知识库学习工具..."))
-        try:
-            powershell_cmd = [
-                "powershell.exe",
-                "-NoExit",
-                "-Command",
-                f"chcp 65001; Set-Location '{script_path.parent}'; & '{self.python_executable}' '{script_path.name}'",
-            ]
-            subprocess.Popen(
-                powershell_cmd,
-                creationflags=subprocess.CREATE_NEW_CONSOLE,
-                cwd=script_path.parent,
+        """知识库学习：交互式运行学习工具，或把文件加入后台学习队列（以低优先级运行，避免影响在线的 Bot）"""
+        queue = self.learning_queue
+        while True:
+            self.clear_screen()
+            print(Colors.bold("知识库学习"))
+            print()
+            counts = queue.counts()
+            state = Colors.green("处理中") if queue.running else Colors.yellow("未运行")
+            print(
+                f"  学习队列 ({state}): "
+                + "，".join(f"{learning_queue.STATUS_NAMES[status]} {count}" for status, count in counts.items())
             )
-            print(Colors.green("✅ 知识库学习工具已在新窗口启动"))
-        except Exception as e:
-            print(Colors.red(f"❌ 启动知识库学习工具失败: {e}"))
-            
+            print()
+            print("  1. 启动学习工具 (交互式)")
+            print("  2. 添加文件或目录到学习队列")
+            print("  3. 开始处理队列" if not queue.running else "  3. 暂停处理队列 (进行中的项下次重新执行)")
+            print("  4. 查看队列详情")
+            print("  5. 重试失败的项")
+            print("  6. 清除已完成的项")
+            print("  0. 返回主菜单")
+
+            choice = input(Colors.bold("请选择操作 (0-6): ")).strip()
+            if choice == "0":
+                break
+            elif choice == "1":
+                if not self.start_service("learning_tool"):
+                    print(Colors.red("❌ 启动知识库学习工具失败"))
+            elif choice == "2":
+                raw = input(Colors.bold("请输入文件或目录路径 (多个用 ; 隔开): ")).strip()
+                paths = [Path(part.strip().strip('"')) for part in raw.split(";") if part.strip()]
+                result = queue.add(paths)
+                print(Colors.green(f"✅ 已加入 {result['added']} 项"))
+                if result["skipped"]:
+                    print(Colors.cyan(f"   跳过 {result['skipped']} 项（已在队列中，或已学习过且内容未变化）"))
+            elif choice == "3":
+                if queue.running:
+                    queue.stop()
+                    print(Colors.green("✅ 已暂停，未完成的项会在下次开始时继续"))
+                elif counts["pending"] == 0:
+                    print(Colors.yellow("队列中没有等待处理的项"))
+                else:
+                    try:
+                        workers = queue.start()
+                    except ValueError as e:
+                        print(Colors.red(f"❌ {e}"))
+                    else:
+                        print(Colors.green(f"✅ 已在后台开始处理 ({workers} 个并发)，可返回主菜单继续其他操作"))
+                        print(Colors.cyan(f"   每项的输出: {queue.log_dir}"))
+            elif choice == "4":
+                if not queue.items:
+                    print(Colors.yellow("  队列为空"))
+                for item in queue.items:
+                    print(f"  {queue.describe(item)}")
+            elif choice == "5":
+                print(Colors.green(f"✅ {queue.retry_failed()} 项已重新排队"))
+            elif choice == "6":
+                print(Colors.green(f"✅ 已清除 {queue.clear_done()} 项"))
+            else:
+                print(Colors.red("无效选择"))
+            input("按回车键继续...")
+
     # ==================== 8. 内部辅助函数 ====================
     def is_bot_initialized(self):
         """判断MoFox_Bot主程序是否已初始化（即core/Bot目录和.git存在）"""
@@ -693,7 +1804,7 @@ class MaiBotManager:
         self, cmd: List[str], cwd: Optional[Path] = None, show_output: bool = True
     ) -> tuple:
         try:
-            result = subprocess.run(
+            result = self.tracer.run(
                 cmd,
                 cwd=cwd,
                 capture_output=not show_output,
@@ -707,6 +1818,44 @@ class MaiBotManager:
             return False, str(e)
 
 
+def run_command_line(argv: List[str]) -> int:
+    """非交互模式：启动/停止服务或查看状态后退出，供 fleet.py 等脚本调用"""
+    parser = argparse.ArgumentParser(description="MoFox_Bot 一键管理程序（命令行模式）")
+    parser.add_argument("--start", nargs="+", metavar="服务", help="启动服务，如 bot napcat")
+    parser.add_argument("--stop", nargs="+", metavar="服务", help="停止服务，all 表示全部")
+    parser.add_argument("--status", action="store_true", help="查看服务状态")
+    parser.add_argument("--json", action="store_true", help="状态以 JSON 格式输出")
+    args = parser.parse_args(argv)
+
+    manager = MaiBotManager(background_tasks=False)
+    ok = True
+    for service_key in args.stop or []:
+        if service_key == "all":
+            manager.stop_all_services()
+        elif service_key in manager.services:
+            manager.stop_service(service_key)
+        else:
+            print(Colors.red(f"未知服务: {service_key}"))
+            ok = False
+    for service_key in args.start or []:
+        ok = manager.start_service(service_key) and ok
+    if args.status:
+        status = {
+            service_key: {
+                "name": service["name"],
+                "running": service_key in manager.running_processes
+                and manager.running_processes[service_key].poll() is None,
+                "pid": getattr(manager.running_processes.get(service_key), "pid", None),
+            }
+            for service_key, service in manager.services.items()
+        }
+        if args.json:
+            print(json.dumps(status, ensure_ascii=False))
+        else:
+            manager.show_status()
+    return 0 if ok else 1
+
+
 if __name__ == "__main__":
     if os.name == "nt":
         os.system("color")
@@ -718,5 +1867,8 @@ if __name__ == "__main__":
         except Exception:
             pass
 
-    manager = MaiBotManager()
+    if any(arg in ("--start", "--stop", "--status") for arg in sys.argv[1:]):
+        sys.exit(run_command_line(sys.argv[1:]))
+    # 自更新后重新执行时会带上 --reloaded
+    manager = MaiBotManager(reloaded="--reloaded" in sys.argv[1:])
     manager.run()
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Bot 与插件依赖的统一解析
+收集 core/Bot/requirements.txt 和 core/Bot/plugins/<插件>/requirements.txt，按包合并为一组约束：
+- 同一个包的所有版本要求合并后若不可能同时满足，在安装之前按插件报告冲突
+  （例如插件 A 要求 pydantic<2，而 Bot 要求 pydantic>=2）
+- 合并后的约束与已安装的包对照（见 requirements_check.py），只安装缺少或版本不符的包，
+  并把完整约束写入 core/.onekey/plugin_constraints.txt 作为 pip 的 -c 约束文件，
+  一次 pip 调用完成安装，pip 解析间接依赖时也会遵守所有插件的要求
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import launcher
+import requirements_check
+
+try:
+    from requirements_check import InvalidRequirement, InvalidVersion, Requirement, Version, canonicalize_name
+except ImportError:
+    pass  # 没有 packaging 时 requirements_check.available() 为 False，调用方不会进入这里的函数
+
+BOT_SOURCE = "Bot"
+
+
+def discover(bot_path: Path) -> Dict[str, Path]:
+    """{来源: 依赖文件}，来源为 "Bot" 或插件目录名"""
+    sources = {}
+    if (bot_path / "requirements.txt").is_file():
+        sources[BOT_SOURCE] = bot_path / "requirements.txt"
+    plugins_dir = bot_path / "plugins"
+    if plugins_dir.is_dir():
+        for plugin_dir in sorted(plugins_dir.iterdir()):
+            if plugin_dir.is_dir() and (plugin_dir / "requirements.txt").is_file():
+                sources[plugin_dir.name] = plugin_dir / "requirements.txt"
+    return sources
+
+
+def _candidates(specifiers: list, installed: Optional[str]) -> set:
+    """
+    满足条件的版本（只看发布号）构成若干区间，区间端点都来自要求中出现的版本
+    或其某一位加一后的版本（==2.* / ~=2.2 的上界）。对每个端点取它本身，
+    以及补零到最长位数后再追加 .1 的版本（例如 2 -> 2.0.0.1，位于 2 与任何更大的端点之间），
+    这样每个非空区间都至少包含一个候选，候选都不满足时即可确定冲突。
+    """
+    releases = []
+    for specifier in specifiers:
+        for spec in specifier:
+            try:
+                release = Version(spec.version.rstrip(".*")).release
+            except InvalidVersion:
+                continue
+            releases.append(release)
+            releases += [release[:i] + (release[i] + 1,) for i in range(len(release))]
+    depth = max((len(release) for release in releases), default=0)
+    candidates = {Version("0")}
+    for release in releases:
+        candidates.add(Version(".".join(map(str, release))))
+        padded = release + (0,) * (depth - len(release)) + (1,)
+        candidates.add(Version(".".join(map(str, padded))))
+    if installed:
+        try:
+            candidates.add(Version(installed))
+        except InvalidVersion:
+            pass
+    return candidates
+
+
+def _satisfiable(specifiers: list, installed: Optional[str] = None) -> bool:
+    """不联网判断多个版本要求能否同时满足"""
+    if not any(len(specifier) for specifier in specifiers):
+        return True
+    return any(
+        all(specifier.contains(version, prereleases=True) for specifier in specifiers)
+        for version in _candidates(specifiers, installed)
+    )
+
+
+def merge(
+    files: Dict[str, Path],
+    dists: Dict[str, dict],
+    python_version: Optional[str] = None,
+) -> dict:
+    """
+    返回 {"packages": {包名: {...}}, "conflicts": [...], "invalid": [...]}。
+    conflict: {"package", "requirements": {来源: 要求}, "plugins": [有冲突的插件]}
+    """
+    environment = requirements_check.marker_environment(python_version)
+    packages: Dict[str, dict] = {}
+    invalid = []
+    for source, path in files.items():
+        for line in requirements_check.parse_requirements(path):
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement:
+                invalid.append({"source": source, "requirement": line})
+                continue
+            if requirement.marker and not requirement.marker.evaluate({**environment, "extra": ""}):
+                continue
+            name = canonicalize_name(requirement.name)
+            entry = packages.setdefault(
+                name, {"name": requirement.name, "extras": set(), "urls": set(), "requirements": {}}
+            )
+            entry["extras"] |= requirement.extras
+            if requirement.url:
+                entry["urls"].add(requirement.url)
+            entry["requirements"][source] = requirement
+
+    conflicts = []
+    for name, entry in packages.items():
+        requirements = entry["requirements"]
+        installed = dists.get(name, {}).get("version")
+        specifiers = [requirement.specifier for requirement in requirements.values()]
+        if len(entry["urls"]) <= 1 and _satisfiable(specifiers, installed):
+            continue
+        # 两两比较找出互相冲突的来源；三方及以上才冲突时，所有相关插件都算在内
+        involved = set()
+        sources = list(requirements)
+        for i, a in enumerate(sources):
+            for b in sources[i + 1:]:
+                pair = [requirements[a].specifier, requirements[b].specifier]
+                urls = {requirements[a].url, requirements[b].url} - {None}
+                if len(urls) > 1 or not _satisfiable(pair, installed):
+                    involved |= {a, b}
+        involved = involved or set(sources)
+        conflicts.append(
+            {
+                "package": entry["name"],
+                "requirements": {source: str(requirement.specifier) or requirement.url or "任意版本"
+                                 for source, requirement in requirements.items()},
+                "plugins": sorted(source for source in involved if source != BOT_SOURCE),
+            }
+        )
+    return {"packages": packages, "conflicts": conflicts, "invalid": invalid}
+
+
+def merged_lines(packages: Dict[str, dict], with_extras: bool = True) -> List[str]:
+    """每个包一行合并后的要求；with_extras=False 时用于约束文件 (-c)，不写 extras 和直接 URL"""
+    lines = []
+    for entry in packages.values():
+        extras = f"[{','.join(sorted(entry['extras']))}]" if with_extras and entry["extras"] else ""
+        if entry["urls"]:
+            # 约束文件 (-c) 中不允许直接 URL
+            if with_extras:
+                lines.append(f"{entry['name']}{extras} @ {next(iter(entry['urls']))}")
+            continue
+        specifier = None
+        for requirement in entry["requirements"].values():
+            specifier = requirement.specifier if specifier is None else specifier & requirement.specifier
+        lines.append(f"{entry['name']}{extras}{specifier}")
+    return lines
+
+
+def plan(
+    bot_path: Path,
+    python_executable: Path,
+    python_version: Optional[str] = None,
+    exclude: Iterable[str] = (),
+) -> dict:
+    """
+    合并 Bot 与插件的依赖并与已安装的包对照，不改动环境。
+    返回 {"sources", "conflicts", "invalid", "report", "lines", "constraints"}；
+    report 为 requirements_check.check 的结果（problems 即需要安装的包）。
+    """
+    exclude = set(exclude)
+    files = {source: path for source, path in discover(bot_path).items() if source not in exclude}
+    dists = requirements_check.installed_distributions(requirements_check.site_packages(python_executable))
+    merged = merge(files, dists, python_version)
+    lines = merged_lines(merged["packages"])
+    return {
+        "sources": files,
+        "conflicts": merged["conflicts"],
+        "invalid": merged["invalid"],
+        "report": requirements_check.check(lines, dists, python_version),
+        "lines": lines,
+        "constraints": merged_lines(merged["packages"], with_extras=False),
+    }
+
+
+def write_constraints(result: dict, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = "# 由 plugin_requirements.py 生成：Bot 与插件依赖合并后的约束\n"
+    sources = "".join(f"# {source}: {file}\n" for source, file in result["sources"].items())
+    path.write_text(header + sources + "\n".join(result["constraints"]) + "\n", encoding="utf-8")
+    return path
+
+
+def format_conflicts(conflicts: List[dict]) -> List[str]:
+    """按插件分组输出冲突"""
+    by_plugin: Dict[str, List[dict]] = {}
+    for conflict in conflicts:
+        for plugin in conflict["plugins"] or [BOT_SOURCE]:
+            by_plugin.setdefault(plugin, []).append(conflict)
+    lines = []
+    for plugin, items in by_plugin.items():
+        lines.append(f"插件 {plugin}:" if plugin != BOT_SOURCE else f"{BOT_SOURCE}:")
+        for conflict in items:
+            detail = "，".join(f"{source} 要求 {spec}" for source, spec in conflict["requirements"].items())
+            lines.append(f"  {conflict['package']}: {detail}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合并检查 Bot 与插件的依赖")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    args = parser.parse_args()
+
+    if not requirements_check.available():
+        print("未找到 packaging 库（pip 自带的副本也不可用），无法检查")
+        raise SystemExit(2)
+    base_path = Path(__file__).parent.absolute()
+    result = plan(base_path / "core" / "Bot", launcher.python_executable(base_path))
+    if args.json:
+        print(
+            json.dumps(
+                {**result, "sources": {k: str(v) for k, v in result["sources"].items()}},
+                indent=2,
+                ensure_ascii=False,
+            )
+        )
+    else:
+        print(f"依赖来源: {', '.join(result['sources']) or '无'}")
+        for line in format_conflicts(result["conflicts"]):
+            print(line)
+        for item in result["invalid"]:
+            print(f"无法解析: {item['source']}: {item['requirement']}")
+        for problem in result["report"]["problems"]:
+            print(requirements_check.format_problem(problem))
+    raise SystemExit(1 if result["conflicts"] or result["report"]["problems"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+后台预取上游提交
+管理程序运行期间，定期把 update_config.json 中各仓库的远程分支拉取到
+远程跟踪引用 (refs/remotes/origin/<分支>)，不改动工作区和当前分支。
+更新时若预取结果足够新，update.py 只需在本地快进合并，无需再等待下载。
+- 限速：每个仓库至少间隔 PREFETCH_INTERVAL 秒才会再次拉取，失败后按指数退避；
+  所有仓库依次拉取，后台线程和定时维护的预取共用一把锁，同一时间只有一个 fetch
+- 低优先级：git 进程以 idle 优先级运行（见 resource_limits.py）
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import git_tools
+
+PREFETCH_INTERVAL = 30 * 60
+MAX_BACKOFF = 6 * 60 * 60
+# 超过该时长的预取结果不再视为最新，更新时照常 pull
+FRESH_SECONDS = 2 * PREFETCH_INTERVAL
+FETCH_TIMEOUT = 600
+PREFETCH_LIMITS = {"priority": "idle"}
+# 后台预取线程和定时维护都会调用 prefetch_all，同一仓库的 fetch 会争用引用锁，
+# prefetch.json 也需整份读改写，进程内的预取与记录都在这把锁内依次进行
+_lock = threading.Lock()
+
+
+def load_state(state_path: Path) -> Dict[str, dict]:
+    try:
+        with open(state_path / "prefetch.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(state_path: Path, state: Dict[str, dict]):
+    state_path.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path / "prefetch.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, state_path / "prefetch.json")
+
+
+def is_fresh(state_path: Path, repo_key: str, repo_path: Path, branch: str) -> bool:
+    """预取是否足够新，且远程跟踪引用仍是当时拉取到的提交。"""
+    entry = load_state(state_path).get(repo_key, {})
+    if not entry.get("ok") or time.time() - entry.get("last_success", 0) > FRESH_SECONDS:
+        return False
+    return git_tools.read_ref(repo_path, f"refs/remotes/origin/{branch}") == entry.get("remote_sha")
+
+
+def _is_due(entry: dict, now: float) -> bool:
+    failures = entry.get("failures", 0)
+    wait = min(PREFETCH_INTERVAL * (2 ** failures), MAX_BACKOFF) if failures else PREFETCH_INTERVAL
+    return now - entry.get("last_attempt", 0) >= wait
+
+
+def prefetch_repo(git: str, repo: dict) -> dict:
+    """拉取单个仓库的远程分支到远程跟踪引用，返回本次结果。"""
+    branch = repo.get("branch", "master")
+    args = [
+        "fetch",
+        "--quiet",
+        "--no-tags",
+        repo["repo_url"],
+        f"+refs/heads/{branch}:refs/remotes/origin/{branch}",
+    ]
+    if git_tools.git_version(git) >= (2, 29):
+        # 不写 FETCH_HEAD，避免干扰用户手动执行的 git 操作
+        args.insert(1, "--no-write-fetch-head")
+    start = time.time()
+    ok, _, stderr = git_tools.run_git(git, repo["path"], args, timeout=FETCH_TIMEOUT, limits=PREFETCH_LIMITS)
+    return {
+        "ok": ok,
+        "seconds": time.time() - start,
+        "error": "" if ok else stderr.strip()[:500],
+        "remote_sha": git_tools.read_ref(repo["path"], f"refs/remotes/origin/{branch}") if ok else None,
+    }
+
+
+def _record(entry: dict, result: dict, now: float) -> dict:
+    entry.update(result, last_attempt=now)
+    if result["ok"]:
+        entry["last_success"] = now
+        entry["failures"] = 0
+    else:
+        entry["failures"] = entry.get("failures", 0) + 1
+    return entry
+
+
+def record_fetch(state_path: Path, repo_key: str, result: dict):
+    """记录一次由外部（如 fleet.py 从共享镜像）完成的预取，使更新时可以直接快进。"""
+    with _lock:
+        state = load_state(state_path)
+        state[repo_key] = _record(state.get(repo_key, {}), result, time.time())
+        _save_state(state_path, state)
+
+
+def prefetch_all(base_path: Path, state_path: Path, force: bool = False) -> Dict[str, dict]:
+    """依次预取到期的仓库，返回更新后的状态；另一次预取正在进行时等待其结束。"""
+    with _lock:
+        git = git_tools.find_git_executable(base_path)
+        state = load_state(state_path)
+        if not git:
+            return state
+        for key, repo in git_tools.load_repos(base_path).items():
+            if not (repo["path"] / ".git").exists():
+                continue
+            entry = state.get(key, {})
+            now = time.time()
+            if not force and not _is_due(entry, now):
+                continue
+            state[key] = _record(entry, prefetch_repo(git, repo), now)
+            _save_state(state_path, state)
+        return state
+
+
+class Prefetcher(threading.Thread):
+    """管理程序内的后台预取线程。"""
+
+    def __init__(self, base_path: Path, state_path: Path, check_interval: float = 60.0):
+        super().__init__(daemon=True)
+        self.base_path = base_path
+        self.state_path = state_path
+        self.check_interval = check_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                prefetch_all(self.base_path, self.state_path)
+            except Exception:
+                # 预取失败不影响管理程序，下次再试
+                pass
+            self._stop_event.wait(self.check_interval)
+
+
+def describe(entry: Optional[dict]) -> str:
+    if not entry or not entry.get("last_attempt"):
+        return "尚未预取"
+    if entry.get("ok"):
+        minutes = int((time.time() - entry["last_success"]) // 60)
+        return f"{minutes} 分钟前已预取 ({(entry.get('remote_sha') or '')[:8]})"
+    return f"预取失败 {entry.get('failures', 0)} 次: {entry.get('error', '')[:80]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后台预取上游提交")
+    parser.add_argument("--force", action="store_true", help="忽略间隔限制，立即预取所有仓库")
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent.absolute()
+    state = prefetch_all(base_path, base_path / "core" / ".onekey", force=args.force)
+    for key, entry in state.items():
+        print(f"{key}: {describe(entry)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+环境预检
+并发执行所有环境检查（内置 Python、Git、磁盘空间、端口占用、服务主程序文件、配置文件、仓库），
+一次给出完整报告，而不是在启动或更新的中途逐个暴露问题。
+需要启动子进程的检查（Python / Git 版本）按可执行文件的修改时间和大小缓存在
+core/.onekey/preflight.json，文件不变时直接复用，启动和更新前的预检只需几毫秒。
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import config_validator
+import git_tools
+import launcher
+import onebot_ws
+from instances import DEFAULT_SERVER_PORT
+
+# 检查逻辑变化时递增，使旧缓存失效
+SCHEMA_VERSION = 1
+DISK_WARN_BYTES = 2 * 1024**3
+DISK_FAIL_BYTES = 500 * 1024**2
+MAX_WORKERS = 8
+STATUS_ICONS = {"ok": "✅", "warn": "⚠️", "fail": "❌"}
+
+
+def _result(status: str, title: str, message: str) -> dict:
+    return {"status": status, "title": title, "message": message}
+
+
+def _stamp(paths: Iterable[Path]) -> list:
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append([str(path), st.st_mtime_ns, st.st_size])
+        except OSError:
+            stamp.append([str(path), None, None])
+    return stamp
+
+
+def _port_in_use(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("127.0.0.1", port))
+        except OSError:
+            return True
+    return False
+
+
+def _server_port(bot_path: Path) -> int:
+    """读取 Bot 目录 .env 中的 PORT"""
+    try:
+        with open(bot_path / ".env", "r", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.strip().partition("=")
+                if key.strip() == "PORT":
+                    return int(value.strip().strip("\"'"))
+    except (OSError, ValueError):
+        pass
+    return DEFAULT_SERVER_PORT
+
+
+class Preflight:
+    def __init__(self, base_path: Path, state_path: Path, python_executable: Path):
+        self.base_path = base_path
+        self.state_path = state_path
+        self.python_executable = python_executable
+        self.cache_file = state_path / "preflight.json"
+        self._cache = self._load_cache()
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load_cache(self) -> Dict[str, dict]:
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("version") == SCHEMA_VERSION:
+                return cache["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save_cache(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": SCHEMA_VERSION, "entries": self._cache}
+            self._dirty = False
+        try:
+            self.state_path.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_file.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass  # 缓存写入失败只影响下次速度
+
+    def _cached(self, key: str, paths: List[Path], compute: Callable[[], Optional[str]]) -> Optional[str]:
+        """paths 的修改时间和大小都未变化时直接返回上次的结果；失败结果不缓存"""
+        stamp = _stamp(paths)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry["stamp"] == stamp:
+                return entry["value"]
+        value = compute()
+        if value is not None:
+            with self._lock:
+                self._cache[key] = {"stamp": stamp, "value": value}
+                self._dirty = True
+        return value
+
+    # ==================== 各项检查 ====================
+    def python_version(self) -> Optional[str]:
+        def compute():
+            try:
+                result = subprocess.run(
+                    [str(self.python_executable), "--version"],
+                    capture_output=True,
+                    text=True,
+                    timeout=30,
+                )
+            except (OSError, subprocess.SubprocessError):
+                return None
+            if result.returncode != 0:
+                return None
+            return (result.stdout or result.stderr).strip() or None
+
+        return self._cached("python_version", [self.python_executable], compute)
+
+    def check_python(self) -> dict:
+        title = "内置 Python"
+        if not self.python_executable.exists():
+            return _result("fail", title, f"未找到 {self.python_executable}，请重新解压一键包")
+        version = self.python_version()
+        if not version:
+            return _result("fail", title, f"无法运行 {self.python_executable}")
+        return _result("ok", title, version)
+
+    def check_git(self) -> dict:
+        title = "Git"
+        git = git_tools.find_git_executable(self.base_path)
+        if not git:
+            return _result("fail", title, "未找到 PortableGit/bin/git.exe，PATH 中也没有 git")
+
+        def compute():
+            version = git_tools.git_version(git)
+            return ".".join(str(part) for part in version) if version != (0,) else None
+
+        version = self._cached(f"git_version:{git}", [Path(git)], compute)
+        if not version:
+            return _result("fail", title, f"无法运行 {git}")
+        return _result("ok", title, f"{version} ({git})")
+
+    def check_disk(self) -> dict:
+        title = "磁盘空间"
+        try:
+            free = shutil.disk_usage(self.base_path).free
+        except OSError as e:
+            return _result("warn", title, f"无法获取: {e}")
+        message = f"剩余 {free / 1024**3:.1f} GB"
+        if free < DISK_FAIL_BYTES:
+            return _result("fail", title, f"{message}，空间不足，请先清理磁盘")
+        if free < DISK_WARN_BYTES:
+            return _result("warn", title, f"{message}，建议清理磁盘")
+        return _result("ok", title, message)
+
+    def check_repos(self) -> dict:
+        title = "更新仓库"
+        try:
+            repos = git_tools.load_repos(self.base_path)
+        except (OSError, ValueError) as e:
+            return _result("fail", title, f"读取 update_config.json 失败: {e}")
+        missing = [
+            repo["name"]
+            for repo in repos.values()
+            if not repo.get("bundle_source") and not (repo["path"] / ".git").exists()
+        ]
+        if missing:
+            return _result("warn", title, f"不是 Git 仓库，更新时会跳过: {'、'.join(missing)}")
+        return _result("ok", title, f"{len(repos)} 个仓库")
+
+    def check_main_file(self, service: dict) -> dict:
+        title = f"{service['name']} 主程序"
+        if service.get("type") != "python" and launcher.backend() == "direct":
+            try:
+                return _result("ok", title, str(launcher.find_program(service["path"], service["main_file"])))
+            except launcher.LaunchError as e:
+                return _result("fail", title, str(e))
+        main_path = service["path"] / service["main_file"]
+        if not main_path.exists():
+            return _result("fail", title, f"主程序文件不存在: {main_path}")
+        return _result("ok", title, str(main_path))
+
+    def check_ports(self, service: dict, running: bool) -> dict:
+        title = f"{service['name']} 端口"
+        adapter_url, _ = onebot_ws.adapter_endpoint(service["path"])
+        ports = {"适配器": urlparse(adapter_url).port, "服务": _server_port(service["path"])}
+        if running:
+            return _result("ok", title, "服务运行中")
+        busy = [f"{name} {port}" for name, port in ports.items() if _port_in_use(port)]
+        if busy:
+            return _result("fail", title, f"端口已被占用: {', '.join(busy)}，请关闭占用端口的程序或修改配置")
+        return _result("ok", title, " / ".join(f"{name} {port}" for name, port in ports.items()))
+
+    def check_config(self, service_key: str, service: dict) -> dict:
+        title = f"{service['name']} 配置"
+        cache_name = service_key.replace("@", "_")
+        issues = config_validator.validate_configs(
+            self.base_path,
+            self.state_path / f"config_validation_{cache_name}.json",
+            bot_path=service["path"],
+        )["issues"]
+        errors = [i for i in issues if i["level"] == "error"]
+        warnings = [i for i in issues if i["level"] == "warning"]
+        if errors:
+            return _result("fail", title, f"{len(errors)} 个错误: {config_validator.format_issue(errors[0])}")
+        if warnings:
+            return _result("warn", title, f"{len(warnings)} 个警告: {config_validator.format_issue(warnings[0])}")
+        return _result("ok", title, "校验通过")
+
+    # ==================== 检查组合 ====================
+    def checks_for(
+        self, services: Dict[str, dict], scope: str, running: Iterable[str] = ()
+    ) -> List[Callable[[], dict]]:
+        """
+        scope: "all" 完整报告；"update" 更新前；其余为服务名，启动该服务前。
+        启动前不重复校验配置文件（start_service 会单独校验并输出详细问题）。
+        """
+        running = set(running)
+        checks: List[Callable[[], dict]] = []
+        if scope in ("all", "update"):
+            checks += [self.check_python, self.check_git, self.check_disk, self.check_repos]
+            selected = services if scope == "all" else {}
+        else:
+            service = services[scope]
+            if service.get("type") == "python":
+                checks.append(self.check_python)
+            checks.append(self.check_disk)
+            selected = {scope: service}
+        for service_key, service in selected.items():
+            checks.append(lambda service=service: self.check_main_file(service))
+            if service_key.split("@")[0] == "bot":
+                checks.append(
+                    lambda key=service_key, service=service: self.check_ports(service, key in running)
+                )
+                if scope == "all":
+                    checks.append(lambda key=service_key, service=service: self.check_config(key, service))
+        return checks
+
+    def run(self, services: Dict[str, dict], scope: str = "all", running: Iterable[str] = ()) -> dict:
+        """并发执行检查，返回 {"results": [...], "ms": 总耗时}，结果顺序与检查顺序一致"""
+        start = time.perf_counter()
+
+        def timed(check):
+            check_start = time.perf_counter()
+            try:
+                result = check()
+            except Exception as e:
+                result = _result("warn", "预检", f"检查出错: {e}")
+            result["ms"] = (time.perf_counter() - check_start) * 1000
+            return result
+
+        checks = self.checks_for(services, scope, running)
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(checks))) as pool:
+            results = list(pool.map(timed, checks))
+        self._save_cache()
+        return {"results": results, "ms": (time.perf_counter() - start) * 1000}
+
+
+def failures(report: dict) -> List[dict]:
+    return [result for result in report["results"] if result["status"] == "fail"]
+
+
+def format_result(result: dict) -> str:
+    return f"{STATUS_ICONS[result['status']]} {result['title']}: {result['message']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查一键包运行环境")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent.absolute()
+    services = {
+        "bot": {
+            "name": "MoFox_Bot 主程序",
+            "path": base_path / "core" / "Bot",
+            "main_file": "__main__.py",
+            "type": "python",
+        },
+        "napcat": {
+            "name": "Napcat 服务",
+            "path": base_path / "core" / "Napcat",
+            "main_file": "napcat.bat",
+            "type": "batch",
+        },
+    }
+    checker = Preflight(base_path, base_path / "core" / ".onekey", launcher.python_executable(base_path))
+    report = checker.run(services)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    for result in report["results"]:
+        print(format_result(result))
+    print(f"共 {len(report['results'])} 项，用时 {report['ms']:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
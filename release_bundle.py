@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+"""
+发布包更新通道（替代 git pull）
+发布端把代码树切成固定大小的块，按内容 SHA-256 存放在 chunks/<前两位>/<哈希>（zlib 压缩），
+并生成记录每个文件块列表的 manifest.json；不同版本共用同一个块目录，未变化的内容只存一份。
+客户端读取清单，先在本地代码树中查找已有的块（相同内容的文件、其它文件中的相同块），
+只下载缺少的块，逐块和逐文件校验哈希后按日志（journal）整体替换：要么全部生效，要么全部回滚。
+来源可以是本地目录，也可以是 HTTP 地址（例如 `python -m http.server` 提供的目录）。
+本地文件的块索引按 (大小, 修改时间) 缓存在 core/.onekey/bundle/<名称>.json，
+未变化的文件不会重复计算哈希。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath, PureWindowsPath
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from git_maintenance import format_size
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_NAME = "manifest.json"
+# 根目录下属于本地用户数据的条目，不打包，更新时也不会改动
+LOCAL_ENTRIES = {"config", "data", "logs", ".env"}
+# 任意层级都跳过的目录
+SKIP_NAMES = {".git", "__pycache__"}
+_LOCAL_ENTRIES_FOLDED = {name.casefold() for name in LOCAL_ENTRIES}
+_SKIP_NAMES_FOLDED = {name.casefold() for name in SKIP_NAMES}
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_RETRIES = 3
+HTTP_TIMEOUT = 30
+CHUNK_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BundleError(Exception):
+    pass
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _chunk_relpath(chunk_hash: str) -> str:
+    return f"chunks/{chunk_hash[:2]}/{chunk_hash}"
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def check_relpath(rel: str) -> str:
+    """清单中的文件名只能是代码树内的相对路径，不能指向目录之外、用户数据或 .git"""
+    posix = PurePosixPath(rel)
+    windows = PureWindowsPath(rel)
+    # Windows 上文件名不区分大小写，Config/ 与 .GIT/ 同样指向用户数据和 git 目录
+    parts = [part.casefold() for part in (*posix.parts, *windows.parts)]
+    if (
+        not rel
+        or posix.is_absolute()
+        or windows.drive
+        or windows.root
+        or ".." in parts
+        or posix.parts[0].casefold() in _LOCAL_ENTRIES_FOLDED
+        or windows.parts[0].casefold() in _LOCAL_ENTRIES_FOLDED
+        or any(part in _SKIP_NAMES_FOLDED for part in parts)
+    ):
+        raise BundleError(f"发布清单中包含不安全的路径: {rel!r}")
+    return rel
+
+
+def check_manifest(manifest: dict) -> dict:
+    """校验来源提供的清单：文件路径和块哈希都会拼接成本地路径，必须先检查"""
+    if manifest.get("format") != FORMAT_VERSION:
+        raise BundleError(f"不支持的发布清单格式: {manifest.get('format')}")
+    for rel, entry in manifest.get("files", {}).items():
+        check_relpath(rel)
+        for chunk_hash in entry.get("chunks", []):
+            if not CHUNK_HASH_RE.match(str(chunk_hash)):
+                raise BundleError(f"发布清单中 {rel} 的块哈希无效: {chunk_hash!r}")
+    return manifest
+
+
+def walk_tree(root: Path) -> Iterator[str]:
+    """遍历需要打包的文件，返回以 / 分隔的相对路径"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = Path(dirpath).relative_to(root)
+        top_level = rel_dir == Path(".")
+        dirnames[:] = sorted(
+            name for name in dirnames
+            if name.casefold() not in _SKIP_NAMES_FOLDED
+            and not (top_level and name.casefold() in _LOCAL_ENTRIES_FOLDED)
+        )
+        for name in sorted(filenames):
+            if top_level and name.casefold() in _LOCAL_ENTRIES_FOLDED:
+                continue
+            yield (rel_dir / name).as_posix()
+
+
+def chunk_file(path: Path) -> dict:
+    """计算文件的整体哈希和各块哈希"""
+    file_hasher = hashlib.sha256()
+    chunks = []
+    size = 0
+    with open(path, "rb") as f:
+        while block := f.read(CHUNK_SIZE):
+            file_hasher.update(block)
+            chunks.append(_sha256(block))
+            size += len(block)
+    return {"size": size, "sha256": file_hasher.hexdigest(), "chunks": chunks}
+
+
+# ==================== 发布端 ====================
+def build(tree: Path, out_dir: Path, version: str) -> dict:
+    """把代码树打包到 out_dir，已存在的块不会重复写入"""
+    files = {}
+    chunk_sizes: Dict[str, int] = {}
+    new_chunks = new_bytes = 0
+    for rel in walk_tree(tree):
+        path = tree / rel
+        entry = chunk_file(path)
+        files[rel] = entry
+        with open(path, "rb") as f:
+            for chunk_hash in entry["chunks"]:
+                block = f.read(CHUNK_SIZE)
+                chunk_path = out_dir / _chunk_relpath(chunk_hash)
+                if chunk_hash not in chunk_sizes and not chunk_path.exists():
+                    _write_atomic(chunk_path, zlib.compress(block, 6))
+                    new_chunks += 1
+                    new_bytes += chunk_path.stat().st_size
+                if chunk_hash not in chunk_sizes:
+                    chunk_sizes[chunk_hash] = chunk_path.stat().st_size
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "created_at": time.time(),
+        "chunk_size": CHUNK_SIZE,
+        "files": files,
+        # 块哈希 -> 压缩后大小，用于在下载前估算传输量
+        "chunks": chunk_sizes,
+    }
+    data = json.dumps(manifest, indent=1, ensure_ascii=False).encode("utf-8")
+    _write_atomic(out_dir / "manifests" / f"{version}.json", data)
+    _write_atomic(out_dir / MANIFEST_NAME, data)
+    return {"files": len(files), "chunks": len(chunk_sizes), "new_chunks": new_chunks, "new_bytes": new_bytes}
+
+
+# ==================== 来源 ====================
+class BundleSource:
+    """本地目录或 HTTP 地址"""
+
+    def __init__(self, location: str):
+        self.location = location.rstrip("/")
+        self.is_http = self.location.startswith(("http://", "https://"))
+
+    def read(self, rel: str) -> bytes:
+        if not self.is_http:
+            try:
+                return (Path(self.location) / rel).read_bytes()
+            except OSError as e:
+                raise BundleError(f"读取 {rel} 失败: {e}") from e
+        last_error = None
+        for _ in range(DOWNLOAD_RETRIES):
+            try:
+                with urllib.request.urlopen(f"{self.location}/{rel}", timeout=HTTP_TIMEOUT) as response:
+                    return response.read()
+            except OSError as e:
+                last_error = e
+        raise BundleError(f"下载 {rel} 失败: {last_error}")
+
+    def manifest(self) -> dict:
+        try:
+            manifest = json.loads(self.read(MANIFEST_NAME).decode("utf-8"))
+        except ValueError as e:
+            raise BundleError(f"发布清单格式错误: {e}") from e
+        if not isinstance(manifest, dict):
+            raise BundleError("发布清单格式错误")
+        return check_manifest(manifest)
+
+    def chunk(self, chunk_hash: str) -> bytes:
+        try:
+            block = zlib.decompress(self.read(_chunk_relpath(chunk_hash)))
+        except zlib.error as e:
+            raise BundleError(f"块 {chunk_hash[:12]} 解压失败: {e}") from e
+        if _sha256(block) != chunk_hash:
+            raise BundleError(f"块 {chunk_hash[:12]} 哈希校验失败")
+        return block
+
+
+# ==================== 客户端 ====================
+class BundleUpdater:
+    def __init__(self, target: Path, state_file: Path):
+        self.target = target
+        self.state_file = state_file
+        # 下载的块、组装好的文件、替换前的备份和日志都放在这里，与目标位于同一磁盘，替换只需重命名
+        self.staging = state_file.with_suffix(".staging")
+        self.index = self._load_index()
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        _write_atomic(self.state_file, json.dumps(self.index, ensure_ascii=False).encode("utf-8"))
+
+    @property
+    def applied_version(self) -> Optional[str]:
+        return self.index.get("version")
+
+    def scan_local(self) -> Dict[str, dict]:
+        """本地代码树的块索引，大小和修改时间未变的文件直接复用上次的结果"""
+        cached = self.index.get("files", {})
+        files = {}
+        for rel in walk_tree(self.target):
+            try:
+                st = os.stat(self.target / rel)
+            except OSError:
+                continue
+            entry = cached.get(rel)
+            if not entry or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+                try:
+                    entry = {**chunk_file(self.target / rel), "mtime_ns": st.st_mtime_ns}
+                except OSError:
+                    continue
+            files[rel] = entry
+        return files
+
+    def plan(self, manifest: dict) -> dict:
+        """对比清单与本地文件，得出需要写入/删除的文件和需要下载的块"""
+        check_manifest(manifest)
+        local = self.scan_local()
+        chunk_locations: Dict[str, Tuple[str, int]] = {}
+        for rel, entry in local.items():
+            for index, chunk_hash in enumerate(entry["chunks"]):
+                chunk_locations.setdefault(chunk_hash, (rel, index * CHUNK_SIZE))
+        changed = [
+            rel for rel, entry in manifest["files"].items()
+            if local.get(rel, {}).get("sha256") != entry["sha256"]
+        ]
+        # 只删除上次由发布包写入、新版本中已不存在的文件，不会动用户自己添加的文件
+        deleted = [
+            check_relpath(rel)
+            for rel in self.index.get("managed", [])
+            if rel not in manifest["files"] and rel in local
+        ]
+        missing = sorted({
+            chunk_hash
+            for rel in changed
+            for chunk_hash in manifest["files"][rel]["chunks"]
+            if chunk_hash not in chunk_locations
+        })
+        return {
+            "local": local,
+            "locations": chunk_locations,
+            "changed": changed,
+            "deleted": deleted,
+            "missing": missing,
+            "download_bytes": sum(manifest["chunks"].get(h, 0) for h in missing),
+        }
+
+    def _download(self, source: BundleSource, missing: List[str], progress=None) -> int:
+        chunk_dir = self.staging / "chunks"
+        chunk_dir.mkdir(parents=True, exist_ok=True)
+        todo = []
+        for chunk_hash in missing:
+            cached_path = chunk_dir / chunk_hash
+            # 上次中断时已下载并校验过的块可以直接复用
+            if cached_path.exists() and _sha256(cached_path.read_bytes()) == chunk_hash:
+                continue
+            todo.append(chunk_hash)
+
+        def fetch(chunk_hash):
+            _write_atomic(chunk_dir / chunk_hash, source.chunk(chunk_hash))
+            return chunk_hash
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+            for done, _ in enumerate(pool.map(fetch, todo), 1):
+                if progress:
+                    progress(done, len(todo))
+        return len(todo)
+
+    def _read_chunk(self, chunk_hash: str, locations: Dict[str, Tuple[str, int]]) -> bytes:
+        downloaded = self.staging / "chunks" / chunk_hash
+        if downloaded.exists():
+            return downloaded.read_bytes()
+        rel, offset = locations[chunk_hash]
+        with open(self.target / rel, "rb") as f:
+            f.seek(offset)
+            block = f.read(CHUNK_SIZE)
+        if _sha256(block) != chunk_hash:
+            raise BundleError(f"本地文件 {rel} 在更新过程中被修改")
+        return block
+
+    def _assemble(self, manifest: dict, plan: dict):
+        """在暂存目录中组装所有需要写入的文件，并校验整体哈希"""
+        for rel in plan["changed"]:
+            entry = manifest["files"][rel]
+            hasher = hashlib.sha256()
+            staged = self.staging / "files" / rel
+            staged.parent.mkdir(parents=True, exist_ok=True)
+            with open(staged, "wb") as f:
+                for chunk_hash in entry["chunks"]:
+                    block = self._read_chunk(chunk_hash, plan["locations"])
+                    hasher.update(block)
+                    f.write(block)
+            if hasher.hexdigest() != entry["sha256"]:
+                raise BundleError(f"文件 {rel} 哈希校验失败")
+
+    def _journal_path(self) -> Path:
+        return self.staging / "journal.json"
+
+    def _apply(self, plan: dict):
+        """按日志替换文件，中途失败时回滚"""
+        journal = {"replace": plan["changed"], "delete": plan["deleted"]}
+        _write_atomic(self._journal_path(), json.dumps(journal, ensure_ascii=False).encode("utf-8"))
+        try:
+            for rel in plan["changed"] + plan["deleted"]:
+                target = self.target / rel
+                if target.exists():
+                    backup = self.staging / "backup" / rel
+                    backup.parent.mkdir(parents=True, exist_ok=True)
+                    os.replace(target, backup)
+            for rel in plan["changed"]:
+                target = self.target / rel
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(self.staging / "files" / rel, target)
+        except OSError:
+            self.recover()
+            raise
+        # 全部替换完成，日志失效后不会再被回滚
+        self._journal_path().unlink()
+
+    def recover(self) -> bool:
+        """存在未完成的替换日志时回滚到更新前的状态（包括上次更新中途退出的情况）"""
+        journal_path = self._journal_path()
+        if not journal_path.exists():
+            return False
+        with open(journal_path, "r", encoding="utf-8") as f:
+            journal = json.load(f)
+        for rel in journal["replace"]:
+            target = self.target / rel
+            if not (self.staging / "files" / rel).exists() and target.exists():
+                # 已经替换的文件，先移除新内容（新增的文件没有备份，移除即可）
+                target.unlink()
+        for rel in journal["replace"] + journal["delete"]:
+            backup = self.staging / "backup" / rel
+            if backup.exists():
+                os.replace(backup, self.target / rel)
+        journal_path.unlink()
+        return True
+
+    def _remove_empty_dirs(self, deleted: List[str]):
+        for rel in deleted:
+            parent = (self.target / rel).parent
+            while parent != self.target:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+
+    def update(self, source: BundleSource, dry_run: bool = False, progress=None) -> dict:
+        """更新到来源中的最新版本，返回本次更新的统计信息"""
+        self.recover()
+        manifest = source.manifest()
+        plan = self.plan(manifest)
+        result = {
+            "version": manifest["version"],
+            "previous": self.applied_version,
+            "changed": len(plan["changed"]),
+            "deleted": len(plan["deleted"]),
+            "chunks": len(plan["missing"]),
+            "download_bytes": plan["download_bytes"],
+            "total_bytes": sum(entry["size"] for entry in manifest["files"].values()),
+        }
+        if dry_run:
+            return result
+        if plan["changed"] or plan["deleted"]:
+            self._download(source, plan["missing"], progress)
+            self._assemble(manifest, plan)
+            self._apply(plan)
+            self._remove_empty_dirs(plan["deleted"])
+        # 更新索引：新写入的文件按清单记录，避免下次重新计算哈希
+        files = {rel: entry for rel, entry in plan["local"].items() if rel not in plan["deleted"]}
+        for rel in plan["changed"]:
+            st = os.stat(self.target / rel)
+            files[rel] = {**manifest["files"][rel], "mtime_ns": st.st_mtime_ns}
+        self.index = {"version": manifest["version"], "managed": sorted(manifest["files"]), "files": files}
+        self._save_index()
+        shutil.rmtree(self.staging, ignore_errors=True)
+        return result
+
+
+def describe(result: dict) -> str:
+    return (
+        f"版本 {result['previous'] or '未知'} -> {result['version']}: "
+        f"更新 {result['changed']} 个文件，删除 {result['deleted']} 个，"
+        f"下载 {result['chunks']} 块共 {format_size(result['download_bytes'])}"
+        f"（完整代码 {format_size(result['total_bytes'])}）"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="发布包构建与更新")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="把代码树打包为发布包")
+    build_parser.add_argument("tree", type=Path, help="代码目录，例如 core/Bot")
+    build_parser.add_argument("out", type=Path, help="发布包目录（多个版本可共用）")
+    build_parser.add_argument("--version", required=True, help="版本号或提交号")
+    apply_parser = subparsers.add_parser("apply", help="从发布包更新代码目录")
+    apply_parser.add_argument("source", help="发布包目录或 HTTP 地址")
+    apply_parser.add_argument("--target", type=Path, help="代码目录，默认 core/Bot")
+    apply_parser.add_argument("--name", default="bot", help="本地索引名称，默认 bot")
+    apply_parser.add_argument("--dry-run", action="store_true", help="只显示需要下载的内容")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stats = build(args.tree, args.out, args.version)
+        print(
+            f"已打包 {stats['files']} 个文件、{stats['chunks']} 个块，"
+            f"新增 {stats['new_chunks']} 个块 ({format_size(stats['new_bytes'])})"
+        )
+        return
+
+    base_path = Path(__file__).parent.absolute()
+    target = (args.target or base_path / "core" / "Bot").absolute()
+    updater = BundleUpdater(target, base_path / "core" / ".onekey" / "bundle" / f"{args.name}.json")
+    try:
+        result = updater.update(BundleSource(args.source), dry_run=args.dry_run)
+    except BundleError as e:
+        raise SystemExit(f"❌ {e}")
+    print(describe(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+仓库同步状态
+计算 update_config.json 中各仓库相对远程分支的领先/落后提交数，以及尚未拉取的提交标题。
+结果按 (本地 HEAD, 远程引用) 的 SHA 缓存在 core/.onekey/repo_status.json：
+引用直接从 .git 目录读取，只有任一引用变化时才会重新执行 git，菜单重绘不受影响。
+远程引用由后台预取 (prefetch.py) 保持更新。
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import git_tools
+
+MISSING_COMMITS_LIMIT = 5
+
+
+def _load_cache(state_path: Path) -> Dict[str, dict]:
+    try:
+        with open(state_path / "repo_status.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(state_path: Path, cache: Dict[str, dict]):
+    state_path.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path / "repo_status.json.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, state_path / "repo_status.json")
+
+
+def _compute(git: str, repo_path: Path, remote_ref: str) -> Optional[dict]:
+    ok, stdout, _ = git_tools.run_git(
+        git, repo_path, ["rev-list", "--left-right", "--count", f"HEAD...{remote_ref}"]
+    )
+    if not ok:
+        return None
+    ahead, behind = (int(value) for value in stdout.split())
+    missing: List[dict] = []
+    if behind:
+        ok, stdout, _ = git_tools.run_git(
+            git,
+            repo_path,
+            ["log", f"-n{MISSING_COMMITS_LIMIT}", "--format=%h%x09%s", f"HEAD..{remote_ref}"],
+        )
+        for line in stdout.splitlines() if ok else []:
+            sha, _, subject = line.partition("\t")
+            missing.append({"sha": sha, "subject": subject})
+    return {"ahead": ahead, "behind": behind, "missing": missing}
+
+
+def collect(base_path: Path, state_path: Path) -> Dict[str, dict]:
+    """返回各仓库的同步状态，引用未变化时直接使用缓存。"""
+    cache = _load_cache(state_path)
+    result = {}
+    git = None
+    changed = False
+    for key, repo in git_tools.load_repos(base_path).items():
+        repo_path = repo["path"]
+        branch = repo.get("branch", "master")
+        remote_ref = f"refs/remotes/origin/{branch}"
+        head = git_tools.read_head_commit(repo_path)
+        remote = git_tools.read_ref(repo_path, remote_ref)
+        entry = {"name": repo["name"], "branch": branch, "head": head, "remote": remote}
+        if head is None or remote is None:
+            result[key] = {**entry, "ahead": None, "behind": None, "missing": []}
+            continue
+        cached = cache.get(key)
+        if cached and cached.get("head") == head and cached.get("remote") == remote:
+            result[key] = cached
+            continue
+        git = git or git_tools.find_git_executable(base_path)
+        counts = _compute(git, repo_path, remote_ref) if git else None
+        if counts is None:
+            result[key] = {**entry, "ahead": None, "behind": None, "missing": []}
+            continue
+        result[key] = cache[key] = {**entry, **counts, "computed_at": time.time()}
+        changed = True
+    if changed:
+        _save_cache(state_path, cache)
+    return result
+
+
+def describe(status: dict) -> str:
+    if status.get("behind") is None:
+        return "无法获取同步状态"
+    if not status["behind"] and not status["ahead"]:
+        return "已是最新"
+    parts = []
+    if status["behind"]:
+        parts.append(f"落后 {status['behind']} 个提交")
+    if status["ahead"]:
+        parts.append(f"领先 {status['ahead']} 个提交")
+    return "，".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看各仓库相对远程分支的同步状态")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    args = parser.parse_args()
+
+    base_path = Path(__file__).parent.absolute()
+    statuses = collect(base_path, base_path / "core" / ".onekey")
+    if args.json:
+        print(json.dumps(statuses, indent=2, ensure_ascii=False))
+        return
+    for status in statuses.values():
+        print(f"{status['name']} ({status['branch']}): {describe(status)}")
+        for commit in status["missing"]:
+            print(f"  {commit['sha']} {commit['subject']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+依赖检查
+在管理程序进程内解析 requirements.txt（按 PEP 440 / PEP 508 的版本与环境标记规则），
+直接读取内置 Python 的 site-packages 中各包的 METADATA，判断依赖是否满足，不启动 pip：
+- missing：未安装
+- outdated：已安装的版本低于要求
+- conflict：已安装的版本不满足要求（如版本过高或被排除），或已安装包自身的依赖不满足
+依赖全部满足时跳过 pip，否则只把有问题的那几项交给 pip 安装。
+版本规则使用 packaging 库，未安装时使用 pip 自带的副本；两者都没有时无法检查，调用方退回完整安装。
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    from packaging.markers import default_environment
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.utils import canonicalize_name
+    from packaging.version import InvalidVersion, Version
+except ImportError:
+    try:
+        from pip._vendor.packaging.markers import default_environment
+        from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+        from pip._vendor.packaging.utils import canonicalize_name
+        from pip._vendor.packaging.version import InvalidVersion, Version
+    except ImportError:
+        Requirement = None
+
+import launcher
+
+STATUS_NAMES = {"missing": "未安装", "outdated": "版本过低", "conflict": "版本冲突", "invalid": "无法解析"}
+LOWER_BOUND_OPERATORS = (">=", ">", "==", "~=", "===")
+
+
+def available() -> bool:
+    return Requirement is not None
+
+
+# ==================== 已安装的包 ====================
+def site_packages(python_executable: Path) -> List[Path]:
+    """内置 Python 的包目录：与当前解释器相同时用 sys.path，否则按 python3xx._pth / 目录结构推断"""
+    try:
+        if Path(python_executable).resolve() == Path(sys.executable).resolve():
+            return [Path(p) for p in sys.path if p and Path(p).is_dir()]
+    except OSError:
+        pass
+    home = Path(python_executable).parent
+    paths = []
+    # 嵌入式 Python 的搜索路径写在 python3xx._pth 中
+    for pth in home.glob("python3*._pth"):
+        for line in pth.read_text(encoding="utf-8", errors="ignore").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#") and not line.startswith("import "):
+                paths.append(home / line)
+    paths += [home / "Lib" / "site-packages", *home.parent.glob("lib/python3*/site-packages")]
+    return [path for path in dict.fromkeys(paths) if path.is_dir()]
+
+
+def _read_metadata(path: Path) -> Tuple[Optional[str], Optional[str], List[str]]:
+    """读取 METADATA / PKG-INFO 的头部：名称、版本、Requires-Dist"""
+    name = version = None
+    requires = []
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                if not line.strip():
+                    break  # 头部结束，后面是描述正文
+                key, _, value = line.partition(":")
+                if key == "Name":
+                    name = value.strip()
+                elif key == "Version":
+                    version = value.strip()
+                elif key == "Requires-Dist":
+                    requires.append(value.strip())
+    except OSError:
+        pass
+    return name, version, requires
+
+
+def installed_distributions(paths: List[Path]) -> Dict[str, dict]:
+    """{规范化包名: {"name", "version", "requires"}}，同名包以搜索路径中靠前的为准"""
+    dists: Dict[str, dict] = {}
+    for directory in paths:
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.endswith(".dist-info"):
+                metadata = Path(entry.path) / "METADATA"
+            elif entry.name.endswith(".egg-info"):
+                metadata = Path(entry.path) / "PKG-INFO" if entry.is_dir() else Path(entry.path)
+            else:
+                continue
+            name, version, requires = _read_metadata(metadata)
+            if name and version:
+                dists.setdefault(canonicalize_name(name), {"name": name, "version": version, "requires": requires})
+    return dists
+
+
+# ==================== requirements.txt ====================
+def parse_requirements(path: Path, seen: Optional[Set[Path]] = None) -> List[str]:
+    """返回需求行，支持续行、注释、-r/-c 引用；-i/--hash 等 pip 选项忽略"""
+    seen = seen or set()
+    path = path.resolve()
+    if path in seen:
+        return []
+    seen.add(path)
+    text = path.read_text(encoding="utf-8", errors="ignore").replace("\\\n", " ")
+    lines = []
+    for raw in text.splitlines():
+        line = re.sub(r"(^|\s)#.*$", "", raw).strip()
+        if not line:
+            continue
+        if line.startswith(("-r ", "--requirement ")):
+            lines += parse_requirements(path.parent / line.split(None, 1)[1], seen)
+            continue
+        if line.startswith("-"):
+            continue  # -i / --extra-index-url / -e / -c 等选项
+        lines.append(re.sub(r"\s+--hash[= ]\S+", "", line))
+    return lines
+
+
+# ==================== 检查 ====================
+def marker_environment(python_version: Optional[str] = None) -> dict:
+    """计算环境标记用的变量，python_version 为内置 Python 的版本（如 "Python 3.11.9"）"""
+    environment = default_environment()
+    match = re.search(r"(\d+)\.(\d+)\.(\d+)", python_version or "")
+    if match:
+        environment["python_full_version"] = match.group(0)
+        environment["python_version"] = f"{match.group(1)}.{match.group(2)}"
+    return environment
+
+
+def _classify(requirement, installed: Optional[dict]) -> Optional[str]:
+    if installed is None:
+        return "missing"
+    if not requirement.specifier:
+        return None
+    try:
+        version = Version(installed["version"])
+    except InvalidVersion:
+        return "conflict"
+    if requirement.specifier.contains(version, prereleases=True):
+        return None
+    for spec in requirement.specifier:
+        try:
+            if spec.operator in LOWER_BOUND_OPERATORS and version < Version(spec.version.rstrip(".*")):
+                return "outdated"
+        except InvalidVersion:
+            continue
+    return "conflict"
+
+
+def check(
+    requirement_lines: List[str],
+    dists: Dict[str, dict],
+    python_version: Optional[str] = None,
+) -> dict:
+    """
+    返回 {"problems": [...], "checked": 检查过的包数, "ms": 耗时}。
+    每个问题: {"requirement", "name", "status", "installed", "required_by"}；
+    python_version 为内置 Python 的版本（如 "Python 3.11.9"），用于计算环境标记。
+    """
+    start = time.perf_counter()
+    environment = marker_environment(python_version)
+    problems = []
+    visited: Set[Tuple[str, str]] = set()
+    # (需求, 由哪个已安装的包引入；直接需求为 None)
+    queue = deque((line, None) for line in requirement_lines)
+    while queue:
+        line, required_by = queue.popleft()
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement:
+            problems.append({"requirement": line, "name": line, "status": "invalid", "installed": None, "required_by": required_by})
+            continue
+        name = canonicalize_name(requirement.name)
+        key = (name, str(requirement.specifier) + ",".join(sorted(requirement.extras)))
+        if key in visited:
+            continue
+        visited.add(key)
+        if requirement.marker and not requirement.marker.evaluate({**environment, "extra": ""}):
+            continue
+        installed = dists.get(name)
+        status = _classify(requirement, installed)
+        if status:
+            # 环境标记已确认满足，交给 pip 时去掉
+            requirement.marker = None
+            problems.append(
+                {
+                    "requirement": str(requirement),
+                    "name": requirement.name,
+                    "status": status,
+                    "installed": installed["version"] if installed else None,
+                    "required_by": required_by,
+                }
+            )
+            continue
+        # 依赖满足时继续检查它自身声明的依赖（相当于 pip check，但只看需要的这部分）
+        for dependency in installed["requires"]:
+            try:
+                dep = Requirement(dependency)
+            except InvalidRequirement:
+                continue
+            if dep.marker:
+                extras = requirement.extras or {""}
+                if not any(dep.marker.evaluate({**environment, "extra": extra}) for extra in extras):
+                    continue
+                dep.marker = None
+            queue.append((str(dep), installed["name"]))
+    return {"problems": problems, "checked": len(visited), "ms": (time.perf_counter() - start) * 1000}
+
+
+def check_file(requirements_file: Path, python_executable: Path, python_version: Optional[str] = None) -> dict:
+    """读取已安装的包并检查依赖文件，ms 为包含读取元数据在内的总耗时"""
+    start = time.perf_counter()
+    dists = installed_distributions(site_packages(python_executable))
+    report = check(parse_requirements(requirements_file), dists, python_version)
+    report["ms"] = (time.perf_counter() - start) * 1000
+    return report
+
+
+def install_args(report: dict) -> List[str]:
+    """需要交给 pip 的需求：有问题的直接需求，以及已安装包缺失或冲突的依赖"""
+    return list(dict.fromkeys(problem["requirement"] for problem in report["problems"] if problem["status"] != "invalid"))
+
+
+def write_constraints(requirements_file: Path, path: Path) -> Path:
+    """
+    把依赖文件转为 pip 的约束文件 (-c)：只安装有问题的几个包时，pip 仍会遵守文件中的其它版本要求，
+    不会把共用的间接依赖升级到与之冲突的版本。约束文件不允许 extras 和直接 URL，这些项去掉 extras 或跳过。
+    """
+    lines = []
+    for line in parse_requirements(requirements_file):
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement:
+            continue
+        if requirement.url:
+            continue
+        requirement.extras = set()
+        lines.append(str(requirement))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"# 由 requirements_check.py 根据 {requirements_file} 生成\n" + "\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def format_problem(problem: dict) -> str:
+    text = f"{STATUS_NAMES[problem['status']]}: {problem['requirement']}"
+    if problem["installed"]:
+        text += f" (已安装 {problem['installed']})"
+    if problem["required_by"]:
+        text += f"，{problem['required_by']} 需要"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查已安装的包是否满足 requirements.txt")
+    parser.add_argument("requirements", nargs="?", help="依赖文件，默认 core/Bot/requirements.txt")
+    parser.add_argument("--python", help="要检查的 Python，默认内置 Python")
+    parser.add_argument("--json", action="store_true", help="以 JSON 格式输出")
+    args = parser.parse_args()
+
+    if not available():
+        print("未找到 packaging 库（pip 自带的副本也不可用），无法检查")
+        sys.exit(2)
+    base_path = Path(__file__).parent.absolute()
+    requirements_file = Path(args.requirements) if args.requirements else base_path / "core" / "Bot" / "requirements.txt"
+    python = Path(args.python) if args.python else launcher.python_executable(base_path)
+    report = check_file(requirements_file, python)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        for problem in report["problems"]:
+            print(format_problem(problem))
+        print(f"检查了 {report['checked']} 个包，{len(report['problems'])} 个问题，用时 {report['ms']:.0f} ms")
+    sys.exit(1 if report["problems"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+服务资源限制
+服务表中的每个服务可以声明:
+    "limits": {
+        "cpu_cores": [0, 1] 或 "0-3,6",   # CPU 亲和性
+        "priority": "below_normal",       # idle/below_normal/normal/above_normal/high
+        "memory_mb": 2048,                # 内存硬上限
+    }
+启动时使用系统机制生效:
+- Linux: 进程创建后由管理程序设置 nice 值、sched_setaffinity，并把进程加入 cgroup v2 的子组
+  (memory.max)；cgroup 不可用（未委派 memory 控制器或无权限）时内存上限不生效并给出提示。
+  不使用 preexec_fn：管理程序有多个后台线程，fork 与 exec 之间执行 Python 代码可能死锁
+- Windows: 优先级类 + 作业对象(Job Object)限制亲和性、优先级和内存，子进程同样受限
+"""
+
+import os
+import re
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+PRIORITY_NICE = {
+    "idle": 19,
+    "below_normal": 10,
+    "normal": 0,
+    "above_normal": -5,
+    "high": -10,
+}
+
+# Windows 优先级类常量（与 subprocess.*_PRIORITY_CLASS 一致）
+PRIORITY_CLASS = {
+    "idle": 0x00000040,
+    "below_normal": 0x00004000,
+    "normal": 0x00000020,
+    "above_normal": 0x00008000,
+    "high": 0x00000080,
+}
+
+CREATE_SUSPENDED = 0x00000004
+
+def parse_cores(spec) -> List[int]:
+    """解析核心列表，支持 [0, 1] 或 "0-3,6" 两种写法。"""
+    if spec is None or spec == "":
+        return []
+    if isinstance(spec, int):
+        return [spec]
+    if isinstance(spec, (list, tuple)):
+        return sorted({int(core) for core in spec})
+    cores = set()
+    for part in re.split(r"[\s,]+", str(spec).strip()):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cores.update(range(int(start), int(end) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+def normalize(limits: Optional[dict]) -> dict:
+    """校验并规范化限制配置，非法值直接抛出 ValueError。"""
+    limits = limits or {}
+    result = {}
+    cores = parse_cores(limits.get("cpu_cores"))
+    if cores:
+        available = os.cpu_count() or 1
+        invalid = [core for core in cores if core < 0 or core >= available]
+        if invalid:
+            raise ValueError(f"CPU 核心编号超出范围 (0-{available - 1}): {invalid[:8]}")
+        result["cpu_cores"] = cores
+
+    priority = limits.get("priority")
+    if priority is not None:
+        if isinstance(priority, int):
+            # 直接给出 nice 值时，换算成最接近的优先级档位
+            priority = min(PRIORITY_NICE, key=lambda name: abs(PRIORITY_NICE[name] - priority))
+        if priority not in PRIORITY_NICE:
+            raise ValueError(f"未知的优先级: {priority}")
+        result["priority"] = priority
+
+    memory_mb = limits.get("memory_mb")
+    if memory_mb:
+        if int(memory_mb) <= 0:
+            raise ValueError(f"内存上限必须为正数: {memory_mb}")
+        result["memory_mb"] = int(memory_mb)
+    return result
+
+
+def describe(limits: dict) -> str:
+    parts = []
+    if "cpu_cores" in limits:
+        parts.append(f"CPU {','.join(map(str, limits['cpu_cores']))}")
+    if "priority" in limits:
+        parts.append(f"优先级 {limits['priority']}")
+    if "memory_mb" in limits:
+        parts.append(f"内存上限 {limits['memory_mb']} MB")
+    return " | ".join(parts)
+
+
+# ==================== Linux ====================
+def _prepare_cgroup(service_key: str, memory_bytes: int) -> tuple:
+    """
+    在当前进程所在的 cgroup v2 下创建子组并设置 memory.max，返回 (子组, 失败原因)。
+    需要先在父组的 cgroup.subtree_control 中启用 memory；父组自身有进程时（非根组）
+    cgroup v2 不允许启用，此时内存上限不可用。
+    """
+    root = Path("/sys/fs/cgroup")
+    if not (root / "cgroup.controllers").exists():
+        return None, "系统未使用 cgroup v2"
+    try:
+        current = Path("/proc/self/cgroup").read_text().strip().split("::", 1)[-1]
+    except OSError as e:
+        return None, str(e)
+    parent = root / current.lstrip("/")
+    safe_key = re.sub(r"[^A-Za-z0-9_\-]", "_", service_key)
+    group = parent / f"onekey-{safe_key}"
+    created = False
+    try:
+        if "memory" not in (parent / "cgroup.subtree_control").read_text().split():
+            (parent / "cgroup.subtree_control").write_text("+memory")
+        if not group.exists():
+            group.mkdir()
+            created = True
+        (group / "memory.max").write_text(str(memory_bytes))
+        return group, None
+    except OSError as e:
+        if created:
+            try:
+                group.rmdir()
+            except OSError:
+                pass
+        return None, f"{e.strerror or e}（需要为管理程序委派 cgroup v2 的 memory 控制器）"
+
+
+def _apply_posix(pid: int, limits: dict, service_key: str) -> List[str]:
+    """在父进程中对已启动的子进程应用限制，返回无法生效的项"""
+    warnings = []
+    nice = PRIORITY_NICE.get(limits.get("priority", ""))
+    if nice is not None:
+        try:
+            os.setpriority(os.PRIO_PROCESS, pid, nice)
+        except OSError as e:
+            warnings.append(f"设置优先级失败: {e}")
+    if limits.get("cpu_cores") and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(pid, limits["cpu_cores"])
+        except OSError as e:
+            warnings.append(f"设置 CPU 亲和性失败: {e}")
+    if limits.get("memory_mb"):
+        group, error = _prepare_cgroup(service_key, limits["memory_mb"] * 1024 * 1024)
+        if group is not None:
+            try:
+                (group / "cgroup.procs").write_text(str(pid))
+            except OSError as e:
+                error = str(e)
+        if error:
+            warnings.append(f"内存上限不可用: {error}")
+    return warnings
+
+
+# ==================== Windows ====================
+def _windows_job(process: subprocess.Popen, limits: dict):
+    import ctypes
+    from ctypes import wintypes
+
+    class IO_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            (name, ctypes.c_ulonglong)
+            for name in (
+                "ReadOperationCount",
+                "WriteOperationCount",
+                "OtherOperationCount",
+                "ReadTransferCount",
+                "WriteTransferCount",
+                "OtherTransferCount",
+            )
+        ]
+
+    class JOBOBJECT_BASIC_LIMIT_INFORMATION(ctypes.Structure):
+        _fields_ = [
+            ("PerProcessUserTimeLimit", wintypes.LARGE_INTEGER),
+            ("PerJobUserTimeLimit", wintypes.LARGE_INTEGER),
+            ("LimitFlags", wintypes.DWORD),
+            ("MinimumWorkingSetSize", ctypes.c_size_t),
+            ("MaximumWorkingSetSize", ctypes.c_size_t),
+            ("ActiveProcessLimit", wintypes.DWORD),
+            ("Affinity", ctypes.c_size_t),
+            ("PriorityClass", wintypes.DWORD),
+            ("SchedulingClass", wintypes.DWORD),
+        ]
+
+    class JOBOBJECT_EXTENDED_LIMIT_INFORMATION(ctypes.Structure):
+        _fields_ = [
+            ("BasicLimitInformation", JOBOBJECT_BASIC_LIMIT_INFORMATION),
+            ("IoInfo", IO_COUNTERS),
+            ("ProcessMemoryLimit", ctypes.c_size_t),
+            ("JobMemoryLimit", ctypes.c_size_t),
+            ("PeakProcessMemoryUsed", ctypes.c_size_t),
+            ("PeakJobMemoryUsed", ctypes.c_size_t),
+        ]
+
+    JOB_OBJECT_LIMIT_AFFINITY = 0x00000010
+    JOB_OBJECT_LIMIT_PRIORITY_CLASS = 0x00000020
+    JOB_OBJECT_LIMIT_JOB_MEMORY = 0x00000200
+    JOB_OBJECT_EXTENDED_LIMIT_INFORMATION_CLASS = 9
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+
+    info = JOBOBJECT_EXTENDED_LIMIT_INFORMATION()
+    basic = info.BasicLimitInformation
+    if "cpu_cores" in limits:
+        basic.LimitFlags |= JOB_OBJECT_LIMIT_AFFINITY
+        basic.Affinity = sum(1 << core for core in limits["cpu_cores"])
+    if "priority" in limits:
+        basic.LimitFlags |= JOB_OBJECT_LIMIT_PRIORITY_CLASS
+        basic.PriorityClass = PRIORITY_CLASS[limits["priority"]]
+    if "memory_mb" in limits:
+        # 作业内所有进程（包括 PowerShell/cmd 外壳和真正的服务进程）合计的内存上限
+        basic.LimitFlags |= JOB_OBJECT_LIMIT_JOB_MEMORY
+        info.JobMemoryLimit = limits["memory_mb"] * 1024 * 1024
+
+    job = kernel32.CreateJobObjectW(None, None)
+    if not job:
+        raise ctypes.WinError(ctypes.get_last_error())
+    try:
+        if not kernel32.SetInformationJobObject(
+            job,
+            JOB_OBJECT_EXTENDED_LIMIT_INFORMATION_CLASS,
+            ctypes.byref(info),
+            ctypes.sizeof(info),
+        ):
+            raise ctypes.WinError(ctypes.get_last_error())
+        if not kernel32.AssignProcessToJobObject(job, wintypes.HANDLE(int(process._handle))):
+            raise ctypes.WinError(ctypes.get_last_error())
+    finally:
+        # 作业对象在其中还有进程时一直存在；未设置 KILL_ON_JOB_CLOSE，关闭句柄不影响进程和限制
+        kernel32.CloseHandle(wintypes.HANDLE(job))
+
+
+def _resume(process: subprocess.Popen):
+    import ctypes
+
+    ctypes.WinDLL("ntdll").NtResumeProcess(ctypes.c_void_p(int(process._handle)))
+
+
+# ==================== 对外接口 ====================
+def popen_options(limits: dict, service_key: str) -> dict:
+    """返回需要合并到 subprocess.Popen 参数中的选项。"""
+    if not limits:
+        return {}
+    if os.name == "nt":
+        flags = PRIORITY_CLASS[limits["priority"]] if "priority" in limits else 0
+        if "cpu_cores" in limits or "memory_mb" in limits or "priority" in limits:
+            # 先挂起启动，加入作业对象后再恢复，避免外壳进程在此之前派生出不受限的子进程
+            flags |= CREATE_SUSPENDED
+        return {"creationflags": flags}
+
+    # Linux 上的限制在 after_launch 中由父进程应用
+    return {}
+
+
+def check_permissions(limits: dict) -> List[str]:
+    """启动前检查当前权限能否应用这些限制，返回需要忽略的项及原因。"""
+    warnings = []
+    if os.name != "nt" and "priority" in limits:
+        if PRIORITY_NICE[limits["priority"]] < os.getpriority(os.PRIO_PROCESS, 0) and os.geteuid() != 0:
+            warnings.append(f"提高优先级 ({limits['priority']}) 需要 root 权限，已忽略")
+            limits.pop("priority")
+    return warnings
+
+
+def after_launch(process: subprocess.Popen, limits: dict, service_key: str) -> List[str]:
+    """进程创建后应用限制（Windows 作业对象 / Linux 优先级、亲和性、cgroup），返回警告信息。"""
+    if not limits:
+        return []
+    if os.name != "nt":
+        return _apply_posix(process.pid, limits, service_key)
+    warnings = []
+    try:
+        _windows_job(process, limits)
+    except OSError as e:
+        warnings.append(f"应用资源限制失败: {e}")
+    finally:
+        _resume(process)
+    return warnings
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+服务进程注册表
+每次启动服务都会把 服务名、PID、进程创建时间、命令行哈希 写入 core/.onekey/services.json，
+停止时删除。管理程序启动（包括崩溃后重开、自更新后就地重新执行）时逐条校验：
+PID 存在且创建时间一致（无法获取创建时间时改为比较命令行哈希），校验通过的进程会被重新接管，
+状态查看和停止服务在管理程序重启后依然有效，也不会重复启动同一个服务。
+创建时间和命令行哈希用于排除 PID 被系统复用的情况；直接启动的脚本（如 napcat.sh）可能 exec
+成其他程序，命令行会变化，因此能比较创建时间时不再要求命令行一致。
+"""
+
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 比较进程创建时间时允许的误差（秒）
+CREATE_TIME_TOLERANCE = 1.0
+# 注册表锁文件超过该时长仍未释放，视为持有者已崩溃（每次持有只做一次读写，通常只需几毫秒）
+LOCK_STALE_SECONDS = 10
+
+PROCESS_TERMINATE = 0x0001
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+
+
+def _windows_open(pid: int, access: int):
+    import ctypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.restype = ctypes.c_void_p
+    return kernel32, kernel32.OpenProcess(access, False, pid)
+
+
+def process_create_time(pid: int) -> Optional[float]:
+    """返回进程创建时间（Unix 时间戳），进程不存在时返回 None。"""
+    try:
+        import psutil
+
+        return psutil.Process(pid).create_time()
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32, handle = _windows_open(pid, PROCESS_QUERY_LIMITED_INFORMATION)
+        if not handle:
+            return None
+        try:
+            times = [wintypes.FILETIME() for _ in range(4)]
+            if not kernel32.GetProcessTimes(ctypes.c_void_p(handle), *(ctypes.byref(t) for t in times)):
+                return None
+            ticks = (times[0].dwHighDateTime << 32) | times[0].dwLowDateTime
+            # FILETIME 以 1601-01-01 为起点，单位 100 纳秒
+            return ticks / 1e7 - 11644473600
+        finally:
+            kernel32.CloseHandle(ctypes.c_void_p(handle))
+
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat", "r") as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+def process_cmdline(pid: int) -> Optional[List[str]]:
+    """读取进程的命令行；没有 psutil 的 Windows 上无法读取，返回 None。"""
+    try:
+        import psutil
+
+        return psutil.Process(pid).cmdline()
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().decode("utf-8", errors="replace").rstrip("\0").split("\0")
+    except OSError:
+        return None
+
+
+def cmdline_hash(pid: int) -> Optional[str]:
+    cmdline = process_cmdline(pid)
+    if not cmdline:
+        return None
+    return hashlib.sha1("\0".join(cmdline).encode("utf-8")).hexdigest()
+
+
+def process_usage(pid: int) -> Optional[tuple]:
+    """返回 (累计 CPU 秒数, RSS 字节)，包含子进程（Windows 上真正的 Bot 是外壳的子进程）。"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+            cpu = rss = 0.0
+            for proc in processes:
+                try:
+                    times = proc.cpu_times()
+                    cpu += times.user + times.system
+                    rss += proc.memory_info().rss
+                except psutil.Error:
+                    continue
+            return cpu, rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm", "r") as f:
+            rss_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        # 没有 psutil 的 Windows，或进程已退出
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) + int(fields[12])) / ticks, rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def terminate_tree(process):
+    """
+    结束服务进程。Windows 上记录的 PID 可能是承载服务的 powershell / cmd 窗口，
+    只结束窗口进程时其中启动的服务（如 Napcat 的 node）会继续运行，因此用 taskkill /T 连同子进程一起结束。
+    """
+    if os.name == "nt" and process.poll() is None:
+        result = subprocess.run(
+            ["taskkill", "/T", "/F", "/PID", str(process.pid)],
+            capture_output=True,
+            creationflags=subprocess.CREATE_NO_WINDOW,
+        )
+        if result.returncode == 0:
+            return
+    process.terminate()
+
+
+class AttachedProcess:
+    """
+    接管的进程，提供与 subprocess.Popen 相同的 pid / poll / wait / terminate 接口，
+    可以直接放入 running_processes。
+    """
+
+    def __init__(self, pid: int, create_time: Optional[float]):
+        self.pid = pid
+        self.create_time = create_time
+        self.returncode: Optional[int] = None
+
+    def _alive(self) -> bool:
+        if os.name == "nt":
+            import ctypes
+            from ctypes import wintypes
+
+            kernel32, handle = _windows_open(self.pid, PROCESS_QUERY_LIMITED_INFORMATION)
+            if not handle:
+                return False
+            try:
+                code = wintypes.DWORD()
+                kernel32.GetExitCodeProcess(ctypes.c_void_p(handle), ctypes.byref(code))
+                alive = code.value == STILL_ACTIVE
+            finally:
+                kernel32.CloseHandle(ctypes.c_void_p(handle))
+        else:
+            try:
+                # 就地 exec 后服务仍是本进程的子进程，需要回收以免成为僵尸进程
+                if os.waitpid(self.pid, os.WNOHANG)[0] == self.pid:
+                    return False
+            except ChildProcessError:
+                pass
+            try:
+                os.kill(self.pid, 0)
+                alive = True
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                alive = True
+        create_time = process_create_time(self.pid)
+        return alive and (
+            create_time is None
+            or self.create_time is None
+            or abs(create_time - self.create_time) <= CREATE_TIME_TOLERANCE
+        )
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None and not self._alive():
+            self.returncode = 0
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.poll() is None:
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"进程 {self.pid} 未在 {timeout} 秒内退出")
+            time.sleep(0.1)
+        return self.returncode
+
+    def terminate(self):
+        if self.poll() is not None:
+            return
+        if os.name == "nt":
+            import ctypes
+
+            kernel32, handle = _windows_open(self.pid, PROCESS_TERMINATE)
+            if not handle:
+                raise ctypes.WinError(ctypes.get_last_error())
+            try:
+                kernel32.TerminateProcess(ctypes.c_void_p(handle), 1)
+            finally:
+                kernel32.CloseHandle(ctypes.c_void_p(handle))
+        else:
+            os.kill(self.pid, signal.SIGTERM)
+
+    kill = terminate
+
+
+class ServiceRegistry:
+    """
+    services.json 的读写，记录由管理程序启动、尚未停止的服务进程。
+    同一安装可能同时有管理程序窗口和 fleet.py 调用的命令行模式在写，
+    每次修改都在锁文件内重新读取磁盘上的内容再写回，不会覆盖对方的记录。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock_path = path.with_name(path.name + ".lock")
+        self.entries: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def _locked(self):
+        """持有锁文件并重新读取注册表；持有者崩溃留下的锁超过 LOCK_STALE_SECONDS 后视为失效"""
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - self.lock_path.stat().st_mtime > LOCK_STALE_SECONDS:
+                        self.lock_path.unlink()
+                        continue
+                except OSError:
+                    continue
+                time.sleep(0.05)
+        try:
+            self.entries = self._load()
+            yield self.entries
+        finally:
+            self.lock_path.unlink(missing_ok=True)
+
+    def record(self, service_key: str, process):
+        """服务启动后立即调用，记录进程身份信息。"""
+        with self._locked() as entries:
+            entries[service_key] = {
+                "pid": process.pid,
+                "create_time": process_create_time(process.pid),
+                "cmdline_hash": cmdline_hash(process.pid),
+                "started_at": time.time(),
+            }
+            self._save()
+
+    def remove(self, service_key: str):
+        with self._locked() as entries:
+            if entries.pop(service_key, None) is not None:
+                self._save()
+
+    def attach(self, service_key: str) -> Optional[AttachedProcess]:
+        """
+        启动或停止前查看磁盘上的注册表：服务可能由其他窗口或 fleet.py 调用的命令行模式启动，
+        仍在运行时返回可接管的进程，已退出的条目会被清理。
+        """
+        with self._locked() as entries:
+            entry = entries.get(service_key)
+            if entry is None:
+                return None
+            if self._verify(entry):
+                return AttachedProcess(entry["pid"], entry.get("create_time"))
+            del entries[service_key]
+            self._save()
+            return None
+
+    def _verify(self, entry: dict) -> bool:
+        create_time = process_create_time(entry["pid"])
+        if create_time is None:
+            return False
+        if entry.get("create_time") is not None:
+            return abs(create_time - entry["create_time"]) <= CREATE_TIME_TOLERANCE
+        if entry.get("cmdline_hash"):
+            current = cmdline_hash(entry["pid"])
+            if current is not None and current != entry["cmdline_hash"]:
+                return False
+        return True
+
+    def reattach(self, known_services) -> Dict[str, AttachedProcess]:
+        """校验注册表中的进程，返回仍在运行的服务；已退出或不再认识的条目会被清理。"""
+        attached = {}
+        with self._locked() as entries:
+            for service_key, entry in list(entries.items()):
+                if service_key in known_services and self._verify(entry):
+                    attached[service_key] = AttachedProcess(entry["pid"], entry.get("create_time"))
+                else:
+                    del entries[service_key]
+            self._save()
+        return attached
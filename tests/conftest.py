@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+import sys
+from pathlib import Path
+
+# 各模块位于仓库根目录，与 onekey.py / update.py 一样直接导入
+sys.path.insert(0, str(Path(__file__).parent.parent))
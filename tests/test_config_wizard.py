@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+config_wizard = pytest.importorskip("config_wizard")
+
+
+@pytest.fixture
+def bot_dir(tmp_path, monkeypatch):
+    bot = tmp_path / "Bot"
+    (bot / "config").mkdir(parents=True)
+    (bot / "config" / "bot_config.toml").write_text(
+        '[bot]\nqq_account = 0\n\n[permission]\nmaster_users = []\n', encoding="utf-8"
+    )
+    (bot / ".env").write_text("EULA_CONFIRMED=true\n", encoding="utf-8")
+    adapter = bot / "config" / "plugins" / "napcat_adapter" / "config.toml"
+    monkeypatch.setattr(config_wizard, "BOT_CONFIG_PATH", str(bot / "config" / "bot_config.toml"))
+    monkeypatch.setattr(config_wizard, "MODEL_CONFIG_PATH", str(bot / "config" / "model_config.toml"))
+    monkeypatch.setattr(config_wizard, "NAPCAT_ADAPTER_CONFIG_PATH", str(adapter))
+    monkeypatch.setattr(config_wizard, "ENV_PATH", str(bot / ".env"))
+    monkeypatch.setattr(config_wizard, "NAPCAT_CONFIG_DIR", str(tmp_path / "napcat"))
+    return bot
+
+
+def test_port_and_account_are_applied(bot_dir):
+    errors = config_wizard.run_batch({"qq_account": "123456", "port": 8096})
+    assert errors == []
+    assert "qq_account = 123456" in (bot_dir / "config" / "bot_config.toml").read_text(encoding="utf-8")
+
+
+def test_list_answers_without_adapter_features_are_errors(bot_dir):
+    errors = config_wizard.run_batch({"port": 8096, "group_list_type": "whitelist", "group_list": [1, 2]})
+    assert len(errors) == 2
+    assert all("[features]" in error for error in errors)
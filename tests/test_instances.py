@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+import sys
+
+import pytest
+
+from instances import InstanceManager
+
+
+def test_main_account_cannot_be_reused(tmp_path):
+    config = tmp_path / "core" / "Bot" / "config"
+    config.mkdir(parents=True)
+    (config / "bot_config.toml").write_text("[bot]\nqq_account = 123456\n", encoding="utf-8")
+    manager = InstanceManager(tmp_path, sys.executable)
+    with pytest.raises(ValueError, match="主实例"):
+        manager.create("second", "123456")
+    assert not manager.instance_path("second").exists()
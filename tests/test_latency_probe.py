@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import time
+
+from latency_probe import LatencyProbe, format_snapshot
+from onebot_ws import StandInBot
+
+
+def test_probe_measures_stand_in_bot():
+    stand_in = StandInBot().start()
+    probe = LatencyProbe(stand_in.url, interval=0.02, timeout=2.0)
+    probe.start()
+    try:
+        deadline = time.monotonic() + 10
+        while probe.snapshot()["samples"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        probe.stop()
+        stand_in.stop()
+    snapshot = probe.snapshot()
+    assert snapshot["samples"] >= 5
+    for key in ("rtt_ms", "ack_ms"):
+        assert set(snapshot[key]) == {"p50", "p95", "p99"}
+        assert 0 <= snapshot[key]["p50"] <= snapshot[key]["p95"] <= snapshot[key]["p99"]
+    assert any(event.get("meta_event_type") == "heartbeat" for event in stand_in.received)
+    assert "p99" in format_snapshot(snapshot)
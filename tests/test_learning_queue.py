@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import json
+import sys
+
+import pytest
+
+from learning_queue import LearningQueue
+
+
+def _queue(tmp_path, settings=None):
+    state = tmp_path / "state"
+    if settings is not None:
+        state.mkdir()
+        (state / "learning_queue.json").write_text(json.dumps({"settings": settings, "items": []}), encoding="utf-8")
+    (tmp_path / "input.txt").write_text("知识", encoding="utf-8")
+    queue = LearningQueue(tmp_path, state, sys.executable, limits={})
+    queue.add([tmp_path / "input.txt"])
+    return queue
+
+
+def test_queue_refuses_to_start_without_command(tmp_path):
+    queue = _queue(tmp_path)
+    with pytest.raises(ValueError, match="settings.command"):
+        queue.start()
+    assert queue.counts()["pending"] == 1
+
+
+def test_guessed_command_from_older_queue_file_is_ignored(tmp_path):
+    queue = _queue(tmp_path, {"command": ["{python}", "lpmm_learning_tool.py", "{input}"]})
+    with pytest.raises(ValueError):
+        queue.start()
+
+
+def test_configured_command_processes_items(tmp_path):
+    script = "import sys; open(sys.argv[1] + '.learned', 'w').close()"
+    queue = _queue(tmp_path, {"command": ["{python}", "-c", script, "{input}"]})
+    queue.start()
+    queue.wait()
+    assert queue.counts()["done"] == 1
+    assert (tmp_path / "input.txt.learned").exists()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from maintenance_scheduler import MaintenanceScheduler
+
+
+def _scheduler(tmp_path, jobs, ran):
+    schedule = {"window_minutes": 30, "jobs": jobs}
+    actions = {"database": lambda job: ran.append(job["name"]) or (True, "")}
+    return MaintenanceScheduler(schedule, tmp_path, actions, lambda job: None)
+
+
+def _rule(moment):
+    return f"{moment.minute} {moment.hour} * * *"
+
+
+def test_job_due_during_long_run_is_caught_up(tmp_path):
+    now = datetime.now().replace(second=0, microsecond=0)
+    ran = []
+    scheduler = _scheduler(tmp_path, [{"name": "db", "action": "database", "schedule": _rule(now - timedelta(minutes=10))}], ran)
+    # 上次检查在 20 分钟前，其间维护线程一直在执行别的任务
+    scheduler._last_tick = now - timedelta(minutes=20)
+    scheduler._tick(now)
+    assert ran == ["db"]
+    assert scheduler.history["db"]["runs"][-1]["status"] == "done"
+    # 同一时间点不会重复执行
+    scheduler._last_tick = now - timedelta(minutes=20)
+    scheduler._tick(now)
+    assert ran == ["db"]
+
+
+def test_job_missed_beyond_window_is_recorded_as_skipped(tmp_path):
+    now = datetime.now().replace(second=0, microsecond=0)
+    ran = []
+    scheduler = _scheduler(tmp_path, [{"name": "db", "action": "database", "schedule": _rule(now - timedelta(minutes=40))}], ran)
+    scheduler._last_tick = now - timedelta(minutes=50)
+    scheduler._tick(now)
+    assert ran == []
+    assert scheduler.history["db"]["runs"][-1]["status"] == "skipped"
+    assert "db" not in scheduler.pending
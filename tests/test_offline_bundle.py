@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import io
+import tarfile
+
+import pytest
+
+from offline_bundle import OfflineBundleError, redact_toml, unpack
+
+CONFIG = '''# 模型配置
+[api]
+api_keys = [
+    "sk-aaa",
+    "sk-bbb",
+]
+base_url = "https://example.com" # 保留
+secret = """
+multi-line-secret
+"""
+
+[[api_providers]]
+name = "provider"
+api_key = 'sk-ccc'
+
+[adapter]
+access_token = "tk-123"
+options = { password = "pw", port = 8095 }
+keyword_reaction = ["hello"]
+'''
+
+
+def test_redacts_secrets_at_any_depth():
+    tomlkit = pytest.importorskip("tomlkit")
+    text, count = redact_toml(CONFIG)
+    for secret in ("sk-aaa", "sk-bbb", "sk-ccc", "multi-line-secret", "tk-123", '"pw"'):
+        assert secret not in text
+    assert count == 5
+    document = tomlkit.parse(text)
+    assert document["api"]["api_keys"] == []
+    assert document["api"]["secret"] == ""
+    assert document["api_providers"][0]["api_key"] == ""
+    assert document["adapter"]["options"]["port"] == 8095
+
+
+def test_keeps_other_values_and_comments():
+    tomlkit = pytest.importorskip("tomlkit")
+    text, _ = redact_toml(CONFIG)
+    assert "# 模型配置" in text
+    assert "# 保留" in text
+    document = tomlkit.parse(text)
+    assert document["api"]["base_url"] == "https://example.com"
+    assert document["adapter"]["keyword_reaction"] == ["hello"]
+
+
+@pytest.mark.parametrize("name", ["bot/..\\..\\x", "bot/C:\\x", "bot/C:x", "../x", "/tmp/x", "bot/../../x"])
+def test_unsafe_member_is_rejected_before_writing(tmp_path, name):
+    archive_path = tmp_path / "bundle.tar.gz"
+    data = b"evil"
+    with tarfile.open(str(archive_path), "w:gz") as archive:
+        member = tarfile.TarInfo(name)
+        member.size = len(data)
+        archive.addfile(member, io.BytesIO(data))
+    staging = tmp_path / "a" / "b" / "staging"
+    with pytest.raises(OfflineBundleError):
+        unpack(archive_path, staging)
+    assert [path for path in tmp_path.rglob("*") if path.is_file()] == [archive_path]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import requirements_check
+
+if not requirements_check.available():
+    pytest.skip("需要 packaging 库", allow_module_level=True)
+
+import plugin_requirements  # noqa: E402
+from requirements_check import Requirement  # noqa: E402
+
+
+def _specifiers(*specs):
+    return [Requirement(f"pkg{spec}").specifier for spec in specs]
+
+
+@pytest.mark.parametrize(
+    "specs",
+    [
+        (">2", "<2.1"),
+        (">2.0", "<2.0.1"),
+        (">=1.0,!=1.0", "<1.0.1"),
+        (">=2", "<3"),
+        ("~=2.2", "!=2.2.0"),
+        ("==2.*", ">2.9"),
+        ("<2", "!=1.*"),
+        (">1,<3", ""),
+    ],
+)
+def test_satisfiable(specs):
+    assert plugin_requirements._satisfiable(_specifiers(*specs))
+
+
+@pytest.mark.parametrize(
+    "specs",
+    [
+        ("<2", ">=2"),
+        ("==1.4", "==1.5"),
+        ("~=2.2", ">=3"),
+        ("==2.*", "<2"),
+        (">2,<2.0.1", "!=2.0.0.*"),
+        (">=1,<2", "!=1.*"),
+    ],
+)
+def test_conflict(specs):
+    assert not plugin_requirements._satisfiable(_specifiers(*specs))
+
+
+def test_merge_reports_conflicting_plugin(tmp_path):
+    bot = tmp_path / "Bot"
+    (bot / "plugins" / "a").mkdir(parents=True)
+    (bot / "plugins" / "b").mkdir(parents=True)
+    (bot / "requirements.txt").write_text("pydantic>=2\nrequests>2\n", encoding="utf-8")
+    (bot / "plugins" / "a" / "requirements.txt").write_text("pydantic<2\n", encoding="utf-8")
+    (bot / "plugins" / "b" / "requirements.txt").write_text("requests<2.1\n", encoding="utf-8")
+    merged = plugin_requirements.merge(plugin_requirements.discover(bot), {})
+    assert [(c["package"], c["plugins"]) for c in merged["conflicts"]] == [("pydantic", ["a"])]
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import release_bundle
+from release_bundle import BundleError, BundleSource, BundleUpdater
+
+
+def _build(tmp_path, files):
+    tree = tmp_path / "tree"
+    for rel, content in files.items():
+        (tree / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tree / rel).write_text(content, encoding="utf-8")
+    out = tmp_path / "bundle"
+    release_bundle.build(tree, out, "v1")
+    return out
+
+
+def _tamper(out, rename):
+    manifest = json.loads((out / "manifest.json").read_text(encoding="utf-8"))
+    manifest["files"] = {rename.get(rel, rel): entry for rel, entry in manifest["files"].items()}
+    (out / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def test_update_applies_bundle(tmp_path):
+    out = _build(tmp_path, {"main.py": "print(1)\n", "pkg/mod.py": "x = 1\n"})
+    target = tmp_path / "target"
+    target.mkdir()
+    result = BundleUpdater(target, tmp_path / "state" / "bot.json").update(BundleSource(str(out)))
+    assert result["changed"] == 2
+    assert (target / "pkg" / "mod.py").read_text(encoding="utf-8") == "x = 1\n"
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "../evil.txt",
+        "pkg/../../evil.txt",
+        "/tmp/evil.txt",
+        "..\\evil.txt",
+        "C:/evil.txt",
+        "config/bot.toml",
+        ".git/hooks/post-merge",
+        "config\\bot.toml",
+        "data\\x",
+        "Config/bot.toml",
+        ".GIT/hooks/x",
+    ],
+)
+def test_traversal_entry_is_rejected(tmp_path, name):
+    out = _build(tmp_path, {"main.py": "print(1)\n"})
+    _tamper(out, {"main.py": name})
+    target = tmp_path / "target"
+    target.mkdir()
+    with pytest.raises(BundleError):
+        BundleUpdater(target, tmp_path / "state" / "bot.json").update(BundleSource(str(out)))
+    assert not (tmp_path / "evil.txt").exists()
+    assert list(target.iterdir()) == []
+
+
+def test_invalid_chunk_hash_is_rejected(tmp_path):
+    out = _build(tmp_path, {"main.py": "print(1)\n"})
+    manifest = json.loads((out / "manifest.json").read_text(encoding="utf-8"))
+    manifest["files"]["main.py"]["chunks"] = ["../../evil"]
+    (out / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    with pytest.raises(BundleError):
+        BundleSource(str(out)).manifest()
+
+
+def test_managed_entries_outside_target_are_not_deleted(tmp_path):
+    out = _build(tmp_path, {"main.py": "print(1)\n"})
+    target = tmp_path / "target"
+    target.mkdir()
+    updater = BundleUpdater(target, tmp_path / "state" / "bot.json")
+    updater.index = {"managed": ["../outside.txt"], "files": {}}
+    (tmp_path / "outside.txt").write_text("keep", encoding="utf-8")
+    updater.scan_local = lambda: {"../outside.txt": {"sha256": "", "chunks": []}}
+    with pytest.raises(BundleError):
+        updater.update(BundleSource(str(out)))
+    assert (tmp_path / "outside.txt").exists()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+from service_state import ServiceRegistry
+
+
+def test_registries_sharing_a_file_keep_each_others_entries(tmp_path):
+    path = tmp_path / "services.json"
+    window = ServiceRegistry(path)
+    cli = ServiceRegistry(path)
+    cli.record("bot", SimpleNamespace(pid=os.getpid()))
+    window.record("napcat", SimpleNamespace(pid=os.getpid()))
+    window.remove("vscode")
+    assert set(ServiceRegistry(path).entries) == {"bot", "napcat"}
+    assert not window.lock_path.exists()
+
+
+def test_attach_finds_service_started_elsewhere(tmp_path):
+    path = tmp_path / "services.json"
+    window = ServiceRegistry(path)
+    ServiceRegistry(path).record("bot", SimpleNamespace(pid=os.getpid()))
+    attached = window.attach("bot")
+    assert attached is not None and attached.pid == os.getpid()
+    assert attached.poll() is None
+
+
+def test_attach_drops_exited_service(tmp_path):
+    path = tmp_path / "services.json"
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    ServiceRegistry(path).record("bot", process)
+    process.wait()
+    window = ServiceRegistry(path)
+    assert window.attach("bot") is None
+    assert "bot" not in ServiceRegistry(path).entries
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+子进程耗时追踪
+设置环境变量 ONEKEY_TRACE=1（或 `update.py --trace`）后，update.py 与管理程序执行的每个 git / pip 命令
+都会记录命令、工作目录、开始与结束时间、退出码和输出大小，写入
+core/.onekey/traces/<程序>-<时间>-<进程号>.json（Chrome trace 格式，可在 chrome://tracing 或
+https://ui.perfetto.dev 打开），结束时另写一份按阶段汇总的耗时表 (.txt)。
+未开启时 Tracer.run 就是 subprocess.run 本身，span / phase 返回空上下文，几乎没有额外开销。
+ONEKEY_TRACE 会随环境变量传给管理程序启动的后台更新进程。
+查看已有记录的汇总：python tracing.py [trace 文件]（默认最近一次）
+"""
+
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ENV_VAR = "ONEKEY_TRACE"
+# 只保留最近的记录文件
+KEEP_TRACES = 20
+NO_PHASE = "(无阶段)"
+
+
+def is_enabled() -> bool:
+    return os.environ.get(ENV_VAR, "").strip().lower() not in ("", "0", "false", "no", "off")
+
+
+def command_label(cmd) -> str:
+    """git pull / pip install / 可执行文件名，用作事件名"""
+    if isinstance(cmd, str):
+        parts = cmd.split()
+    else:
+        parts = [str(part) for part in cmd]
+    if not parts:
+        return "?"
+    exe = Path(parts[0]).stem.lower()
+    if exe == "git" and len(parts) > 1:
+        return f"git {parts[1]}"
+    if exe.startswith("python") and parts[1:3] == ["-m", "pip"] and len(parts) > 3:
+        return f"pip {parts[3]}"
+    return exe
+
+
+def _output_size(value) -> int:
+    if value is None:
+        return 0
+    return len(value.encode("utf-8", "ignore")) if isinstance(value, str) else len(value)
+
+
+class Tracer:
+    def __init__(self, trace_dir: Optional[Path] = None, program: str = "onekey"):
+        self.enabled = trace_dir is not None
+        self.path: Optional[Path] = None
+        if not self.enabled:
+            # 未开启时直接调用 subprocess.run，不经过任何包装
+            self.run = subprocess.run
+            return
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        _prune(trace_dir)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self.path = trace_dir / f"{program}-{stamp}-{os.getpid()}.json"
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._events: List[dict] = []
+        self._phases: List[tuple] = []  # [(名称, 开始时间)]
+        self._tids: Dict[int, int] = {}
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._written = 0
+        self._closed = False
+        # 逐条写入（JSON Array 格式允许缺少结尾的 "]"），管理程序被直接关闭时已记录的事件也不会丢失
+        self._file.write("[")
+        self._write(
+            {"name": "process_name", "ph": "M", "pid": os.getpid(), "tid": 0, "args": {"name": program}}
+        )
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, state_path: Path, program: str) -> "Tracer":
+        return cls(state_path / "traces" if is_enabled() else None, program)
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._origin) * 1_000_000
+
+    def _tid(self) -> int:
+        ident = threading.get_ident()
+        if ident not in self._tids:
+            self._tids[ident] = len(self._tids) + 1
+            self._write(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": self._tids[ident],
+                    "args": {"name": threading.current_thread().name},
+                }
+            )
+        return self._tids[ident]
+
+    def _write(self, event: dict):
+        if self._closed:
+            return
+        self._file.write(("\n" if not self._written else ",\n") + json.dumps(event, ensure_ascii=False))
+        self._file.flush()
+        self._written += 1
+
+    def _emit(self, name: str, cat: str, start_us: float, args: dict):
+        end_us = self._now_us()
+        with self._lock:
+            event = {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": round(start_us, 1),
+                "dur": round(end_us - start_us, 1),
+                "pid": os.getpid(),
+                "tid": self._tid(),
+                "args": args,
+            }
+            self._events.append(event)
+            self._write(event)
+
+    # ==================== 阶段 ====================
+    def current_phase(self) -> str:
+        return self._phases[-1][0] if self.enabled and self._phases else NO_PHASE
+
+    def begin_phase(self, name: str):
+        if self.enabled:
+            self._phases.append((name, self._now_us()))
+
+    def end_phase(self, name: str, status: str = "done"):
+        """结束阶段；未正常结束的内层阶段一并结束，未开始的阶段忽略"""
+        if not self.enabled or name not in (phase for phase, _ in self._phases):
+            return
+        while self._phases:
+            phase, start_us = self._phases.pop()
+            self._emit(phase, "phase", start_us, {"status": status if phase == name else "unfinished"})
+            if phase == name:
+                return
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._phase_context(name)
+
+    @contextlib.contextmanager
+    def _phase_context(self, name: str):
+        self.begin_phase(name)
+        try:
+            yield
+        finally:
+            self.end_phase(name)
+
+    # ==================== 命令 ====================
+    def span(self, cmd, cwd=None):
+        """包装自行管理的子进程（如逐行读取输出的 Popen），调用方填写 exit_code / output_bytes"""
+        if not self.enabled:
+            return contextlib.nullcontext({})
+        return self._span_context(cmd, cwd)
+
+    @contextlib.contextmanager
+    def _span_context(self, cmd, cwd):
+        args = {
+            "cmd": cmd if isinstance(cmd, str) else subprocess.list2cmdline([str(part) for part in cmd]),
+            "cwd": str(cwd or os.getcwd()),
+            "phase": self.current_phase(),
+            "start_time": time.time(),
+            "exit_code": None,
+            "output_bytes": None,
+        }
+        start_us = self._now_us()
+        try:
+            yield args
+        finally:
+            args["end_time"] = time.time()
+            self._emit(command_label(cmd), "subprocess", start_us, args)
+
+    def run(self, cmd, **kwargs) -> subprocess.CompletedProcess:
+        """与 subprocess.run 相同，额外记录一条命令事件；未捕获输出时 output_bytes 为 None"""
+        with self._span_context(cmd, kwargs.get("cwd")) as span:
+            try:
+                result = subprocess.run(cmd, **kwargs)
+            except Exception as e:
+                span["error"] = str(e)
+                raise
+            span["exit_code"] = result.returncode
+            if result.stdout is not None or result.stderr is not None:
+                span["output_bytes"] = _output_size(result.stdout) + _output_size(result.stderr)
+            return result
+
+    # ==================== 结束 ====================
+    def close(self) -> str:
+        """结束记录，写入汇总表并返回其内容；重复调用或未开启时返回空字符串"""
+        if not self.enabled or self._closed:
+            return ""
+        while self._phases:
+            self.end_phase(self._phases[-1][0], "unfinished")
+        with self._lock:
+            self._file.write("\n]\n")
+            self._file.close()
+            self._closed = True
+        summary = format_summary(summarize(self._events))
+        try:
+            self.path.with_suffix(".txt").write_text(summary + "\n", encoding="utf-8")
+        except OSError:
+            pass
+        return f"{summary}\n耗时记录: {self.path}"
+
+
+def _prune(trace_dir: Path):
+    traces = sorted(trace_dir.glob("*.json"), key=lambda path: path.stat().st_mtime)
+    for old in traces[: max(0, len(traces) - KEEP_TRACES + 1)]:
+        for path in (old, old.with_suffix(".txt")):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def load_events(path: Path) -> List[dict]:
+    """读取记录文件，兼容进程被直接结束、缺少结尾 "]" 的文件"""
+    text = path.read_text(encoding="utf-8").strip()
+    if not text.endswith("]"):
+        text = text.rstrip(",") + "]"
+    return json.loads(text)
+
+
+def summarize(events: List[dict]) -> List[dict]:
+    """按阶段汇总命令耗时：[{"phase", "count", "seconds", "failed", "slowest"}]，耗时从高到低"""
+    phases: Dict[str, dict] = {}
+    for event in events:
+        if event.get("cat") != "subprocess":
+            continue
+        args = event["args"]
+        phase = args.get("phase") or NO_PHASE
+        if phase == NO_PHASE:
+            phase = event["name"]
+        seconds = event["dur"] / 1_000_000
+        entry = phases.setdefault(phase, {"phase": phase, "count": 0, "seconds": 0.0, "failed": 0, "slowest": None})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        if args.get("exit_code") not in (0, None) or args.get("error"):
+            entry["failed"] += 1
+        if entry["slowest"] is None or seconds > entry["slowest"][1]:
+            entry["slowest"] = (event["name"], seconds)
+    return sorted(phases.values(), key=lambda entry: entry["seconds"], reverse=True)
+
+
+def format_summary(rows: List[dict]) -> str:
+    total = sum(row["seconds"] for row in rows)
+    lines = [f"{'阶段':<24}{'命令数':>6}{'失败':>6}{'耗时(秒)':>10}{'占比':>7}  最慢的命令"]
+    for row in rows:
+        share = row["seconds"] / total * 100 if total else 0
+        slowest = f"{row['slowest'][0]} ({row['slowest'][1]:.1f}s)" if row["slowest"] else ""
+        lines.append(
+            f"{row['phase']:<24}{row['count']:>6}{row['failed']:>6}{row['seconds']:>10.1f}{share:>6.0f}%  {slowest}"
+        )
+    lines.append(f"{'合计':<24}{sum(row['count'] for row in rows):>6}{'':>6}{total:>10.1f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看子进程耗时记录的阶段汇总")
+    parser.add_argument("trace", nargs="?", help="记录文件，默认 core/.onekey/traces 中最近的一个")
+    args = parser.parse_args()
+
+    if args.trace:
+        path = Path(args.trace)
+    else:
+        trace_dir = Path(__file__).parent.absolute() / "core" / ".onekey" / "traces"
+        traces = sorted(trace_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        if not traces:
+            print(f"没有找到耗时记录，请先设置环境变量 {ENV_VAR}=1 后运行更新")
+            sys.exit(1)
+        path = traces[-1]
+    print(path)
+    print(format_summary(summarize(load_events(path))))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,19 @@ import json
 from pathlib import Path
 from typing import List, Optional
 
+# 内置的嵌入式Python不会自动把脚本所在目录加入 sys.path
+sys.path.insert(0, str(Path(__file__).parent.absolute()))
+
+import git_tools  # noqa: E402
+import launcher  # noqa: E402
+import plugin_requirements  # noqa: E402
+import preflight  # noqa: E402
+import prefetch  # noqa: E402
+import release_bundle  # noqa: E402
+import requirements_check  # noqa: E402
+import tracing  # noqa: E402
+from background_update import PHASE_MARKER  # noqa: E402
+
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
 
 
@@ -49,9 +62,20 @@ class Colors:
 
 
 class Updater:
-    def __init__(self):
+    def __init__(self, background: bool = False, find_links: Optional[Path] = None):
+        # 后台模式：由管理程序启动，不等待用户输入，并输出阶段标记供其显示进度
+        self.background = background
+        # 本地 wheel 目录（fleet.py 为多个安装共享下载的依赖），安装依赖时优先使用
+        self.find_links = find_links
+        # 环境预检未通过时为 False，作为进程退出码返回给调用方
+        self.preflight_ok = True
+        # 各仓库更新结果与各镜像的 pip 安装耗时，结束后写入 last_update.json 供管理程序的指标接口读取
+        self.results = {"repos": {}, "pip": {}}
         self.base_path = Path(__file__).parent.absolute()
-        self.python_executable = self.base_path / "python_embedded" / "python.exe"
+        self.python_executable = launcher.python_executable(self.base_path)
+        self.state_path = self.base_path / "core" / ".onekey"
+        # 设置 ONEKEY_TRACE=1 时记录每个 git / pip 命令的耗时，见 tracing.py
+        self.tracer = tracing.Tracer.from_env(self.state_path, "update")
         self.services = self._load_config()
         self.mirrors = [
             "https://mirrors.huaweicloud.com/repository/pypi/simple/",
@@ -97,7 +121,7 @@ class Updater:
             # 当show_output为True时，我们不捕获输出，让其直接流向控制台
             # 当show_output为False时，我们捕获输出以供后续处理
             capture = not show_output
-            result = subprocess.run(
+            result = self.tracer.run(
                 cmd,
                 cwd=cwd,
                 capture_output=capture,
@@ -127,7 +151,7 @@ class Updater:
                         "returncode": -1,
                     }
 
-            result = subprocess.run(
+            result = self.tracer.run(
                 cmd,
                 cwd=str(cwd) if cwd else None,
                 env=env,
@@ -147,7 +171,38 @@ class Updater:
             print(Colors.red(f"命令执行失败: {e}"))
             return False, {"stdout": "", "stderr": str(e), "returncode": -1}
 
-    def _update_repo(self, service: dict, repo_path: Path) -> bool:
+    def _save_results(self):
+        """合并写入 last_update.json，本次跳过的仓库保留上次的结果"""
+        results_path = self.state_path / "last_update.json"
+        try:
+            with open(results_path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+        merged = {
+            "repos": {**previous.get("repos", {}), **self.results["repos"]},
+            "pip": {**previous.get("pip", {}), **self.results["pip"]},
+        }
+        try:
+            self.state_path.mkdir(parents=True, exist_ok=True)
+            tmp_path = results_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(merged, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, results_path)
+        except OSError:
+            pass  # 只影响指标接口
+
+    def _phase(self, service_key: str, phase: str, status: str, **extra):
+        """后台模式下输出一行阶段标记（checkout / fetch / install），同时作为耗时记录的阶段"""
+        if status == "start":
+            self.tracer.begin_phase(f"{service_key}/{phase}")
+        else:
+            self.tracer.end_phase(f"{service_key}/{phase}", status)
+        if self.background:
+            marker = {"service": service_key, "phase": phase, "status": status, **extra}
+            print(PHASE_MARKER + json.dumps(marker), flush=True)
+
+    def _update_repo(self, service_key: str, service: dict, repo_path: Path) -> bool:
         try:
             repo_url = service["repo_url"]
             env = os.environ.copy()
@@ -163,11 +218,16 @@ class Updater:
             if status_success and status_output["stdout"]:
                 print(Colors.yellow("检测到本地仓库有未提交的修改。"))
                 sys.stdout.flush()
-                choice = (
-                    input(Colors.yellow("是否要重置本地仓库并强制更新？(Y/N): "))
-                    .strip()
-                    .lower()
-                )
+                if self.background:
+                    # 后台更新不会丢弃本地修改
+                    print(Colors.yellow("后台更新模式下不会重置本地修改。"))
+                    choice = "n"
+                else:
+                    choice = (
+                        input(Colors.yellow("是否要重置本地仓库并强制更新？(Y/N): "))
+                        .strip()
+                        .lower()
+                    )
                 if choice == "y":
                     print(Colors.cyan("正在重置本地仓库..."))
                     sys.stdout.flush()
@@ -183,6 +243,7 @@ class Updater:
 
             branch = service.get("branch", "master")
 
+            self._phase(service_key, "checkout", "start")
             print(Colors.cyan(f"正在切换到分支: {branch}"))
             sys.stdout.flush()
             checkout_success, _ = self.run_command_with_env(
@@ -196,6 +257,22 @@ class Updater:
                     cwd=repo_path,
                     env=env,
                 )
+            self._phase(service_key, "checkout", "done")
+
+            self._phase(service_key, "fetch", "start")
+            # 管理程序已在后台预取过远程分支时，直接在本地快进，无需再下载
+            if prefetch.is_fresh(self.state_path, service_key, repo_path, branch):
+                print(Colors.cyan(f"使用后台预取的内容，快进到 origin/{branch}..."))
+                sys.stdout.flush()
+                merge_success, merge_output = self.run_command_with_env(
+                    ["git", "merge", "--ff-only", f"origin/{branch}"], cwd=repo_path, env=env
+                )
+                if merge_success:
+                    if "Already up to date." in merge_output.get("stdout", ""):
+                        print(Colors.green("仓库已经是最新版本。"))
+                        sys.stdout.flush()
+                    return True
+                print(Colors.yellow("无法快进合并，改为从 origin 拉取..."))
 
             print(Colors.cyan("正在从 origin 拉取最新内容..."))
             pull_success, pull_output = self.run_command_with_env(
@@ -220,7 +297,110 @@ class Updater:
             print(Colors.red(f"仓库更新出错: {e}"))
             return False
 
-    def _install_requirements(self, service: dict, repo_path: Path):
+    def _update_from_bundle(self, service_key: str, service: dict, repo_path: Path) -> tuple:
+        """从发布包来源更新，返回 (是否成功, 是否有变化)"""
+        self._phase(service_key, "fetch", "start")
+        source = release_bundle.BundleSource(service["bundle_source"])
+        updater = release_bundle.BundleUpdater(
+            repo_path, self.state_path / "bundle" / f"{service_key}.json"
+        )
+        print(Colors.cyan(f"正在从发布包更新: {service['bundle_source']}"), flush=True)
+
+        def progress(done: int, total: int):
+            if done == total or done % 20 == 0:
+                print(f"  已下载 {done}/{total} 块", flush=True)
+
+        try:
+            result = updater.update(source, progress=progress)
+        except (release_bundle.BundleError, OSError) as e:
+            print(Colors.red(f"发布包更新失败，代码未改动: {e}"), flush=True)
+            return False, False
+        changed = bool(result["changed"] or result["deleted"])
+        if changed:
+            print(Colors.cyan(release_bundle.describe(result)), flush=True)
+        else:
+            print(Colors.green("已经是最新版本。"), flush=True)
+        return True, changed
+
+    def _plugin_requirements_plan(self, repo_path: Path) -> dict:
+        """合并 Bot 与插件的依赖；后台更新无法询问，有冲突的插件跳过并给出提示"""
+        python_version = self.preflight.python_version()
+        plan = plugin_requirements.plan(repo_path, self.python_executable, python_version)
+        if plan["conflicts"]:
+            print(Colors.yellow("  -> ⚠️ 插件依赖冲突:"), flush=True)
+            for line in plugin_requirements.format_conflicts(plan["conflicts"]):
+                print(Colors.yellow(f"     {line}"), flush=True)
+            skipped = sorted({plugin for conflict in plan["conflicts"] for plugin in conflict["plugins"]})
+            if skipped:
+                print(Colors.yellow(f"  -> 本次跳过这些插件的依赖: {', '.join(skipped)}"), flush=True)
+                plan = plugin_requirements.plan(repo_path, self.python_executable, python_version, skipped)
+            if plan["conflicts"]:
+                raise ValueError("Bot 本体的依赖文件存在冲突")
+        for item in plan["invalid"]:
+            print(Colors.yellow(f"  -> ⚠️ 无法解析 {item['source']} 的依赖: {item['requirement']}"), flush=True)
+        return plan
+
+    def _requirements_to_install(self, requirements_file: Path, with_plugins: bool = False) -> Optional[List[str]]:
+        """进程内检查已安装的包，返回需要交给 pip 的参数；全部满足时返回 None"""
+        full_install = ["-r", str(requirements_file)]
+        if not requirements_check.available():
+            return full_install
+        constraints = []
+        try:
+            if with_plugins:
+                plan = self._plugin_requirements_plan(requirements_file.parent)
+                report = plan["report"]
+                if report["problems"]:
+                    constraints_file = plugin_requirements.write_constraints(
+                        plan, self.state_path / "plugin_constraints.txt"
+                    )
+                    constraints = ["-c", str(constraints_file)]
+            else:
+                report = requirements_check.check_file(
+                    requirements_file, self.python_executable, self.preflight.python_version()
+                )
+                if report["problems"]:
+                    # 文件中其它包的版本要求作为约束，避免 --upgrade 把共用的依赖升级到冲突的版本
+                    constraints_file = requirements_check.write_constraints(
+                        requirements_file, self.state_path / "constraints" / f"{requirements_file.parent.name}.txt"
+                    )
+                    constraints = ["-c", str(constraints_file)]
+        except (OSError, ValueError) as e:
+            print(Colors.yellow(f"  -> ⚠️ 依赖检查失败，改为完整安装: {e}"), flush=True)
+            return full_install
+        if not report["problems"]:
+            print(
+                Colors.green(f"  -> ✅ 已安装的 {report['checked']} 个包均满足要求 ({report['ms']:.0f} ms)，无需运行 pip"),
+                flush=True,
+            )
+            return None
+        for problem in report["problems"]:
+            print(Colors.yellow(f"  -> {requirements_check.format_problem(problem)}"), flush=True)
+        return (requirements_check.install_args(report) or full_install) + constraints
+
+    def _install_from_local_wheels(self, install_args: List[str]) -> bool:
+        print(Colors.cyan(f"  -> 正在从本地 wheel 目录安装: {self.find_links}"), flush=True)
+        start = time.time()
+        success, output = self.run_command(
+            [
+                str(self.python_executable),
+                "-m",
+                "pip",
+                "install",
+                *install_args,
+                "--no-index",
+                "--find-links",
+                str(self.find_links),
+                "--disable-pip-version-check",
+            ],
+            show_output=False,
+        )
+        self.results["pip"]["local"] = {"seconds": time.time() - start, "success": success}
+        if not success:
+            print(Colors.yellow("  -> ⚠️ 本地 wheel 不完整，改用镜像源安装..."), flush=True)
+        return success
+
+    def _install_requirements(self, service: dict, repo_path: Path, with_plugins: bool = False) -> bool:
         requirements_file = repo_path / "requirements.txt"
         if requirements_file.exists():
             print(
@@ -230,7 +410,13 @@ class Updater:
                 flush=True,
             )
 
+            install_args = self._requirements_to_install(requirements_file, with_plugins)
+            if install_args is None:
+                return True
             install_success = False
+            if self.find_links and self._install_from_local_wheels(install_args):
+                print(Colors.green(f"  -> ✅ {service['name']} 依赖安装成功 (本地 wheel)"), flush=True)
+                return True
             for mirror_url in self.mirrors:
                 print(Colors.cyan(f"  -> 正在尝试使用镜像源: {mirror_url}"), flush=True)
                 # 增加--disable-pip-version-check来减少无关输出，--no-cache-dir避免缓存问题
@@ -239,8 +425,7 @@ class Updater:
                     "-m",
                     "pip",
                     "install",
-                    "-r",
-                    str(requirements_file),
+                    *install_args,
                     "-i",
                     mirror_url,
                     "--upgrade",
@@ -249,18 +434,25 @@ class Updater:
                 ]
 
             # 使用Popen实时输出
-                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='ignore')
-                
-                # 实时读取输出
-                while True:
-                    output = process.stdout.readline() # type: ignore
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        print(f"  {output.strip()}") # 直接打印pip的输出
-                        sys.stdout.flush()
-
-                returncode = process.poll()
+                start = time.time()
+                with self.tracer.span(cmd) as span:
+                    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', errors='ignore')
+                    output_bytes = 0
+
+                    # 实时读取输出
+                    while True:
+                        output = process.stdout.readline() # type: ignore
+                        if output == '' and process.poll() is not None:
+                            break
+                        if output:
+                            output_bytes += len(output)
+                            print(f"  {output.strip()}") # 直接打印pip的输出
+                            sys.stdout.flush()
+
+                    returncode = process.poll()
+                    span["exit_code"] = returncode
+                    span["output_bytes"] = output_bytes
+                self.results["pip"][mirror_url] = {"seconds": time.time() - start, "success": returncode == 0}
                 if returncode == 0:
                     print(Colors.green("  -> ✅ 使用该镜像源安装成功"),flush=True)
                     install_success = True
@@ -279,8 +471,10 @@ class Updater:
                     ),
                     flush=True,
                 )
+            return install_success
         else:
             print(Colors.cyan(f"  -> {service['name']} 无需安装依赖。"))
+            return True
 
     def update_all(self):
         print(Colors.bold(Colors.cyan("=" * 60)))
@@ -288,8 +482,18 @@ class Updater:
         print(Colors.bold(Colors.cyan("=" * 60)))
         print()
 
-        if not self._find_git_executable():
-            print(Colors.red("❌ Git未安装或不在系统PATH中。请先安装Git。"))
+        # 更新前的环境预检：Git、内置 Python、磁盘空间、仓库
+        self.preflight = preflight.Preflight(self.base_path, self.state_path, self.python_executable)
+        with self.tracer.phase("preflight"):
+            report = self.preflight.run({}, "update")
+        for result in report["results"]:
+            if result["status"] == "warn":
+                print(Colors.yellow(preflight.format_result(result)))
+            elif result["status"] == "fail":
+                print(Colors.red(preflight.format_result(result)))
+        if preflight.failures(report):
+            print(Colors.red("❌ 环境预检未通过，请先解决以上问题后再更新。"))
+            self.preflight_ok = False
             return
 
         services_to_update = ["bot", "onekey"]
@@ -299,31 +503,72 @@ class Updater:
             repo_path = service["path"]
 
             print(Colors.yellow(f"--- 正在更新 {service['name']} ---"))
+            self.tracer.begin_phase(service_key)
+            start = time.time()
+            install_success = False
 
-            if not (repo_path / ".git").exists():
-                print(Colors.red(f"目录 {repo_path} 不是一个有效的Git仓库，跳过。"))
-                print()
-                continue
-
-            update_success = self._update_repo(service, repo_path)
+            if service.get("bundle_source"):
+                # 配置了发布包来源时不使用 git，只下载变化的内容
+                update_success, changed = self._update_from_bundle(service_key, service, repo_path)
+            else:
+                if not (repo_path / ".git").exists():
+                    print(Colors.red(f"目录 {repo_path} 不是一个有效的Git仓库，跳过。"))
+                    print()
+                    self.tracer.end_phase(service_key, "skipped")
+                    continue
+
+                old_head = git_tools.read_head_commit(repo_path)
+                update_success = self._update_repo(service_key, service, repo_path)
+                changed = git_tools.read_head_commit(repo_path) != old_head
+            self._phase(
+                service_key,
+                "fetch",
+                "done" if update_success else "failed",
+                changed=changed,
+            )
 
             if update_success:
                 print(Colors.green(f"✅ {service['name']} 更新成功"), flush=True)
-                self._install_requirements(service, repo_path)
+                self._phase(service_key, "install", "start")
+                # Bot 的插件放在 plugins/ 下，与 Bot 的依赖合并后一次安装
+                install_success = self._install_requirements(service, repo_path, service_key == "bot")
+                self._phase(service_key, "install", "done" if install_success else "failed")
             else:
                 print(Colors.red(f"❌ {service['name']} 更新失败"), flush=True)
+            self.results["repos"][service_key] = {
+                "success": update_success and install_success,
+                "changed": changed,
+                "seconds": time.time() - start,
+                "finished_at": time.time(),
+            }
+            self.tracer.end_phase(service_key)
 
             print()
             time.sleep(1)
 
+        self._save_results()
         print(Colors.bold(Colors.green("=" * 60)))
         print(Colors.bold(Colors.green("          所有仓库更新及依赖检查完毕")))
         print(Colors.bold(Colors.green("=" * 60)))
+        trace_summary = self.tracer.close()
+        if trace_summary:
+            print(Colors.cyan(trace_summary))
 
 
 if __name__ == "__main__":
-    if os.name == "nt":
+    background = "--background" in sys.argv[1:]
+    if background:
+        # 输出通过管道交给管理程序，逐行刷新以便实时显示进度
+        sys.stdout.reconfigure(line_buffering=True)
+    elif os.name == "nt":
         os.system("color")
 
-    Updater()
-    input(Colors.cyan("按回车键退出..."))
+    if "--trace" in sys.argv[1:]:
+        os.environ[tracing.ENV_VAR] = "1"
+    find_links = None
+    if "--find-links" in sys.argv[1:-1]:
+        find_links = Path(sys.argv[sys.argv.index("--find-links") + 1])
+    updater = Updater(background=background, find_links=find_links)
+    if not background:
+        input(Colors.cyan("按回车键退出..."))
+    sys.exit(0 if updater.preflight_ok else 1)
@@ -41,6 +41,8 @@ set "INIT_FLAG_FILE=%~dp0core\.initialized"
 set "UPDATE_SCRIPT=%~dp0update.py"
 set "CONFIG_SCRIPT=%~dp0config_wizard.py"
 set "MAIN_SCRIPT=%~dp0onekey.py"
+set "OFFLINE_SCRIPT=%~dp0offline_bundle.py"
+set "OFFLINE_ARCHIVE=%~dp0onekey-offline.tar.gz"
 
 :: 检查Python解释器
 if not exist "%PYTHON_EXECUTABLE%" (
@@ -73,11 +75,16 @@ if not exist "%~dp0core" (
     mkdir "%~dp0core"
 )
 
-:: 执行更新脚本
+:: 执行更新脚本（一键包目录中放有离线包时改为离线导入, 无需联网）
 echo ========================================
 echo      STEP 1: 执行更新程序
 echo ========================================
-"%PYTHON_EXECUTABLE%" "%UPDATE_SCRIPT%"
+if exist "%OFFLINE_ARCHIVE%" (
+    echo [INFO] 检测到离线包 onekey-offline.tar.gz, 正在离线导入...
+    "%PYTHON_EXECUTABLE%" "%OFFLINE_SCRIPT%" import "%OFFLINE_ARCHIVE%"
+) else (
+    "%PYTHON_EXECUTABLE%" "%UPDATE_SCRIPT%"
+)
 if !errorlevel! neq 0 (
     echo.
     echo [ERROR] 更新程序执行失败, 错误代码: !errorlevel!